@@ -0,0 +1,273 @@
+"""Admission control: per-NAS and global load shedding.
+
+When a large NAS reboots, thousands of sessions send Accounting-Start
+and Access-Request at once. A server that accepts all of them builds a
+backlog it can't clear before the NASes time out and retransmit, which
+only adds to the load. ``AdmissionController`` caps what a server takes
+on, so the requests it does accept are answered in time::
+
+    admission = AdmissionController(
+        per_host=Limits(rate=200, burst=400, max_in_flight=50),
+        total=Limits(rate=5000, max_in_flight=1000),
+        shed_action=ShedAction.REJECT,
+    )
+    server = MyServer(dictionary=dictionary, hosts=hosts, admission=admission)
+
+Each limit is optional. ``rate`` and ``burst`` configure a token bucket,
+in requests per second; ``max_in_flight`` caps requests admitted but not
+yet answered. ``per_host`` applies to each NAS source address, and a
+``RemoteHost`` can carry its own ``limits`` instead. ``total`` applies to
+all requests together.
+
+Servers ask for admission after the header checks and the host lookup,
+but before the request is decoded, so a shed request costs next to
+nothing. Retransmissions answered from the dedup cache are not counted.
+A shed request is dropped, or with ``ShedAction.REJECT`` answered with
+an Access-Reject, CoA-NAK or Disconnect-NAK that carries Error-Cause 506
+(Resources Unavailable). Accounting-Requests have no negative reply and
+are always dropped. Status-Server is never shed.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Optional
+
+from pyrad2.constants import PacketType
+
+# Codes subject to admission. Status-Server stays answerable so health
+# checks don't fail over a server that is only busy.
+ADMITTED_CODES: frozenset[int] = frozenset(
+    {
+        PacketType.AccessRequest,
+        PacketType.AccountingRequest,
+        PacketType.CoARequest,
+        PacketType.DisconnectRequest,
+    }
+)
+
+# Tracked NAS states are pruned of idle ones once they reach this many.
+_PRUNE_AT = 1024
+
+
+class ShedAction(Enum):
+    """What a server does with a request it does not admit."""
+
+    DROP = "drop"
+    REJECT = "reject"
+
+
+@dataclass(frozen=True, slots=True)
+class Limits:
+    """Rate and concurrency limits; ``None`` leaves a limit off.
+
+    Args:
+        rate (float): Sustained requests per second.
+        burst (float): Requests that may arrive at once after a quiet
+            period (default: one second's worth of ``rate``).
+        max_in_flight (int): Requests admitted but not yet finished.
+    """
+
+    rate: Optional[float] = None
+    burst: Optional[float] = None
+    max_in_flight: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.rate is not None and self.rate <= 0:
+            raise ValueError("rate must be positive")
+        if self.burst is not None and self.burst < 1:
+            raise ValueError("burst must be at least 1")
+        if self.max_in_flight is not None and self.max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+
+@dataclass(frozen=True, slots=True)
+class AdmissionStats:
+    """Counters of an ``AdmissionController``."""
+
+    admitted: int
+    shed_rate: int
+    shed_in_flight: int
+    in_flight: int
+    tracked_hosts: int
+
+    @property
+    def shed(self) -> int:
+        return self.shed_rate + self.shed_in_flight
+
+
+class _State:
+    """Token bucket and in-flight count of one NAS, or of the server."""
+
+    __slots__ = ("limits", "tokens", "updated", "in_flight")
+
+    def __init__(self, limits: Limits, now: float):
+        self.limits = limits
+        self.tokens = self.capacity
+        self.updated = now
+        self.in_flight = 0
+
+    @property
+    def capacity(self) -> float:
+        limits = self.limits
+        if limits.burst is not None:
+            return limits.burst
+        return max(1.0, limits.rate or 1.0)
+
+    def full(self) -> bool:
+        cap = self.limits.max_in_flight
+        return cap is not None and self.in_flight >= cap
+
+    def take(self, now: float) -> bool:
+        rate = self.limits.rate
+        if rate is None:
+            return True
+        capacity = self.capacity
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def idle(self, now: float) -> bool:
+        if self.in_flight:
+            return False
+        rate = self.limits.rate
+        if rate is None:
+            return True
+        return self.tokens + (now - self.updated) * rate >= self.capacity
+
+
+class Ticket:
+    """An admitted request's hold on its in-flight slots.
+
+    Whoever finishes the request last releases it: code that hands the
+    request to a task calls ``retain`` first, and every holder calls
+    ``release`` once.
+    """
+
+    __slots__ = ("_controller", "_states", "_holds")
+
+    def __init__(self, controller: Optional[AdmissionController], states: tuple):
+        self._controller = controller
+        self._states = states
+        self._holds = 1
+
+    def retain(self) -> None:
+        if self._controller is not None:
+            self._holds += 1
+
+    def release(self) -> None:
+        if self._controller is None:
+            return
+        self._holds -= 1
+        if self._holds == 0:
+            self._controller._finish(self._states)
+
+
+# Ticket of requests that are not subject to admission.
+UNLIMITED = Ticket(None, ())
+
+
+class AdmissionController:
+    """Token-bucket and in-flight limits, per NAS and for the server."""
+
+    def __init__(
+        self,
+        per_host: Optional[Limits] = None,
+        total: Optional[Limits] = None,
+        shed_action: ShedAction = ShedAction.DROP,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize an admission controller.
+
+        Args:
+            per_host (Limits): Limits of each NAS source address, unless
+                its ``RemoteHost`` sets ``limits``.
+            total (Limits): Limits of all requests together.
+            shed_action (ShedAction): Drop requests that are not
+                admitted, or reject them (default: drop).
+            clock (Callable): Monotonic clock, for tests.
+        """
+        self.per_host = per_host
+        self.shed_action = shed_action
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._total = None if total is None else _State(total, clock())
+        self._hosts: dict[str, _State] = {}
+        self._prune_at = _PRUNE_AT
+        self._admitted = 0
+        self._shed_rate = 0
+        self._shed_in_flight = 0
+        self._in_flight = 0
+
+    def admit(self, host: Any, source: str, code: int) -> Optional[Ticket]:
+        """Admit a request with ``code`` from ``source``, sent by ``host``.
+
+        Returns the request's ``Ticket``, to be released once it is
+        answered, or None if the request is to be shed.
+        """
+        if code not in ADMITTED_CODES:
+            return UNLIMITED
+        limits = getattr(host, "limits", None) or self.per_host
+        with self._lock:
+            now = self._clock()
+            state = None
+            if limits is not None:
+                state = self._hosts.get(source)
+                if state is None:
+                    state = self._track(source, limits, now)
+                elif state.limits != limits:
+                    # The host entry was reconfigured.
+                    state.limits = limits
+                    state.tokens = min(state.tokens, state.capacity)
+            total = self._total
+            if (state is not None and state.full()) or (
+                total is not None and total.full()
+            ):
+                self._shed_in_flight += 1
+                return None
+            if state is not None and not state.take(now):
+                self._shed_rate += 1
+                return None
+            if total is not None and not total.take(now):
+                if state is not None:
+                    state.tokens += 1.0
+                self._shed_rate += 1
+                return None
+            states = tuple(s for s in (state, total) if s is not None)
+            for s in states:
+                s.in_flight += 1
+            self._admitted += 1
+            self._in_flight += 1
+        return Ticket(self, states)
+
+    def stats(self) -> AdmissionStats:
+        """Return the controller's counters."""
+        with self._lock:
+            return AdmissionStats(
+                admitted=self._admitted,
+                shed_rate=self._shed_rate,
+                shed_in_flight=self._shed_in_flight,
+                in_flight=self._in_flight,
+                tracked_hosts=len(self._hosts),
+            )
+
+    def _track(self, source: str, limits: Limits, now: float) -> _State:
+        if len(self._hosts) >= self._prune_at:
+            # Spoofed or one-off sources must not grow the table for
+            # good; idle NASes lose nothing by starting over.
+            self._hosts = {k: s for k, s in self._hosts.items() if not s.idle(now)}
+            self._prune_at = max(_PRUNE_AT, 2 * len(self._hosts))
+        state = self._hosts[source] = _State(limits, now)
+        return state
+
+    def _finish(self, states: tuple) -> None:
+        with self._lock:
+            for state in states:
+                state.in_flight -= 1
+            self._in_flight -= 1
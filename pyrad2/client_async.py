@@ -7,11 +7,12 @@ from typing import Optional, cast
 
 from loguru import logger
 
-from pyrad2 import eap
+from pyrad2 import batchio, eap
 from pyrad2.constants import PacketType
 from pyrad2.dictionary import Dictionary
 from pyrad2.exceptions import IdentifierExhausted
 from pyrad2.host import _ClientPacketFactoryMixin
+from pyrad2.metrics import Metrics
 from pyrad2.packet import (
     AcctPacket,
     AuthPacket,
@@ -50,6 +51,11 @@ class DatagramProtocolClient(_LegacyAttrMixin, asyncio.Protocol):
 
         self.timeout_future = None
 
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """The owning client's metrics registry, if it has one."""
+        return getattr(self.client, "metrics", None)
+
     async def __timeout_handler__(self):
         """Background task that retries or fails timed-out pending requests.
 
@@ -92,6 +98,10 @@ class DatagramProtocolClient(_LegacyAttrMixin, asyncio.Protocol):
                                 TimeoutError("Timeout on Reply")
                             )
                             req2delete.append(id)
+                            if self.metrics is not None:
+                                self.metrics.client_timeout(
+                                    self.server, req["packet"].code
+                                )
                         else:
                             # Send again packet
                             req["send_date"] = now
@@ -104,6 +114,10 @@ class DatagramProtocolClient(_LegacyAttrMixin, asyncio.Protocol):
                                 req["retries"],
                             )
                             self.transport.sendto(req["packet"].request_packet())
+                            if self.metrics is not None:
+                                self.metrics.client_retransmit(
+                                    self.server, req["packet"].code
+                                )
                     else:
                         remaining = current_wait - elapsed
                         if remaining < next_wake_up:
@@ -135,6 +149,8 @@ class DatagramProtocolClient(_LegacyAttrMixin, asyncio.Protocol):
 
         # In queue packet raw on socket buffer
         self.transport.sendto(packet.request_packet())
+        if self.metrics is not None:
+            self.metrics.client_request(self.server, packet.code)
 
     def connection_made(self, transport: asyncio.BaseTransport):
         # Duck-typed instead of ``isinstance(transport, asyncio.DatagramTransport)``
@@ -184,6 +200,11 @@ class DatagramProtocolClient(_LegacyAttrMixin, asyncio.Protocol):
 
                 if packet.verify_reply(reply, data, enforce_ma=self.client.enforce_ma):
                     req["future"].set_result(reply)
+                    if self.metrics is not None:
+                        elapsed = datetime.now() - req["creation_date"]
+                        self.metrics.client_reply(
+                            self.server, packet.code, elapsed.total_seconds()
+                        )
                     # Remove request for map
                     del self.pending_requests[reply.id]
                 else:
@@ -271,6 +292,8 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
         timeout: int = 30,
         enforce_ma: bool = True,
         retry_policy: Optional[RetryPolicy] = None,
+        io_batch_size: int = 1,
+        metrics: Optional[Metrics] = None,
     ):
         """Initializes an async RADIUS client.
 
@@ -293,6 +316,12 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
                 exponential backoff and jitter on top of the base
                 ``timeout``. When omitted, a flat policy is built from
                 ``retries`` and ``timeout`` for backwards compatibility.
+            io_batch_size (int): On Linux, read replies up to this many
+                per ``recvmmsg`` call and send the requests queued in one
+                loop iteration with one ``sendmmsg`` (default: 1, the
+                loop's own transport). See ``pyrad2.batchio``.
+            metrics (Metrics): Registry to count requests, retransmits
+                and timeouts, and time replies, in. See ``pyrad2.metrics``.
         """
         self.server = server
         self.secret = secret
@@ -301,6 +330,8 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
         self.retry_policy = policy_from_legacy(retry_policy, retries, timeout)
         self.dict = dict
         self.enforce_ma = enforce_ma
+        self.io_batch_size = io_batch_size
+        self.metrics = metrics
 
         self.auth_port = auth_port
         self.protocol_auth: Optional[DatagramProtocolClient] = None
@@ -333,7 +364,6 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
         if not enable_acct and not enable_auth and not enable_coa:
             raise Exception("No transports selected")
 
-        loop = asyncio.get_running_loop()
         if enable_acct and not self.protocol_acct:
             self.protocol_acct = DatagramProtocolClient(
                 self.server,
@@ -345,11 +375,12 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
             if local_addr and local_acct_port:
                 bind_addr = (local_addr, local_acct_port)
 
-            acct_connect = loop.create_datagram_endpoint(
+            acct_connect = batchio.create_datagram_endpoint(
                 self.protocol_acct,
                 reuse_port=True,
                 remote_addr=(self.server, self.acct_port),
                 local_addr=bind_addr,
+                batch_size=self.io_batch_size,
             )
             task_list.append(acct_connect)
 
@@ -364,11 +395,12 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
             if local_addr and local_auth_port:
                 bind_addr = (local_addr, local_auth_port)
 
-            auth_connect = loop.create_datagram_endpoint(
+            auth_connect = batchio.create_datagram_endpoint(
                 self.protocol_auth,
                 reuse_port=True,
                 remote_addr=(self.server, self.auth_port),
                 local_addr=bind_addr,
+                batch_size=self.io_batch_size,
             )
             task_list.append(auth_connect)
 
@@ -383,11 +415,12 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
             if local_addr and local_coa_port:
                 bind_addr = (local_addr, local_coa_port)
 
-            coa_connect = loop.create_datagram_endpoint(
+            coa_connect = batchio.create_datagram_endpoint(
                 self.protocol_coa,
                 reuse_port=True,
                 remote_addr=(self.server, self.coa_port),
                 local_addr=bind_addr,
+                batch_size=self.io_batch_size,
             )
             task_list.append(coa_connect)
 
@@ -462,6 +495,7 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
             id=protocol.create_id(),
             dict=self.dict,
             secret=self.secret,
+            secret_context=self.secret_context,
             **args,
         )
 
@@ -469,7 +503,13 @@ class ClientAsync(_ClientPacketFactoryMixin, _LegacyAttrMixin):
         if not id:
             raise Exception("Missing mandatory packet id")
 
-        return Packet(id=id, dict=self.dict, secret=self.secret, **args)
+        return Packet(
+            id=id,
+            dict=self.dict,
+            secret=self.secret,
+            secret_context=self.secret_context,
+            **args,
+        )
 
     def send_status_packet(
         self, pkt: Optional[StatusPacket] = None, *, port: str = "auth"
@@ -0,0 +1,213 @@
+"""Client table with IPv4/IPv6 prefixes and longest-prefix-match lookup.
+
+A plain ``hosts`` dict only matches exact source addresses, plus the
+``"0.0.0.0"`` catch-all. ``ClientTable`` also takes networks, so one
+entry covers a whole subnet of NASes::
+
+    hosts = ClientTable({
+        "10.0.0.0/8": RemoteHost("10.0.0.0/8", b"site-secret", "sites"),
+        "10.1.2.0/24": RemoteHost("10.1.2.0/24", b"lab-secret", "lab"),
+        "10.1.2.3": RemoteHost("10.1.2.3", b"core-secret", "core"),
+        "2001:db8::/32": RemoteHost("2001:db8::/32", b"v6-secret", "v6"),
+    })
+    server = MyServer(dictionary=dictionary, hosts=hosts)
+
+``hosts.get(addr)`` returns the entry with the longest prefix containing
+``addr``. Entries are kept in one hash table per prefix length, so a
+lookup costs one dict probe per distinct prefix length in use, not one
+per entry.
+
+The table is a ``MutableMapping`` and can be used wherever a ``hosts``
+dict is accepted. Writes never modify the tables readers see: they build
+a new snapshot and swap it in, so lookups take no lock and a reload with
+``replace`` is atomic. Each write copies the table, so load many entries
+at once with ``update`` or ``replace`` rather than one at a time.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import socket
+import threading
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from pyrad2.server import RemoteHost
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Prefix tables of one address family: (shift, {address >> shift: host})
+# ordered from the longest prefix to the shortest.
+_Tables = tuple[tuple[int, dict[int, "RemoteHost"]], ...]
+
+_MAPPED_PREFIX = "::ffff:"
+
+
+def parse_network(key: str) -> Network:
+    """Parse a table key: an address or a network in CIDR notation.
+
+    Raises ``ValueError`` for anything else, including a network with
+    host bits set (``"10.0.0.1/8"``), which is almost always a typo.
+    """
+    return ipaddress.ip_network(key)
+
+
+def _normalize(network: Network) -> str:
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+
+def _address_int(addr: str) -> Optional[tuple[int, int]]:
+    """Return ``(version, integer)`` for an address string, or None."""
+    try:
+        if ":" not in addr:
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, addr))
+        if addr.startswith(_MAPPED_PREFIX) and "." in addr:
+            # Dual-stack sockets report IPv4 peers as ::ffff:a.b.c.d.
+            v4 = addr[len(_MAPPED_PREFIX) :]
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, v4))
+        addr = addr.partition("%")[0]
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, addr))
+    except OSError:
+        return None
+
+
+def _build_tables(networks: Iterable[tuple[Network, RemoteHost]]) -> _Tables:
+    by_length: dict[int, dict[int, RemoteHost]] = {}
+    for network, host in networks:
+        shift = network.max_prefixlen - network.prefixlen
+        by_length.setdefault(shift, {})[int(network.network_address) >> shift] = host
+    return tuple(sorted(by_length.items()))
+
+
+@dataclass(frozen=True, slots=True)
+class _Snapshot:
+    """Immutable view of the table; replaced wholesale on every write."""
+
+    entries: dict[str, RemoteHost]
+    networks: dict[str, Network]
+    v4: _Tables
+    v6: _Tables
+
+    @classmethod
+    def build(
+        cls, entries: dict[str, RemoteHost], networks: dict[str, Network]
+    ) -> _Snapshot:
+        v4 = [(n, entries[k]) for k, n in networks.items() if n.version == 4]
+        v6 = [(n, entries[k]) for k, n in networks.items() if n.version == 6]
+        return cls(entries, networks, _build_tables(v4), _build_tables(v6))
+
+    def lookup(self, addr: str) -> Optional[RemoteHost]:
+        host = self.entries.get(addr)
+        if host is not None:
+            return host
+        parsed = _address_int(addr)
+        if parsed is None:
+            return None
+        version, value = parsed
+        for shift, table in self.v4 if version == 4 else self.v6:
+            host = table.get(value >> shift)
+            if host is not None:
+                return host
+        return None
+
+
+class ClientTable(MutableMapping[str, "RemoteHost"]):
+    """Hosts keyed by address or network, looked up by longest prefix."""
+
+    def __init__(
+        self,
+        hosts: Union[Mapping[str, RemoteHost], Iterable[tuple[str, RemoteHost]]] = (),
+    ):
+        """Initialize a client table.
+
+        Args:
+            hosts (Mapping[str, RemoteHost]): Initial entries, keyed by
+                an address (``"192.0.2.1"``) or a network
+                (``"192.0.2.0/24"``, ``"2001:db8::/32"``). Use
+                ``"0.0.0.0/0"`` and ``"::/0"`` for catch-alls.
+        """
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot.build({}, {})
+        self.update(hosts)
+
+    def get(  # type: ignore[override]
+        self, addr: str, default: Optional[RemoteHost] = None
+    ) -> Optional[RemoteHost]:
+        """Return the entry with the longest prefix containing ``addr``.
+
+        ``addr`` may also be one of the table's own keys. Returns
+        ``default`` when nothing matches or ``addr`` is not an address.
+        """
+        host = self._snapshot.lookup(addr)
+        return default if host is None else host
+
+    def __getitem__(self, addr: str) -> RemoteHost:
+        host = self._snapshot.lookup(addr)
+        if host is None:
+            raise KeyError(addr)
+        return host
+
+    def __contains__(self, addr: object) -> bool:
+        return isinstance(addr, str) and self._snapshot.lookup(addr) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._snapshot.entries)
+
+    def __len__(self) -> int:
+        return len(self._snapshot.entries)
+
+    def __repr__(self) -> str:
+        return f"ClientTable({self._snapshot.entries!r})"
+
+    def __setitem__(self, key: str, host: RemoteHost) -> None:
+        self.update({key: host})
+
+    def __delitem__(self, key: str) -> None:
+        name = _normalize(parse_network(key))
+        with self._lock:
+            snapshot = self._snapshot
+            if name not in snapshot.entries:
+                raise KeyError(key)
+            entries = dict(snapshot.entries)
+            networks = dict(snapshot.networks)
+            del entries[name], networks[name]
+            self._snapshot = _Snapshot.build(entries, networks)
+
+    def update(self, *args, **kwargs) -> None:  # type: ignore[override]
+        """Add or replace entries, publishing them in a single snapshot."""
+        items = dict(*args, **kwargs)
+        parsed = {key: parse_network(key) for key in items}
+        with self._lock:
+            entries = dict(self._snapshot.entries)
+            networks = dict(self._snapshot.networks)
+            for key, host in items.items():
+                name = _normalize(parsed[key])
+                entries[name] = host
+                networks[name] = parsed[key]
+            self._snapshot = _Snapshot.build(entries, networks)
+
+    def replace(
+        self,
+        hosts: Union[Mapping[str, RemoteHost], Iterable[tuple[str, RemoteHost]]],
+    ) -> None:
+        """Swap the whole table for ``hosts`` in one step.
+
+        Lookups running concurrently see either the old table or the new
+        one, never a mix; use this to reload clients from configuration.
+        """
+        entries: dict[str, RemoteHost] = {}
+        networks: dict[str, Network] = {}
+        for key, host in dict(hosts).items():
+            network = parse_network(key)
+            entries[_normalize(network)] = host
+            networks[_normalize(network)] = network
+        snapshot = _Snapshot.build(entries, networks)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def clear(self) -> None:
+        self.replace({})
@@ -0,0 +1,415 @@
+"""Prefork supervisor: one RADIUS server process per core.
+
+Python runs one request at a time per process, so a single ``Server`` or
+``ServerAsync`` uses one core however large the box. ``Supervisor``
+forks ``workers`` processes that each bind the same auth/acct/CoA ports
+with ``SO_REUSEPORT``; the kernel then spreads incoming datagrams over
+them. Anything built before ``Supervisor.run`` — the ``Dictionary``
+above all — is inherited copy-on-write instead of being parsed once per
+worker.
+
+The factory runs in each worker and returns what that worker serves:
+a ``Server`` (its blocking ``run()`` is called) or a coroutine, usually
+``serve(server, ...)`` for a ``ServerAsync``::
+
+    dictionary = Dictionary("dictionary")
+
+    def make_server(index):
+        return serve(MyServer(dictionary=dictionary), enable_auth=True)
+
+    Supervisor(make_server, workers=8, cpus=True).run()
+
+The supervisor restarts workers that exit, pins them to CPUs on request
+(Linux only), replaces them one at a time on ``SIGHUP`` and stops them all on
+``SIGTERM``/``SIGINT``. A replacement counts as started once it calls
+``ready()``: ``serve`` does after binding its transports, and a worker
+serving a ``Server``, which binds in its constructor, is ready when the
+factory returns. Workers bump named counters with ``counters()``;
+the parent sums them across workers, including ones that have since
+exited, in ``Supervisor.totals()``.
+
+POSIX only: it relies on ``fork`` and ``SO_REUSEPORT``.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Coroutine, Optional, Sequence, Union
+
+from loguru import logger
+
+from pyrad2.server import Server
+from pyrad2.server_async import ServerAsync
+
+WorkerFactory = Callable[[int], Union[Server, Coroutine[Any, Any, Any]]]
+
+# Per-process counters; in a worker they are reported to the parent.
+_counters: Counter[str] = Counter()
+# Set in a worker to tell the parent it is serving.
+_ready_hook: Optional[Callable[[], None]] = None
+
+
+def counters() -> Counter[str]:
+    """Return this process's counters, for handlers to increment.
+
+    In a worker started by ``Supervisor`` the values are reported to the
+    parent every ``report_interval`` seconds and when the worker exits.
+    """
+    return _counters
+
+
+def ready() -> None:
+    """Tell the supervisor this worker is answering requests.
+
+    ``serve`` calls this once the transports are bound. A factory that
+    returns some other coroutine should call it when that coroutine is
+    ready to serve; until then a rolling restart keeps the worker it
+    replaces for up to ``shutdown_timeout``. Does nothing outside a
+    worker.
+    """
+    if _ready_hook is not None:
+        _ready_hook()
+
+
+async def serve(
+    server: ServerAsync,
+    *,
+    enable_auth: bool = False,
+    enable_acct: bool = False,
+    enable_coa: bool = False,
+    addresses: Optional[list[str]] = None,
+) -> None:
+    """Open ``server``'s transports and serve until cancelled.
+
+    ``ServerAsync`` already binds with ``reuse_port=True``, so every
+    worker can run this on the same ports.
+    """
+    await server.initialize_transports(
+        enable_auth=enable_auth,
+        enable_acct=enable_acct,
+        enable_coa=enable_coa,
+        addresses=addresses,
+    )
+    ready()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.deinitialize_transports()
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: BaseProcess
+    started: float
+    cpu: Optional[int] = None
+    ready: bool = False
+
+
+@dataclass
+class _Reports:
+    """Counter snapshots by worker pid, plus totals of exited workers."""
+
+    live: dict[int, Counter[str]] = field(default_factory=dict)
+    retired: Counter[str] = field(default_factory=Counter)
+    retired_pids: set[int] = field(default_factory=set)
+
+    def update(self, pid: int, snapshot: dict[str, int]) -> None:
+        if pid not in self.retired_pids:
+            self.live[pid] = Counter(snapshot)
+
+    def retire(self, pid: int) -> None:
+        if pid not in self.retired_pids:
+            self.retired_pids.add(pid)
+            self.retired.update(self.live.pop(pid, Counter()))
+
+    def totals(self) -> Counter[str]:
+        total = Counter(self.retired)
+        for snapshot in self.live.values():
+            total.update(snapshot)
+        return total
+
+
+def _report(reports: Any, index: int, ready: bool) -> None:
+    reports.put((index, os.getpid(), ready, dict(_counters)))
+
+
+async def _until_terminated(target: Coroutine[Any, Any, Any]) -> Any:
+    """Run ``target``, exiting on SIGTERM.
+
+    A ``signal.signal`` handler only runs when the loop next wakes, so
+    SIGTERM arriving just before it blocks in ``select`` went unhandled.
+    The loop's own handler wakes it.
+    """
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, sys.exit, 0)
+    return await target
+
+
+def _worker_main(
+    factory: WorkerFactory,
+    index: int,
+    cpu: Optional[int],
+    reports: Any,
+    report_interval: float,
+) -> None:
+    """Entry point of a forked worker process."""
+    # The parent handles Ctrl-C for the whole group and stops workers
+    # with SIGTERM, which unwinds the server loop like ``sys.exit``.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    _counters.clear()
+
+    stopped = threading.Event()
+    serving = threading.Event()
+
+    def _mark_ready() -> None:
+        if not serving.is_set():
+            serving.set()
+            _report(reports, index, True)
+
+    def _report_loop() -> None:
+        while not stopped.wait(report_interval):
+            _report(reports, index, serving.is_set())
+
+    global _ready_hook
+    _ready_hook = _mark_ready
+    try:
+        target = factory(index)
+        threading.Thread(target=_report_loop, daemon=True).start()
+        if isinstance(target, Server):
+            _mark_ready()
+            target.run()
+        elif asyncio.iscoroutine(target):
+            asyncio.run(_until_terminated(target))
+        else:
+            raise TypeError(
+                f"worker factory returned {type(target).__name__}; "
+                "expected a Server or a coroutine"
+            )
+    finally:
+        stopped.set()
+        _report(reports, index, False)
+        reports.close()
+        reports.join_thread()
+
+
+class Supervisor:
+    """Run a RADIUS server in ``workers`` forked processes."""
+
+    def __init__(
+        self,
+        factory: WorkerFactory,
+        workers: Optional[int] = None,
+        cpus: Union[bool, Sequence[int], None] = None,
+        restart_delay: float = 1.0,
+        shutdown_timeout: float = 10.0,
+        report_interval: float = 1.0,
+    ):
+        """Initialize a supervisor.
+
+        Args:
+            factory (WorkerFactory): Called in each worker with its index;
+                returns a ``Server`` or a coroutine to run.
+            workers (int): Number of worker processes (default: one per
+                CPU).
+            cpus (bool | Sequence[int]): Pin worker ``i`` to
+                ``cpus[i % len(cpus)]``. ``True`` uses the CPUs this
+                process may run on. Default: no pinning. Linux only.
+            restart_delay (float): Minimum seconds between two starts of
+                the same worker, so a worker that crashes on start-up
+                doesn't spin.
+            shutdown_timeout (float): Seconds a stopping worker gets after
+                ``SIGTERM`` before it is killed.
+            report_interval (float): Seconds between counter reports.
+        """
+        if os.name != "posix":
+            raise RuntimeError("pyrad2.cluster requires a POSIX platform")
+        self.factory = factory
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1")
+        if cpus and not hasattr(os, "sched_setaffinity"):
+            raise ValueError("pinning workers to CPUs requires Linux")
+        if cpus is True:
+            cpus = sorted(os.sched_getaffinity(0))
+        self.cpus: tuple[int, ...] = tuple(cpus or ())
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.report_interval = report_interval
+        self.restarts = 0
+
+        self._context = multiprocessing.get_context("fork")
+        self._reports_queue = self._context.Queue()
+        self._reports = _Reports()
+        self._workers: dict[int, _Worker] = {}
+        self._stopping = False
+        self._reload_requested = False
+
+    def start(self) -> None:
+        """Fork every worker."""
+        for index in range(self.workers):
+            self._workers[index] = self._spawn(index)
+
+    def poll(self, timeout: float = 0.5) -> None:
+        """Collect counter reports and restart workers that exited.
+
+        Blocks up to ``timeout`` seconds waiting for a report.
+        """
+        self._drain_reports(timeout)
+        now = time.monotonic()
+        for index, worker in list(self._workers.items()):
+            if worker.process.is_alive() or self._stopping:
+                continue
+            if now - worker.started < self.restart_delay:
+                continue
+            worker.process.join()
+            self._drain_reports(0)
+            self._reports.retire(worker.process.pid or 0)
+            logger.warning(
+                "Worker {} (pid {}) exited with code {}; restarting",
+                index,
+                worker.process.pid,
+                worker.process.exitcode,
+            )
+            self.restarts += 1
+            self._workers[index] = self._spawn(index)
+
+    def rolling_restart(self) -> None:
+        """Replace workers one at a time.
+
+        Each replacement binds alongside the worker it replaces, and the
+        old worker is only stopped once the new one has called ``ready``,
+        so the ports never go unanswered.
+        """
+        for index, old in list(self._workers.items()):
+            new = self._spawn(index)
+            self._workers[index] = new
+            deadline = time.monotonic() + self.shutdown_timeout
+            while (
+                not new.ready and new.process.is_alive() and time.monotonic() < deadline
+            ):
+                self._drain_reports(0.1)
+            self._stop_process(old.process)
+            logger.info(
+                "Worker {} replaced (pid {} -> {})",
+                index,
+                old.process.pid,
+                new.process.pid,
+            )
+
+    def stop(self) -> None:
+        """Stop every worker, killing those that outlive ``shutdown_timeout``."""
+        self._stopping = True
+        processes = [worker.process for worker in self._workers.values()]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker pid {} did not stop; killing", process.pid)
+                process.kill()
+                process.join()
+        self._drain_reports(0)
+        for process in processes:
+            self._reports.retire(process.pid or 0)
+        self._workers.clear()
+
+    def totals(self) -> Counter[str]:
+        """Return counters summed over current and exited workers."""
+        self._drain_reports(0)
+        return self._reports.totals()
+
+    def worker_counters(self) -> dict[int, Counter[str]]:
+        """Return the latest counters of each running worker, by index."""
+        self._drain_reports(0)
+        return {
+            index: Counter(self._reports.live.get(worker.process.pid or 0, {}))
+            for index, worker in self._workers.items()
+        }
+
+    def run(self) -> None:
+        """Start the workers and supervise them until SIGTERM or SIGINT.
+
+        ``SIGHUP`` triggers a ``rolling_restart``. Must be called from
+        the main thread.
+        """
+
+        def _stop(signum: int, frame: Any) -> None:
+            self._stopping = True
+
+        def _reload(signum: int, frame: Any) -> None:
+            self._reload_requested = True
+
+        previous = {
+            signal.SIGTERM: signal.signal(signal.SIGTERM, _stop),
+            signal.SIGINT: signal.signal(signal.SIGINT, _stop),
+            signal.SIGHUP: signal.signal(signal.SIGHUP, _reload),
+        }
+        self._stopping = False
+        try:
+            self.start()
+            logger.info("Started {} workers", self.workers)
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.rolling_restart()
+                self.poll()
+        finally:
+            self.stop()
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            logger.info("All workers stopped")
+
+    def _spawn(self, index: int) -> _Worker:
+        cpu = self.cpus[index % len(self.cpus)] if self.cpus else None
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.factory,
+                index,
+                cpu,
+                self._reports_queue,
+                self.report_interval,
+            ),
+            name=f"pyrad2-worker-{index}",
+        )
+        process.start()
+        return _Worker(index, process, time.monotonic(), cpu)
+
+    def _drain_reports(self, timeout: float) -> None:
+        block = timeout > 0
+        while True:
+            try:
+                index, pid, ready, snapshot = self._reports_queue.get(
+                    block=block, timeout=timeout if block else None
+                )
+            except queue.Empty:
+                return
+            block = False
+            self._reports.update(pid, snapshot)
+            worker = self._workers.get(index)
+            if ready and worker is not None and worker.process.pid == pid:
+                worker.ready = True
+
+    def _stop_process(self, process: BaseProcess) -> None:
+        process.terminate()
+        process.join(self.shutdown_timeout)
+        if process.is_alive():
+            logger.warning("Worker pid {} did not stop; killing", process.pid)
+            process.kill()
+            process.join()
+        self._drain_reports(0)
+        self._reports.retire(process.pid or 0)
@@ -43,10 +43,15 @@ class PacketType(IntEnum):
     CoANAK = 45
 
 
+# RFC 5176 Error-Cause attribute type.
+ERROR_CAUSE_ATTRIBUTE = 101
+
+
 class ErrorCause(IntEnum):
     """RFC 5176 Error-Cause attribute values used in CoA/Disconnect NAKs."""
 
     UnsupportedExtension = 406
+    ResourcesUnavailable = 506
 
 
 class EAPPacketType(IntEnum):
@@ -0,0 +1,92 @@
+"""Request deadlines: skip handlers whose NAS has stopped waiting.
+
+A NAS retransmits a request it got no answer to after a few seconds,
+and the retransmission is a new request to the server. A request that
+waited longer than that in a queue gets a reply the NAS no longer
+accepts, so handling it only wastes the time an overloaded server is
+short of.
+
+Servers stamp each request with the time it was read from the socket.
+Before a handler runs, after any wait in the ``Scheduler`` queue, for a
+handler slot or for the executor, the server asks ``Deadlines`` whether
+the request is still worth answering::
+
+    server = MyServer(dictionary=dictionary, hosts=hosts, deadlines=Deadlines())
+
+An expired request is skipped and its dedup in-flight mark cleared, so
+the NAS's next retransmission is handled as a fresh request. ``stats()``
+counts expired requests per ``ServerType``, with the time they waited.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Mapping, Optional
+
+from pyrad2.router import ServerType
+
+# Seconds after which a typical NAS has retransmitted.
+DEFAULT_DEADLINES: Mapping[ServerType, float] = {
+    ServerType.Auth: 3.0,
+    ServerType.Coa: 3.0,
+    ServerType.Acct: 5.0,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DeadlineStats:
+    """Requests of one class skipped for waiting past their deadline."""
+
+    expired: int
+    wait_total: float
+    wait_max: float
+
+
+class Deadlines:
+    """Per-``ServerType`` limits on how long a request may wait."""
+
+    def __init__(
+        self,
+        deadlines: Optional[Mapping[ServerType, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize request deadlines.
+
+        Args:
+            deadlines (Mapping[ServerType, float]): Seconds a request of
+                each class may wait before its handler starts (default:
+                ``DEFAULT_DEADLINES``). Classes left out have none.
+            clock (Callable): The monotonic clock servers stamp requests
+                with, for tests.
+        """
+        self.deadlines = dict(DEFAULT_DEADLINES if deadlines is None else deadlines)
+        if any(seconds <= 0 for seconds in self.deadlines.values()):
+            raise ValueError("deadlines must be positive")
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._expired = {server_type: [0, 0.0, 0.0] for server_type in ServerType}
+
+    def expired(self, server_type: ServerType, received_at: Optional[float]) -> bool:
+        """True, and counted, if a request read at ``received_at`` is too old."""
+        deadline = self.deadlines.get(server_type)
+        if deadline is None or received_at is None:
+            return False
+        waited = self.clock() - received_at
+        if waited < deadline:
+            return False
+        with self._lock:
+            counters = self._expired[server_type]
+            counters[0] += 1
+            counters[1] += waited
+            counters[2] = max(counters[2], waited)
+        return True
+
+    def stats(self) -> dict[ServerType, DeadlineStats]:
+        """Return the expiry counters of each class."""
+        with self._lock:
+            return {
+                server_type: DeadlineStats(int(count), total, longest)
+                for server_type, (count, total, longest) in self._expired.items()
+            }
@@ -6,10 +6,24 @@ response without re-running the handler. The duplicate key is
 
 The cache here is in-memory only (RFC 5080 permits dropping state on
 restart). Entries are evicted on TTL expiry or when the LRU cap is hit.
+
+Every field of the key sits at a fixed offset in the first 20 bytes of
+the datagram, so servers consult the cache with ``precheck_cache``
+before decoding: a retransmission is answered or dropped without the
+parse, Request Authenticator and Message-Authenticator work a fresh
+request costs. Each entry also remembers a digest of the request it
+answered, and a cached reply is only replayed for the same bytes, so a
+forged packet that copies a header is not answered from the cache.
 """
 
 from __future__ import annotations
 
+import hashlib
+import heapq
+import itertools
+import socket
+import struct
+import sys
 import threading
 import time
 from collections import OrderedDict
@@ -18,6 +32,7 @@ from enum import IntEnum
 from typing import Any, Callable, Optional
 
 from pyrad2.constants import PacketType
+from pyrad2.radsec.v11 import RadiusVersion
 
 # Codes for which RFC 5080 dedup applies. Replies (Access-Accept etc.) and
 # Status-Server packets are explicitly excluded.
@@ -91,12 +106,188 @@ def key_for(pkt: Any, source: Any = None) -> Optional[DedupKey]:
     return DedupKey(src[0], src[1], int(code), int(ident), bytes(correlator))
 
 
+def key_for_datagram(
+    data: bytes,
+    source: Any,
+    radius_version: RadiusVersion = RadiusVersion.V1_0,
+) -> Optional[DedupKey]:
+    """Build the dedup key from a raw request header, without decoding.
+
+    Equal to ``key_for`` on the decoded packet, so requests keyed either
+    way share cache entries. For RADIUS/1.1 the correlator is the 4-byte
+    Token and the Identifier reads as 0, as after decoding. Returns
+    ``None`` for short datagrams and codes the spec excludes from dedup.
+    """
+    if len(data) < 20 or data[0] not in _DEDUPABLE_CODES:
+        return None
+    if not source or len(source) < 2:
+        return None
+    if radius_version == RadiusVersion.V1_1:
+        return DedupKey(source[0], source[1], data[0], 0, bytes(data[4:8]))
+    return DedupKey(source[0], source[1], data[0], data[1], bytes(data[4:20]))
+
+
+def raw_request(pkt: Any) -> Optional[bytes]:
+    """Return the datagram ``pkt`` was decoded from, if it kept one."""
+    raw = getattr(pkt, "raw_packet", None)
+    return bytes(raw) if isinstance(raw, (bytes, bytearray)) else None
+
+
+def request_digest(data: bytes) -> bytes:
+    """Return the digest a cache entry keeps of the request it answered."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+_KEY_HEADER = struct.Struct("!BHBB")
+
+
+def pack_key(key: DedupKey) -> bytes:
+    """Pack ``key`` into the compact binary form the cache stores.
+
+    Layout: address length, port, code, Identifier, then the address
+    (4 or 16 bytes for IP literals, UTF-8 otherwise) and the correlator.
+    """
+    src_ip = str(key.src_ip)
+    try:
+        family = socket.AF_INET6 if ":" in src_ip else socket.AF_INET
+        address = socket.inet_pton(family, src_ip)
+    except OSError:
+        address = src_ip.encode()
+    return (
+        _KEY_HEADER.pack(len(address), int(key.src_port), key.code, key.identifier)
+        + address
+        + key.request_authenticator
+    )
+
+
+_CacheEntry = tuple[bytes, float, Optional[bytes]]  # reply, expires_at, digest
+
+# Rough cost of the containers around each entry's key and reply: the
+# entry tuple and its float, the expiry-heap item, and the OrderedDict
+# slot and link.
+_ENTRY_OVERHEAD = 2 * (sys.getsizeof((0.0, 0, b"")) + sys.getsizeof(0.0)) + 100
+
+
+def _entry_size(packed: bytes, raw: bytes, digest: Optional[bytes]) -> int:
+    size = sys.getsizeof(packed) + sys.getsizeof(raw) + _ENTRY_OVERHEAD
+    if digest is not None:
+        size += sys.getsizeof(digest)
+    return size
+
+
+@dataclass(frozen=True, slots=True)
+class CacheStats:
+    """Point-in-time counters of a ``ResponseCache``.
+
+    ``misses`` counts requests that went on to their handler;
+    ``in_flight_drops`` counts duplicates of a request still being
+    handled. Evictions are split by cause: TTL expiry, the
+    ``max_entries`` cap, the ``max_bytes`` budget, and replies too large
+    to cache at all.
+    """
+
+    entries: int
+    bytes_used: int
+    in_flight: int
+    hits: int
+    misses: int
+    in_flight_drops: int
+    expired: int
+    evicted_entries: int
+    evicted_bytes: int
+    rejected_oversize: int
+
+
+class _Shard:
+    """One independently locked slice of a ``ResponseCache``."""
+
+    __slots__ = (
+        "lock",
+        "in_flight",
+        "cached",
+        "expiry",
+        "seq",
+        "max_entries",
+        "max_bytes",
+        "bytes_used",
+        "hits",
+        "misses",
+        "in_flight_drops",
+        "expired",
+        "evicted_entries",
+        "evicted_bytes",
+        "rejected_oversize",
+    )
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int]) -> None:
+        self.lock = threading.RLock()
+        # In-flight packed keys, with the digest of the request.
+        self.in_flight: dict[bytes, Optional[bytes]] = {}
+        # OrderedDict ordered by recency of insert/refresh — newest at end.
+        self.cached: "OrderedDict[bytes, _CacheEntry]" = OrderedDict()
+        # Min-heap of (expires_at, seq, key), one item per record_reply.
+        # Items whose entry was since replaced or evicted are skipped.
+        self.expiry: list[tuple[float, int, bytes]] = []
+        self.seq = itertools.count()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.in_flight_drops = 0
+        self.expired = 0
+        self.evicted_entries = 0
+        self.evicted_bytes = 0
+        self.rejected_oversize = 0
+
+    def remove(self, key: bytes) -> None:
+        raw, _, digest = self.cached.pop(key)
+        self.bytes_used -= _entry_size(key, raw, digest)
+
+    def pop_oldest(self) -> None:
+        key, (raw, _, digest) = self.cached.popitem(last=False)
+        self.bytes_used -= _entry_size(key, raw, digest)
+
+    def expire(self, now: float) -> int:
+        """Remove entries that expired by ``now``; caller holds the lock."""
+        removed = 0
+        expiry = self.expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, _, key = heapq.heappop(expiry)
+            entry = self.cached.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self.remove(key)
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def compact_expiry(self) -> None:
+        """Rebuild the heap once skipped items outnumber live entries."""
+        if len(self.expiry) > 2 * len(self.cached) + 64:
+            self.expiry = [
+                (expires_at, next(self.seq), key)
+                for key, (_, expires_at, _) in self.cached.items()
+            ]
+            heapq.heapify(self.expiry)
+
+
 class ResponseCache:
     """LRU+TTL cache of reply bytes keyed by ``DedupKey``.
 
     Thread-safe so it can be shared between the sync server's main loop
-    and any worker threads a subclass may use. The async server reuses
+    and its handler threads (``workers``). The async server reuses
     the same class without contention.
+
+    Keys are spread over ``shards`` independently locked shards, so
+    threads touching different keys don't wait on each other. Each shard
+    keeps an expiry heap: expired entries are removed in time
+    proportional to their number, wherever they sit in the LRU order.
+    ``max_entries`` and ``max_bytes`` are split evenly between the
+    shards, so with more than one shard the caps apply per shard.
+
+    Keys are stored packed into a few dozen bytes rather than as
+    ``DedupKey`` objects. ``max_bytes`` bounds the approximate memory of
+    keys, replies and their bookkeeping; ``stats()`` reports usage.
     """
 
     def __init__(
@@ -104,80 +295,183 @@ class ResponseCache:
         ttl: float = 30.0,
         max_entries: int = 4096,
         clock: Callable[[], float] = time.monotonic,
+        shards: int = 1,
+        max_bytes: Optional[int] = None,
     ) -> None:
         if ttl <= 0:
             raise ValueError("ttl must be positive")
         if max_entries <= 0:
             raise ValueError("max_entries must be positive")
+        if shards <= 0:
+            raise ValueError("shards must be positive")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
         self.ttl = ttl
         self.max_entries = max_entries
+        self.max_bytes = max_bytes
         self._clock = clock
-        self._lock = threading.RLock()
-        self._in_flight: set[DedupKey] = set()
-        # OrderedDict ordered by recency of insert/refresh — newest at end.
-        self._cached: "OrderedDict[DedupKey, tuple[bytes, float]]" = OrderedDict()
-
-    def lookup(self, key: DedupKey):
-        """Return cached reply bytes, the IN_FLIGHT sentinel, or ``None``."""
-        with self._lock:
-            entry = self._cached.get(key)
-            if entry is not None:
-                raw, expires_at = entry
-                if self._clock() < expires_at:
-                    self._cached.move_to_end(key)
+        per_shard = -(-max_entries // shards)
+        shard_bytes = None if max_bytes is None else max_bytes // shards
+        self._shards = tuple(_Shard(per_shard, shard_bytes) for _ in range(shards))
+
+    @property
+    def shards(self) -> int:
+        return len(self._shards)
+
+    def _shard(self, packed: bytes) -> _Shard:
+        return self._shards[hash(packed) % len(self._shards)]
+
+    def lookup(self, key: DedupKey, request: Optional[bytes] = None):
+        """Return cached reply bytes, the IN_FLIGHT sentinel, or ``None``.
+
+        With ``request`` (the raw request datagram), a cached reply is
+        only returned if it answered those exact bytes.
+        """
+        packed = pack_key(key)
+        shard = self._shard(packed)
+        with shard.lock:
+            return self._lookup_locked(shard, packed, request)
+
+    def lookup_or_mark(self, key: DedupKey, request: Optional[bytes] = None):
+        """``lookup``, marking ``key`` in flight if nothing is found.
+
+        The check and the mark are made under one lock, so of two threads
+        handed the same request only one gets ``None`` and handles it.
+        """
+        packed = pack_key(key)
+        shard = self._shard(packed)
+        with shard.lock:
+            entry = self._lookup_locked(shard, packed, request)
+            if entry is None:
+                shard.in_flight[packed] = (
+                    request_digest(request) if request is not None else None
+                )
+                shard.misses += 1
+            return entry
+
+    def _lookup_locked(self, shard: _Shard, packed: bytes, request: Optional[bytes]):
+        """``lookup`` body; the caller holds ``shard.lock``."""
+        entry = shard.cached.get(packed)
+        if entry is not None:
+            raw, expires_at, digest = entry
+            if self._clock() < expires_at:
+                if (
+                    request is None
+                    or digest is None
+                    or digest == request_digest(request)
+                ):
+                    shard.cached.move_to_end(packed)
+                    shard.hits += 1
                     return raw
-                del self._cached[key]
-            if key in self._in_flight:
-                return IN_FLIGHT
-            return None
+            else:
+                shard.remove(packed)
+                shard.expired += 1
+        if packed in shard.in_flight:
+            shard.in_flight_drops += 1
+            return IN_FLIGHT
+        return None
 
-    def mark_in_flight(self, key: DedupKey) -> None:
-        with self._lock:
-            self._in_flight.add(key)
+    def mark_in_flight(self, key: DedupKey, request: Optional[bytes] = None) -> None:
+        """Mark ``key`` as being handled; ``request`` is its raw datagram."""
+        digest = request_digest(request) if request is not None else None
+        packed = pack_key(key)
+        shard = self._shard(packed)
+        with shard.lock:
+            shard.in_flight[packed] = digest
+            shard.misses += 1
 
     def drop_in_flight(self, key: DedupKey) -> None:
-        with self._lock:
-            self._in_flight.discard(key)
+        packed = pack_key(key)
+        shard = self._shard(packed)
+        with shard.lock:
+            shard.in_flight.pop(packed, None)
 
     def record_reply(
         self, key: DedupKey, raw: bytes, ttl: Optional[float] = None
     ) -> None:
-        """Atomically transition the entry from in-flight to cached."""
+        """Atomically transition the entry from in-flight to cached.
+
+        The entry keeps the request digest given to ``mark_in_flight``.
+        A reply bigger than a shard's share of ``max_bytes`` is not
+        cached.
+        """
         if not isinstance(raw, (bytes, bytearray)):
             raise TypeError("raw must be bytes")
-        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
-        with self._lock:
-            self._in_flight.discard(key)
-            self._cached[key] = (bytes(raw), expires_at)
-            self._cached.move_to_end(key)
-            self._evict_locked()
+        raw = bytes(raw)
+        now = self._clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        packed = pack_key(key)
+        shard = self._shard(packed)
+        with shard.lock:
+            digest = shard.in_flight.pop(packed, None)
+            if packed in shard.cached:
+                shard.remove(packed)
+            size = _entry_size(packed, raw, digest)
+            if shard.max_bytes is not None and size > shard.max_bytes:
+                shard.rejected_oversize += 1
+                return
+            shard.cached[packed] = (raw, expires_at, digest)
+            shard.bytes_used += size
+            heapq.heappush(shard.expiry, (expires_at, next(shard.seq), packed))
+            shard.expire(now)
+            # Enforce the LRU caps.
+            while len(shard.cached) > shard.max_entries:
+                shard.pop_oldest()
+                shard.evicted_entries += 1
+            if shard.max_bytes is not None:
+                while shard.bytes_used > shard.max_bytes:
+                    shard.pop_oldest()
+                    shard.evicted_bytes += 1
+            shard.compact_expiry()
+
+    def sweep(self) -> int:
+        """Remove every expired entry and return how many were removed.
+
+        ``record_reply`` already expires entries in the shard it writes
+        to; servers call this periodically so memory is also returned
+        when replies stop.
+        """
+        now = self._clock()
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                removed += shard.expire(now)
+                shard.compact_expiry()
+        return removed
+
+    def stats(self) -> CacheStats:
+        """Return current usage and the counters since creation."""
+        totals = dict.fromkeys(CacheStats.__slots__, 0)
+        for shard in self._shards:
+            with shard.lock:
+                totals["entries"] += len(shard.cached)
+                totals["in_flight"] += len(shard.in_flight)
+                for name in CacheStats.__slots__:
+                    if name not in ("entries", "in_flight"):
+                        totals[name] += getattr(shard, name)
+        return CacheStats(**totals)
 
     def clear(self) -> None:
-        with self._lock:
-            self._cached.clear()
-            self._in_flight.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.cached.clear()
+                shard.in_flight.clear()
+                shard.expiry.clear()
+                shard.bytes_used = 0
 
     def __len__(self) -> int:
-        with self._lock:
-            return len(self._cached)
-
-    def _evict_locked(self) -> None:
-        now = self._clock()
-        # Drop expired entries from the front (oldest).
-        while self._cached:
-            key, (_, expires_at) = next(iter(self._cached.items()))
-            if expires_at > now:
-                break
-            del self._cached[key]
-        # Enforce the LRU cap.
-        while len(self._cached) > self.max_entries:
-            self._cached.popitem(last=False)
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += len(shard.cached)
+        return total
 
 
 def consult_cache(
     cache: Optional[ResponseCache],
     key: Optional[DedupKey],
     resend: Callable[[bytes], None],
+    request: Optional[bytes] = None,
 ) -> DispatchAction:
     """Single point of policy for the dedup state machine.
 
@@ -189,16 +483,39 @@ def consult_cache(
     - ``DROP`` if a duplicate arrived while the original is in-flight.
     - ``RESENT`` if a cached reply was found; ``resend(raw_bytes)`` has
       already been invoked.
+
+    ``request`` is the raw request datagram, when known; see
+    ``ResponseCache.lookup``.
     """
     if cache is None or key is None:
         return DispatchAction.PROCESS
-    entry = cache.lookup(key)
+    return _action_for(cache.lookup_or_mark(key, request), resend)
+
+
+def precheck_cache(
+    cache: Optional[ResponseCache],
+    key: Optional[DedupKey],
+    resend: Callable[[bytes], None],
+    request: Optional[bytes] = None,
+) -> DispatchAction:
+    """``consult_cache`` without marking anything in flight.
+
+    For the check on the raw datagram before decoding: a request that
+    gets ``PROCESS`` here is decoded and verified, then consulted again
+    with ``consult_cache`` before its handler runs.
+    """
+    if cache is None or key is None:
+        return DispatchAction.PROCESS
+    return _action_for(cache.lookup(key, request), resend)
+
+
+def _action_for(entry: Any, resend: Callable[[bytes], None]) -> DispatchAction:
+    """Map a ``lookup`` result to an action, resending a cached reply."""
     if entry is IN_FLIGHT:
         return DispatchAction.DROP
     if entry is not None:
-        resend(entry)  # type: ignore[arg-type]
+        resend(entry)
         return DispatchAction.RESENT
-    cache.mark_in_flight(key)
     return DispatchAction.PROCESS
 
 
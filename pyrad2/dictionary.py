@@ -100,7 +100,9 @@ page for the upstream-corpus test suite.
 """
 
 from copy import copy
-from typing import Any, Dict, Hashable, Optional
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, Optional
 
 from pyrad2 import bidict, dictfile, tools
 from pyrad2.constants import DATATYPES
@@ -173,6 +175,78 @@ class Attribute:
                 self.values.add(key, value)
 
 
+# Container datatypes whose packet storage is a ``{sub_code: ...}`` map.
+CONTAINER_TYPES = frozenset(("tlv", "extended", "long-extended"))
+
+# Fixed wire-byte length for every type that ``array`` is meaningful
+# for (RFC 8044 §3.8). Variable-length types (string, octets, …) can't
+# be ``array`` and aren't represented here.
+FIXED_WIRE_SIZE: Dict[str, int] = {
+    "byte": 1,
+    "short": 2,
+    "integer": 4,
+    "integer64": 8,
+    "signed": 4,
+    "date": 4,
+    "ipaddr": 4,
+    "ipv6addr": 16,
+    "ifid": 8,
+    "ether": 6,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class AttributeCodec:
+    """Everything the packet codec needs about one attribute, resolved once.
+
+    ``Dictionary`` compiles one per attribute after each file is loaded
+    and indexes them by name (``codecs``) and by index key
+    (``codecs_by_key``), so ``Packet`` answers "what is this key?" with a
+    single dict hit instead of a BiDict lookup plus an ``Attribute`` walk.
+
+    Attributes:
+        attribute (Attribute): The underlying dictionary definition.
+        name (str): Attribute name.
+        key (Hashable): Key the attribute is stored under in a
+            ``Packet``: the code for standard and TLV-nested attributes,
+            ``(vendor_id, code)`` for VSAs, the 4-tuple for EVS-VSAs.
+        container (str): ``tlv``, ``extended`` or ``long-extended`` for
+            container attributes, else None.
+        nested (bool): Stored inside a parent container rather than at
+            the top level of the packet (TLV-style sub-attributes).
+        parents (tuple[Attribute, ...]): Enclosing containers,
+            outermost first. Empty for top-level attributes.
+        storage_path (tuple): Keys from the packet down to the map that
+            holds a nested attribute: the outermost parent's ``key``
+            followed by the codes of the inner parents.
+        wire_size (int): Fixed value length in bytes, or None.
+        encode (Callable): Value encoder bound to the datatype.
+        decode (Callable): Value decoder bound to the datatype.
+    """
+
+    attribute: Attribute
+    name: str
+    key: Hashable
+    type: str
+    container: Optional[str]
+    encrypt: int
+    has_tag: bool
+    concat: bool
+    virtual: bool
+    array: bool
+    nested: bool
+    parents: tuple[Attribute, ...]
+    storage_path: tuple[Hashable, ...]
+    wire_size: Optional[int]
+    encode: Callable[[Any], Any]
+    decode: Callable[[Any], Any]
+
+    @property
+    def values(self) -> bidict.BiDict:
+        """Named values of the attribute (live, shared with ``attribute``)."""
+        return self.attribute.values
+
+
 # Stored vendor format: (type_len, len_len, has_continuation). The
 # continuation flag corresponds to the trailing ``,c`` in FreeRADIUS's
 # ``format=`` syntax (RFC 5904 / WiMAX long-packed VSAs).
@@ -219,6 +293,8 @@ class Dictionary:
         self.attrindex = bidict.BiDict()
         self.attributes: Dict[Hashable, Any] = {}
         self.vendor_formats: Dict[int, tuple[int, int, bool]] = {}
+        self.codecs: Dict[Hashable, AttributeCodec] = {}
+        self.codecs_by_key: Dict[Hashable, AttributeCodec] = {}
         self.defer_parse: list[tuple[Dict, list]] = []
         self._include_base_dir = include_base_dir
 
@@ -666,3 +742,70 @@ class Dictionary:
             if key == "VALUE":
                 self.__parse_value(state, tokens, False)
         self.defer_parse = []
+        self._compile_codecs()
+
+    def _compile_codecs(self) -> None:
+        """Rebuild ``codecs`` / ``codecs_by_key`` from the loaded attributes.
+
+        Codecs for attributes an earlier file already defined are reused,
+        so loading N files one after another stays linear.
+        """
+        previous = self.codecs
+        codecs: Dict[Hashable, AttributeCodec] = {}
+        for name, attr in self.attributes.items():
+            codec = previous.get(name)
+            if codec is None or codec.attribute is not attr:
+                codec = self._compile_codec(attr)
+            codecs[name] = codec
+        self.codecs = codecs
+        self.codecs_by_key = {
+            key: codecs[name]
+            for key, name in self.attrindex.backward.items()
+            if name in codecs
+        }
+
+    def _storage_key(self, attr: Attribute) -> Hashable:
+        if attr.is_sub_attribute and attr.parent and attr.parent.type == "evs":
+            # EVS-VSA: only the attrindex entry carries all four parts of
+            # (extended_wrapper, evs_slot, vendor_id, vendor_type).
+            return self.attrindex.get_forward(attr.name)
+        if attr.vendor and not attr.is_sub_attribute:
+            return (self.vendors.get_forward(attr.vendor), attr.code)
+        return attr.code
+
+    def _compile_codec(self, attr: Attribute) -> AttributeCodec:
+        nested = attr.is_sub_attribute and not (
+            attr.parent is not None and attr.parent.type == "evs"
+        )
+        parents: list[Attribute] = []
+        cur = attr.parent if nested else None
+        while cur is not None:
+            parents.append(cur)
+            cur = cur.parent if cur.is_sub_attribute else None
+        parents.reverse()
+        storage_path: tuple[Hashable, ...] = ()
+        if parents:
+            storage_path = (
+                self._storage_key(parents[0]),
+                *(parent.code for parent in parents[1:]),
+            )
+        return AttributeCodec(
+            attribute=attr,
+            name=attr.name,
+            key=self._storage_key(attr),
+            type=attr.type,
+            container=attr.type if attr.type in CONTAINER_TYPES else None,
+            encrypt=attr.encrypt,
+            has_tag=attr.has_tag,
+            concat=attr.concat,
+            virtual=attr.virtual,
+            array=attr.array,
+            nested=nested,
+            parents=tuple(parents),
+            storage_path=storage_path,
+            wire_size=FIXED_WIRE_SIZE.get(attr.type),
+            encode=tools.ENCODERS.get(attr.type)
+            or partial(tools.encode_attr, attr.type),
+            decode=tools.DECODERS.get(attr.type)
+            or partial(tools.decode_attr, attr.type),
+        )
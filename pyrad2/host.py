@@ -133,6 +133,7 @@ class _ClientPacketFactoryMixin:
     # set these in ``__init__``; the mixin treats them as read-only.
     secret: bytes
     dict: Optional[Dictionary]
+    _secret_context: Optional[packet.SecretContext] = None
 
     # Server-type labels passed through to ``_allocate_packet_id`` so a
     # subclass can pick the right id space when it manages a counter
@@ -143,6 +144,15 @@ class _ClientPacketFactoryMixin:
     _COA_SERVER_TYPE = "coa"
     _STATUS_SERVER_TYPE = "auth"
 
+    @property
+    def secret_context(self) -> "packet.SecretContext":
+        """Precomputed hash state for ``secret``, shared by every packet
+        this client builds and rebuilt if ``secret`` is reassigned."""
+        self._secret_context = packet.SecretContext.for_secret(
+            self._secret_context, self.secret
+        )
+        return self._secret_context
+
     def _allocate_packet_id(self, server_type: str) -> Optional[int]:
         """Return the id to inject, or ``None`` to defer to ``Packet``'s
         module-level counter. Override on async / RadSec to provide a
@@ -169,6 +179,7 @@ class _ClientPacketFactoryMixin:
         """Construct ``cls`` with ``dict`` and ``secret`` from ``self`` and
         an optional ``id`` from ``_allocate_packet_id``."""
         kwargs.setdefault("secret", self.secret)
+        kwargs.setdefault("secret_context", self.secret_context)
         kwargs.setdefault("dict", self.dict)
         if "id" not in kwargs:
             pkt_id = self._allocate_packet_id(server_type)
@@ -0,0 +1,358 @@
+"""Request counters and latency histograms, for Prometheus or as a dict.
+
+Servers and clients take a ``Metrics`` registry, and several can share
+one::
+
+    metrics = Metrics()
+    server = MyServer(dictionary=dictionary, hosts=hosts, metrics=metrics)
+    client = ClientAsync(server="10.0.0.1", secret=b"secret", metrics=metrics)
+
+    body = metrics.prometheus()  # text exposition format, for /metrics
+    data = metrics.snapshot()  # the same samples as plain dicts
+
+Without a registry, each place that would record something costs one
+``is None`` test.
+
+The servers (``Server``, ``ServerAsync`` and ``RadSecServer``) record:
+
+- ``pyrad2_requests_total{listener, code, nas}``: datagrams read from a
+  known NAS, whatever became of them.
+- ``pyrad2_drops_total{reason}``: requests that never reached a handler,
+  by ``DropReason``. ``resent`` counts retransmissions answered from the
+  dedup cache.
+- ``pyrad2_handler_seconds{code}``: time spent handling a request.
+
+The clients (``ClientAsync`` and ``RadSecClient``) record:
+
+- ``pyrad2_client_requests_total{server, code}``
+- ``pyrad2_client_retransmits_total{server, code}``
+- ``pyrad2_client_timeouts_total{server, code}``: requests that ran out
+  of retries.
+- ``pyrad2_client_seconds{server, code}``: time to a valid reply,
+  retransmissions included.
+
+The UDP servers also register collectors that read their dedup cache,
+admission, deadline, scheduler and handler-thread ``*_stats()`` each time
+the registry is exported. Servers sharing a registry have these summed.
+
+Histograms share fixed log-scale buckets, ``LATENCY_BUCKETS``, from
+100 µs doubling up to about 13 s. Each thread records into a table of
+its own, so recording takes no lock; exporting adds the tables up.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import Any, Callable, Iterable
+
+from pyrad2.constants import PacketType
+
+# Upper bounds of the histogram buckets, in seconds; +Inf is implied.
+LATENCY_BUCKETS: tuple[float, ...] = tuple(0.0001 * 2**i for i in range(18))
+
+_CODE_NAMES = {int(code): code.name for code in PacketType}
+
+
+class DropReason(Enum):
+    """Why a request never reached its handler."""
+
+    UNKNOWN_HOST = "unknown_host"
+    MALFORMED = "malformed"
+    BAD_AUTHENTICATOR = "bad_authenticator"
+    MESSAGE_AUTHENTICATOR = "message_authenticator"
+    DUPLICATE = "duplicate"
+    RESENT = "resent"
+    SHED = "shed"
+    EXPIRED = "expired"
+    QUEUE_FULL = "queue_full"
+    WORKER_FAILED = "worker_failed"
+
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Sample:
+    """One value read by a collector; ``name`` excludes the prefix."""
+
+    name: str
+    value: float
+    labels: Labels = ()
+    kind: str = "gauge"
+    help: str = ""
+
+
+Collector = Callable[[], Iterable[Sample]]
+
+# name: (type, help, label names)
+_FAMILIES: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "requests_total": (
+        "counter",
+        "Datagrams read from known NASes.",
+        ("listener", "code", "nas"),
+    ),
+    "drops_total": (
+        "counter",
+        "Requests that did not reach a handler, by reason.",
+        ("reason",),
+    ),
+    "handler_seconds": (
+        "histogram",
+        "Time spent handling a request.",
+        ("code",),
+    ),
+    "client_requests_total": (
+        "counter",
+        "Requests sent by clients.",
+        ("server", "code"),
+    ),
+    "client_retransmits_total": (
+        "counter",
+        "Requests clients sent again after no reply.",
+        ("server", "code"),
+    ),
+    "client_timeouts_total": (
+        "counter",
+        "Client requests that ran out of retries.",
+        ("server", "code"),
+    ),
+    "client_seconds": (
+        "histogram",
+        "Client time to a valid reply, retransmissions included.",
+        ("server", "code"),
+    ),
+}
+
+
+def code_name(code: int) -> str:
+    """Return the ``PacketType`` name of ``code``, or the number."""
+    return _CODE_NAMES.get(code) or str(code)
+
+
+def stats_samples(
+    name: str,
+    stats: Any,
+    counters: Iterable[str] = (),
+    labels: Labels = (),
+) -> list[Sample]:
+    """Return a ``<name>_<field>`` sample for each field of a stats dataclass.
+
+    Fields listed in ``counters`` become ``<name>_<field>_total``
+    counters; the rest are gauges.
+    """
+    counters = frozenset(counters)
+    samples = []
+    for field in fields(stats):
+        value = float(getattr(stats, field.name))
+        if field.name in counters:
+            samples.append(
+                Sample(f"{name}_{field.name}_total", value, labels, "counter")
+            )
+        else:
+            samples.append(Sample(f"{name}_{field.name}", value, labels))
+    return samples
+
+
+class Metrics:
+    """Registry of the counters and histograms of servers and clients."""
+
+    def __init__(self, prefix: str = "pyrad2"):
+        """Initialize a registry.
+
+        Args:
+            prefix (str): Prepended to every metric name.
+        """
+        self.prefix = prefix
+        self._local = threading.local()
+        # Guards the list of per-thread tables and the collectors, not
+        # the tables themselves: only their own thread writes to those.
+        self._lock = threading.Lock()
+        self._tables: list[dict[tuple, Any]] = []
+        self._collectors: list[Collector] = []
+
+    # --- Recording ------------------------------------------------------
+    def request(self, listener: str, code: int, nas: str) -> None:
+        """Count a datagram read on ``listener`` from NAS ``nas``."""
+        self._inc("requests_total", (listener, code_name(code), nas))
+
+    def drop(self, reason: DropReason) -> None:
+        """Count a request dropped for ``reason``."""
+        self._inc("drops_total", (reason.value,))
+
+    def handled(self, code: int, seconds: float) -> None:
+        """Record how long handling a request with ``code`` took."""
+        self._observe("handler_seconds", (code_name(code),), seconds)
+
+    def client_request(self, server: str, code: int) -> None:
+        """Count a request a client sent to ``server``."""
+        self._inc("client_requests_total", (server, code_name(code)))
+
+    def client_retransmit(self, server: str, code: int) -> None:
+        """Count a request a client sent to ``server`` again."""
+        self._inc("client_retransmits_total", (server, code_name(code)))
+
+    def client_timeout(self, server: str, code: int) -> None:
+        """Count a client request to ``server`` that ran out of retries."""
+        self._inc("client_timeouts_total", (server, code_name(code)))
+
+    def client_reply(self, server: str, code: int, seconds: float) -> None:
+        """Record the time a request with ``code`` took to be answered."""
+        self._observe("client_seconds", (server, code_name(code)), seconds)
+
+    def add_collector(self, collector: Collector) -> None:
+        """Call ``collector`` for more samples whenever the registry is read."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    # --- Export ---------------------------------------------------------
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        """Return every metric, by full name, as a list of samples.
+
+        Each sample is ``{"labels": {...}, "value": n}``. Histogram
+        samples carry ``count``, ``sum`` and ``buckets``, the cumulative
+        count by upper bound, instead of ``value``.
+        """
+        result: dict[str, list[dict[str, Any]]] = {}
+        recorded = self._recorded()
+        for name, (kind, _, label_names) in _FAMILIES.items():
+            for labels, value in recorded.get(name, ()):
+                sample: dict[str, Any] = {"labels": dict(zip(label_names, labels))}
+                if kind == "histogram":
+                    sample["count"] = int(value[-2])
+                    sample["sum"] = value[-1]
+                    sample["buckets"] = dict(_cumulative(value))
+                else:
+                    sample["value"] = value
+                result.setdefault(self._name(name), []).append(sample)
+        for name, (_, _, samples) in self._collected().items():
+            result[self._name(name)] = [
+                {"labels": dict(labels), "value": value}
+                for labels, value in samples.items()
+            ]
+        return result
+
+    def prometheus(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        recorded = self._recorded()
+        for name, (kind, description, label_names) in _FAMILIES.items():
+            samples = recorded.get(name)
+            if not samples:
+                continue
+            full = self._name(name)
+            lines += [f"# HELP {full} {description}", f"# TYPE {full} {kind}"]
+            for labels, value in samples:
+                pairs = tuple(zip(label_names, labels))
+                if kind != "histogram":
+                    lines.append(f"{full}{_labels(pairs)} {_number(value)}")
+                    continue
+                for bound, count in _cumulative(value):
+                    bucket = _labels(pairs + (("le", bound),))
+                    lines.append(f"{full}_bucket{bucket} {count}")
+                lines.append(f"{full}_sum{_labels(pairs)} {_number(value[-1])}")
+                lines.append(f"{full}_count{_labels(pairs)} {int(value[-2])}")
+        for name, (kind, description, collected) in self._collected().items():
+            full = self._name(name)
+            if description:
+                lines.append(f"# HELP {full} {description}")
+            lines.append(f"# TYPE {full} {kind}")
+            for pairs, value in collected.items():
+                lines.append(f"{full}{_labels(pairs)} {_number(value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    # --- Internals ------------------------------------------------------
+    def _name(self, name: str) -> str:
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    def _table(self) -> dict[tuple, Any]:
+        try:
+            return self._local.table
+        except AttributeError:
+            table: dict[tuple, Any] = {}
+            self._local.table = table
+            with self._lock:
+                self._tables.append(table)
+            return table
+
+    def _inc(self, family: str, labels: tuple[str, ...]) -> None:
+        table = self._table()
+        key = (family, labels)
+        table[key] = table.get(key, 0) + 1
+
+    def _observe(self, family: str, labels: tuple[str, ...], seconds: float) -> None:
+        table = self._table()
+        key = (family, labels)
+        counts = table.get(key)
+        if counts is None:
+            # One slot per bucket, +Inf, then the sum of observations.
+            counts = table[key] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+        counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        counts[-1] += seconds
+
+    def _totals(self) -> dict[tuple, Any]:
+        with self._lock:
+            tables = list(self._tables)
+        totals: dict[tuple, Any] = {}
+        for table in tables:
+            for key, value in table.copy().items():
+                if isinstance(value, list):
+                    merged = totals.get(key)
+                    if merged is None:
+                        totals[key] = list(value)
+                    else:
+                        for i, count in enumerate(value):
+                            merged[i] += count
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _recorded(self) -> dict[str, list[tuple[tuple[str, ...], Any]]]:
+        """Return the recorded samples by family, sorted by labels."""
+        grouped: dict[str, list[tuple[tuple[str, ...], Any]]] = {}
+        for (family, labels), value in self._totals().items():
+            if isinstance(value, list):
+                # The +Inf slot becomes the count of all observations.
+                value = value[:-2] + [sum(value[:-1]), value[-1]]
+            grouped.setdefault(family, []).append((labels, value))
+        for samples in grouped.values():
+            samples.sort(key=lambda sample: sample[0])
+        return grouped
+
+    def _collected(self) -> dict[str, tuple[str, str, dict[Labels, float]]]:
+        with self._lock:
+            collectors = list(self._collectors)
+        collected: dict[str, tuple[str, str, dict[Labels, float]]] = {}
+        for collector in collectors:
+            for sample in collector():
+                values = collected.setdefault(
+                    sample.name, (sample.kind, sample.help, {})
+                )[2]
+                values[sample.labels] = values.get(sample.labels, 0.0) + sample.value
+        return collected
+
+
+def _cumulative(counts: list[float]) -> list[tuple[str, int]]:
+    """Return ``(le, count)`` pairs of a histogram's cumulative buckets."""
+    result = []
+    running = 0.0
+    for bound, count in zip(LATENCY_BUCKETS, counts):
+        running += count
+        result.append((f"{bound:g}", int(running)))
+    result.append(("+Inf", int(counts[-2])))
+    return result
+
+
+def _labels(pairs: Iterable[tuple[str, str]]) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}" if text else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -0,0 +1,165 @@
+"""Run CPU-heavy request work in worker processes.
+
+Decoding, Request Authenticator and Message-Authenticator checks,
+``pw_decrypt`` and MS-CHAPv2 verification are pure Python, so on the
+event loop they cap a server at one core. ``ServerAsync`` and
+``RadSecServer`` accept an ``executor`` (normally from
+``create_executor``) together with ``worker_handlers``, a mapping from
+request code to a module-level function. For those codes the loop only
+ships the raw datagram, the shared secret and the handler reference to
+the pool; the worker runs parse → verify → handler → encode and returns
+the reply bytes. I/O, host lookup and the RFC 5080 dedup cache stay on
+the loop.
+
+A request the worker rejects raises ``DroppedRequest``, a ``PacketError``
+that names the ``DropReason``, so the server counts it the way it counts
+the requests it rejects itself.
+
+Workers load the dictionary once, in ``init_worker``, so it is never
+pickled per request. Worker handlers take the decoded request and return
+the reply packet, or ``None`` to send nothing::
+
+    def authenticate(pkt):
+        reply = pkt.create_reply()
+        reply.code = PacketType.AccessAccept
+        return reply
+
+    server = MyServer(
+        executor=offload.create_executor("dictionary"),
+        worker_handlers={PacketType.AccessRequest: authenticate},
+    )
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from pyrad2.dictionary import Dictionary
+from pyrad2.exceptions import PacketError
+from pyrad2.metrics import DropReason
+from pyrad2.packet import Packet, SecretContext, parse_packet
+from pyrad2.radsec.v11 import RadiusVersion
+from pyrad2.router import RequestRouter
+
+WorkerHandler = Callable[[Packet], Optional[Packet]]
+Verifier = Callable[[Packet], bool]
+
+_dictionary: Optional[Dictionary] = None
+_secret_contexts: dict[bytes, SecretContext] = {}
+_routers: dict["RequestPolicy", RequestRouter] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class RequestPolicy:
+    """Server settings a worker needs to check and answer a request.
+
+    Sent with every job; a handful of flags pickles to a few bytes.
+    """
+
+    verify: bool = True
+    require_message_authenticator: bool = True
+    require_eap_message_authenticator: bool = True
+    lazy_decode: bool = False
+    radius_version: RadiusVersion = RadiusVersion.V1_0
+    # Module-level authenticator check to use instead of the router's,
+    # so a server's in-loop and worker paths verify the same codes.
+    verifier: Optional[Verifier] = None
+
+
+class DroppedRequest(PacketError):
+    """A request a worker rejected, with the ``DropReason`` to count."""
+
+    def __init__(self, message: str, reason: DropReason):
+        # Both go in ``args`` so the exception survives pickling.
+        super().__init__(message, reason)
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return str(self.args[0])
+
+
+def init_worker(*dictionary_files: str) -> None:
+    """Process-pool initializer: load the dictionary for this worker."""
+    global _dictionary
+    _dictionary = Dictionary(*dictionary_files) if dictionary_files else None
+    _secret_contexts.clear()
+    _routers.clear()
+
+
+def create_executor(
+    *dictionary_files: str, max_workers: Optional[int] = None
+) -> ProcessPoolExecutor:
+    """Return a process pool whose workers each load ``dictionary_files``.
+
+    Args:
+        dictionary_files (str): Dictionary files, as passed to
+            ``Dictionary``.
+        max_workers (int): Number of worker processes (default: one per
+            CPU).
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers, initializer=init_worker, initargs=dictionary_files
+    )
+
+
+def _router_for(policy: RequestPolicy) -> RequestRouter:
+    router = _routers.get(policy)
+    if router is None:
+        router = _routers[policy] = RequestRouter(
+            hosts={},
+            dictionary=_dictionary,
+            enable_pkt_verify=policy.verify,
+            require_message_authenticator=policy.require_message_authenticator,
+            require_eap_message_authenticator=policy.require_eap_message_authenticator,
+            lazy_decode=policy.lazy_decode,
+        )
+    return router
+
+
+def process_request(
+    handler: WorkerHandler, data: bytes, secret: bytes, policy: RequestPolicy
+) -> Optional[bytes]:
+    """Worker entry point: decode, verify, handle and encode one request.
+
+    Raises ``DroppedRequest`` where the in-loop path would raise
+    ``PacketError``; the executor carries the exception back to the
+    server.
+
+    Returns:
+        bytes: The encoded reply, or ``None`` if the handler returned
+        no reply.
+    """
+    router = _router_for(policy)
+    ctx = _secret_contexts.get(secret)
+    if ctx is None:
+        ctx = _secret_contexts[secret] = SecretContext(secret)
+    try:
+        req = parse_packet(
+            data,
+            secret,
+            _dictionary,
+            radius_version=policy.radius_version,
+            lazy=policy.lazy_decode,
+            secret_context=ctx,
+        )
+    except PacketError as err:
+        raise DroppedRequest(str(err), DropReason.MALFORMED) from None
+    if policy.verifier is None:
+        try:
+            router.verify_request(req)
+        except PacketError as err:
+            raise DroppedRequest(str(err), DropReason.BAD_AUTHENTICATOR) from None
+    elif policy.verify and not policy.verifier(req):
+        raise DroppedRequest("Packet verification failed", DropReason.BAD_AUTHENTICATOR)
+    try:
+        router.validate_message_authenticator_policy(req)
+    except PacketError as err:
+        raise DroppedRequest(str(err), DropReason.MESSAGE_AUTHENTICATOR) from None
+
+    reply = handler(req)
+    if reply is None:
+        return None
+    router.prepare_reply(req, reply)
+    if policy.radius_version == RadiusVersion.V1_0:
+        router.force_reply_ma(reply)
+    return reply.reply_packet()
@@ -5,13 +5,21 @@ import secrets
 import struct
 import threading
 from collections import OrderedDict
+from collections.abc import Buffer, Iterable, Iterator
+from dataclasses import dataclass
 from typing import Any, Hashable, Optional, Union, Sequence, TypeVar
 
 from loguru import logger
 
 from pyrad2 import tools
+from pyrad2.admission import UNLIMITED, Ticket
 from pyrad2.constants import PacketType
-from pyrad2.dictionary import Attribute, Dictionary, RadiusAttributeValue
+from pyrad2.dictionary import (
+    Attribute,
+    AttributeCodec,
+    Dictionary,
+    RadiusAttributeValue,
+)
 from pyrad2.exceptions import PacketError
 from pyrad2.radsec.v11 import RadiusVersion
 
@@ -126,7 +134,48 @@ CURRENT_ID = random_generator.randrange(1, 255)
 _CURRENT_ID_LOCK = threading.Lock()
 
 
-def _md5_keystream_xor(secret: bytes, prev: bytes, block: bytes) -> bytes:
+class SecretContext:
+    """Precomputed MD5 / HMAC-MD5 state for one shared secret.
+
+    ``hashlib.md5(secret)`` and the HMAC key pads are built once and
+    ``.copy()``-ed per use, so the password keystream and
+    Message-Authenticator start hashing from the secret's precomputed
+    state instead of from scratch. ``RemoteHost`` and the clients keep
+    one per secret and hand it to the packets they create; a packet
+    without one (or whose ``secret`` was reassigned) builds its own.
+
+    The Request / Response Authenticator MD5s append the secret *after*
+    the packet, so there is no prefix state to reuse for those.
+    """
+
+    __slots__ = ("secret", "_md5", "_hmac")
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+        self._md5 = hashlib.md5(secret)
+        self._hmac = hmac_new(secret)
+
+    def md5(self, data: bytes) -> bytes:
+        """Return ``MD5(secret + data)``."""
+        digest = self._md5.copy()
+        digest.update(data)
+        return digest.digest()
+
+    def hmac(self) -> hmac.HMAC:
+        """Return a fresh HMAC-MD5 keyed with the secret."""
+        return self._hmac.copy()
+
+    @classmethod
+    def for_secret(
+        cls, current: Optional["SecretContext"], secret: bytes
+    ) -> "SecretContext":
+        """Return ``current`` if it was built for ``secret``, else a new one."""
+        if current is not None and current.secret == secret:
+            return current
+        return cls(secret)
+
+
+def _md5_keystream_xor(ctx: SecretContext, prev: bytes, block: bytes) -> bytes:
     """One round of the RFC 2865 §5.2 keystream: ``MD5(secret + prev) XOR block``.
 
     ``block`` must be exactly 16 bytes — every caller pads up-front. The
@@ -134,7 +183,7 @@ def _md5_keystream_xor(secret: bytes, prev: bytes, block: bytes) -> bytes:
     ``bytes((hash[i] ^ block[i],))`` loop that allocates a one-byte
     ``bytes`` object per index and concatenates in O(N²).
     """
-    digest = hashlib.md5(secret + prev).digest()
+    digest = ctx.md5(prev)
     return (int.from_bytes(digest, "big") ^ int.from_bytes(block, "big")).to_bytes(
         16, "big"
     )
@@ -267,6 +316,42 @@ class Packet(OrderedDict):
     `AuthPacket`, `AcctPacket` or `CoAPacket` classes.
     """
 
+    # OrderedDict instances always carry a ``__dict__``, but CPython only
+    # allocates it on the first attribute that has no slot. Slotting
+    # everything ``Packet`` and the servers set keeps that dict from
+    # ever being created on the request path (roughly 40% of a decoded
+    # Access-Request's memory); ad-hoc attributes still work.
+    __slots__ = (
+        "_lazy_pending",
+        "_lazy_index",
+        "_lazy_buffer",
+        "_encoded_attributes",
+        "_encoded_attributes_key",
+        "_message_authenticator_offset",
+        "_deferred_obfuscated",
+        "_long_ext_buf",
+        "_vsa_continuation_buf",
+        "_secret_context",
+        "_template",
+        "radius_version",
+        "code",
+        "id",
+        "secret",
+        "authenticator",
+        "token",
+        "request_authenticator",
+        "original_code",
+        "message_authenticator",
+        "raw_packet",
+        "dict",
+        # Set by the servers on every request.
+        "source",
+        "fd",
+        "_dedup_key",
+        "_admission",
+        "_received_at",
+    )
+
     def __init__(
         self,
         code: int = 0,
@@ -274,6 +359,9 @@ class Packet(OrderedDict):
         secret: bytes = b"radsec",
         authenticator: Optional[bytes] = None,
         radius_version: RadiusVersion = RadiusVersion.V1_0,
+        lazy: bool = False,
+        secret_context: Optional[SecretContext] = None,
+        template: Optional["PacketTemplate"] = None,
         **attributes,
     ):
         """Initializes a Packet instance.
@@ -288,9 +376,35 @@ class Packet(OrderedDict):
                 packet over to the TLS-only profile (no MD5 obfuscation, no
                 Message-Authenticator, Token in place of Request/Response
                 Authenticator). Set this *before* decoding raw bytes.
+            lazy (bool): When ``packet`` is given, only index its
+                attributes and decode each one on first access. See
+                ``decode_packet``.
+            secret_context (SecretContext): Precomputed hash state for
+                ``secret``, usually shared by the host or client that
+                creates the packet. Built on demand when omitted.
+            template (PacketTemplate): Pre-encoded attributes to start
+                from. They come first, ahead of ``attributes``.
             attributes (dict): Attributes to set in the packet
         """
         super().__init__()
+        # Lazy-decode state (see ``decode_packet``). ``_lazy_pending`` maps
+        # wire codes that haven't been materialized yet to their
+        # ``(offset, length)`` index entries; empty means fully decoded.
+        self._lazy_pending: dict[int, list[tuple[int, int]]] = {}
+        self._lazy_index: list[tuple[int, int, int]] = []
+        self._lazy_buffer: Optional[bytes] = None
+        # Cached ``_pkt_encode_attributes`` output and the state it was
+        # built under (see ``_encoding_cache_key``). Every mutator drops
+        # it, so an unchanged packet is encoded once however many times
+        # it is signed, serialized, verified or retransmitted.
+        self._encoded_attributes: Optional[bytearray] = None
+        self._encoded_attributes_key: Any = None
+        # Offset of the Message-Authenticator value inside the cached
+        # encoding, recorded while encoding so signing can patch it.
+        self._message_authenticator_offset: Optional[int] = None
+        # ``PacketTemplate`` whose pre-encoded block leads the attribute
+        # encoding; dropped as soon as one of its keys is touched.
+        self._template: Optional[PacketTemplate] = None
         # Must be set before decode_packet runs so attribute de-obfuscation
         # (salt_decrypt etc.) knows which profile to use.
         self.radius_version: RadiusVersion = radius_version
@@ -308,6 +422,7 @@ class Packet(OrderedDict):
         if not isinstance(secret, bytes):
             raise TypeError("secret must be a binary string")
         self.secret = secret
+        self._secret_context = secret_context
         if authenticator is not None and not isinstance(authenticator, bytes):
             raise TypeError("authenticator must be a binary string")
         self.authenticator = authenticator
@@ -325,13 +440,19 @@ class Packet(OrderedDict):
 
         # injected by server when grabbing packet
         self.source: list[str]
+        # The server's admission ticket and receive time for a request.
+        self._admission: Ticket = UNLIMITED
+        self._received_at: Optional[float] = None
 
         if "dict" in attributes:
             self.dict = attributes["dict"]
 
+        if template is not None:
+            self._apply_template(template, "dict" in attributes)
+
         if "packet" in attributes:
             self.raw_packet = attributes["packet"]
-            self.decode_packet(self.raw_packet)
+            self.decode_packet(self.raw_packet, lazy=lazy)
 
         if "message_authenticator" in attributes:
             self.message_authenticator = attributes["message_authenticator"]
@@ -347,6 +468,23 @@ class Packet(OrderedDict):
             key = key.replace("_", "-")
             self.add_attribute(key, value)
 
+    def _apply_template(self, template: "PacketTemplate", has_dict: bool) -> None:
+        """Copy ``template``'s stored attributes in and adopt its wire block."""
+        if not has_dict:
+            self.dict = template.dictionary
+        elif self.dict is not template.dictionary:
+            raise ValueError("PacketTemplate was built for a different dictionary")
+        for key, value in template.storage:
+            OrderedDict.__setitem__(self, key, _copy_stored(value))
+        self._template = template
+
+    @property
+    def secret_context(self) -> SecretContext:
+        """Precomputed hash state for ``secret``, rebuilt if it was reassigned."""
+        ctx = SecretContext.for_secret(self._secret_context, self.secret)
+        self._secret_context = ctx
+        return ctx
+
     def add_message_authenticator(self) -> None:
         if self.radius_version == RadiusVersion.V1_1:
             # RFC 9765 §5.2: Message-Authenticator MUST NOT be sent in v1.1.
@@ -399,11 +537,19 @@ class Packet(OrderedDict):
         return self.message_authenticator
 
     def _refresh_message_authenticator(self):
-        hmac_constructor = hmac_new(self.secret)
-
-        # Maintain a zero octets content for md5 and hmac calculation.
-        self["Message-Authenticator"] = 16 * b"\00"
-        attr = self._pkt_encode_attributes()
+        hmac_constructor = self.secret_context.hmac()
+
+        # Encode once with whatever MA value is stored as the placeholder;
+        # the HMAC reads zeros in its place and the digest is patched
+        # straight into the cached buffer, so ``self`` is written only to
+        # add a missing MA.
+        attr = self._attribute_buffer()
+        offset = self._message_authenticator_offset
+        if offset is None:
+            self["Message-Authenticator"] = 16 * b"\00"
+            attr = self._attribute_buffer()
+            offset = self._message_authenticator_offset
+            assert offset is not None
 
         header = struct.pack("!BBH", self.code, self.id, (20 + len(attr)))
 
@@ -430,15 +576,29 @@ class Packet(OrderedDict):
                 raise Exception("No authenticator found")
             hmac_constructor.update(self.authenticator)
 
-        hmac_constructor.update(attr)
-        self["Message-Authenticator"] = hmac_constructor.digest()
+        self._hmac_update_zeroed(hmac_constructor, attr, offset)
+        digest = hmac_constructor.digest()
+        OrderedDict.__setitem__(self, 80, [digest])
+        attr[offset : offset + 16] = digest
 
     @staticmethod
-    def _zero_message_authenticator(attr: bytes) -> bytes:
-        """Return attributes with the Message-Authenticator value zeroed."""
-        zeroed = bytearray(attr)
+    def _hmac_update_zeroed(hmac_constructor: Any, attr: Buffer, offset: int) -> None:
+        """Feed ``attr`` to the HMAC with its Message-Authenticator zeroed.
+
+        Three ``memoryview`` slices around the 16-byte value; the
+        attribute block itself is never copied.
+        """
+        with memoryview(attr) as view:
+            hmac_constructor.update(view[:offset])
+            hmac_constructor.update(16 * b"\00")
+            hmac_constructor.update(view[offset + 16 :])
+
+    @staticmethod
+    def _find_message_authenticator(attr: memoryview | bytearray) -> int:
+        """Return the offset of the Message-Authenticator value in ``attr``."""
         offset = 0
         found = 0
+        value_offset = 0
 
         while offset < len(attr):
             if offset + 2 > len(attr):
@@ -455,7 +615,7 @@ class Packet(OrderedDict):
                 if length != 18:
                     raise PacketError("Message-Authenticator must be 16 bytes")
                 found += 1
-                zeroed[offset + 2 : offset + length] = 16 * b"\00"
+                value_offset = offset + 2
 
             offset += length
 
@@ -464,7 +624,7 @@ class Packet(OrderedDict):
         if found > 1:
             raise PacketError("Multiple Message-Authenticator AVPs present")
 
-        return bytes(zeroed)
+        return value_offset
 
     def verify_message_authenticator(
         self,
@@ -503,16 +663,24 @@ class Packet(OrderedDict):
         # Message-Authenticator verification to fail. Using the raw packet
         # instead, if present, ensures the verification is done using the
         # attributes exactly as sent.
+        attr: memoryview | bytearray
+        offset: Optional[int] = None
         if self.raw_packet:
-            attr = self.raw_packet[20:]
-            attr = self._zero_message_authenticator(attr)
+            attr = memoryview(self.raw_packet)[20:]
         else:
-            self["Message-Authenticator"] = 16 * b"\00"
-            attr = self._pkt_encode_attributes()
+            attr = self._attribute_buffer()
+            # Only recorded for a single well-formed MA; anything else
+            # gets the full scan and its specific error.
+            offset = self._message_authenticator_offset
+        if offset is None:
+            offset = self._find_message_authenticator(attr)
 
         header = struct.pack("!BBH", self.code, self.id, (20 + len(attr)))
 
-        hmac_constructor = hmac_new(key)
+        if key == self.secret:
+            hmac_constructor = self.secret_context.hmac()
+        else:
+            hmac_constructor = hmac_new(key)
         hmac_constructor.update(header)
         if self.code in (
             PacketType.AccountingRequest,
@@ -546,10 +714,9 @@ class Packet(OrderedDict):
             hmac_constructor.update(original_authenticator)
         else:
             # On Access-Request and Status-Server use dynamic authenticator
-            hmac_constructor.update(self.authenticator)
+            hmac_constructor.update(self.authenticator)  # type: ignore[arg-type]
 
-        hmac_constructor.update(attr)
-        self["Message-Authenticator"] = prev_ma[0]
+        self._hmac_update_zeroed(hmac_constructor, attr, offset)
         return hmac.compare_digest(prev_ma[0], hmac_constructor.digest())
 
     def require_valid_message_authenticator(
@@ -625,7 +792,10 @@ class Packet(OrderedDict):
         on ``AuthPacket``) that callers might want to override per call.
         """
         attributes.setdefault("radius_version", self.radius_version)
-        merged: dict[str, Any] = {"dict": self.dict}
+        merged: dict[str, Any] = {
+            "dict": self.dict,
+            "secret_context": self._secret_context,
+        }
         if extra_kwargs:
             merged.update(extra_kwargs)
         merged.update(attributes)
@@ -654,24 +824,26 @@ class Packet(OrderedDict):
         reply.token = self.token
         return reply
 
-    def _decode_value(self, attr: Attribute, value: bytes) -> bytes | str:
-        if attr.encrypt == 2 and self.radius_version != RadiusVersion.V1_1:
+    def _decode_value(self, codec: AttributeCodec, value: bytes) -> bytes | str:
+        if codec.encrypt == 2 and self.radius_version != RadiusVersion.V1_1:
             # salt decrypt attribute. Skipped in RADIUS/1.1 (RFC 9765 §5.1.3,
             # §5.1.4) — Tunnel-Password / MS-MPPE keys flow as plain octets.
             value = self.salt_decrypt(value)
 
-        if attr.values.has_backward(value):
-            return attr.values.get_backward(value)
+        values = codec.values
+        if values.has_backward(value):
+            return values.get_backward(value)
         else:
-            return tools.decode_attr(attr.type, value)
+            return codec.decode(value)
 
-    def _encode_value(self, attr: Attribute, value: bytes | str) -> bytes:
-        if attr.values.has_forward(value):
-            result = attr.values.get_forward(value)
+    def _encode_value(self, codec: AttributeCodec, value: bytes | str) -> bytes:
+        values = codec.values
+        if values.has_forward(value):
+            result = values.get_forward(value)
         else:
-            result = tools.encode_attr(attr.type, value)
+            result = codec.encode(value)
 
-        if attr.encrypt == 2 and self.radius_version != RadiusVersion.V1_1:
+        if codec.encrypt == 2 and self.radius_version != RadiusVersion.V1_1:
             # salt encrypt attribute. Skipped in RADIUS/1.1 (RFC 9765 §5.1.3,
             # §5.1.4) — Tunnel-Password / MS-MPPE keys ride plain over TLS.
             result = self.salt_crypt(result)
@@ -688,43 +860,39 @@ class Packet(OrderedDict):
             values = [values]
 
         key, _, tag = key.partition(":")
-        attr = self.dict.attributes[key]
-        key = self._encode_key(key)
+        codec = self.dict.codecs[key]
+        key = codec.key
         if tag:
             tag_bytes = struct.pack("B", int(tag))
-            if attr.type == "integer":
+            if codec.type == "integer":
                 return (
                     key,
-                    [tag_bytes + self._encode_value(attr, v)[1:] for v in values],
+                    [tag_bytes + self._encode_value(codec, v)[1:] for v in values],
                 )
             else:
-                return (key, [tag_bytes + self._encode_value(attr, v) for v in values])
+                return (key, [tag_bytes + self._encode_value(codec, v) for v in values])
         else:
-            return (key, [self._encode_value(attr, v) for v in values])
+            return (key, [self._encode_value(codec, v) for v in values])
 
     def _encode_key(self, key: Hashable):
         if not isinstance(key, str):
             return key
-
-        attr = self.dict.attributes[key]
-        if attr.is_sub_attribute and attr.parent and attr.parent.type == "evs":
-            # EVS-VSA: the dictionary already stores the canonical 4-tuple
-            # (extended_wrapper, evs_slot, vendor_id, vendor_type) — that's
-            # the only place all four are reachable from this attribute.
-            return self.dict.attrindex.get_forward(key)
-        if (
-            attr.vendor and not attr.is_sub_attribute
-        ):  # sub attribute keys don't need vendor
-            return (self.dict.vendors.get_forward(attr.vendor), attr.code)
-        else:
-            return attr.code
+        # Sub-attribute keys don't carry the vendor; EVS-VSAs use the
+        # 4-tuple. ``AttributeCodec.key`` has it resolved already.
+        return self.dict.codecs[key].key
 
     def _decode_key(self, key: Hashable) -> Hashable:
         """Turn a key into a string if possible"""
 
-        if self.dict.attrindex.has_backward(key):
-            return self.dict.attrindex.get_backward(key)
-        return key
+        codec = self.dict.codecs_by_key.get(key)
+        return key if codec is None else codec.name
+
+    def _codec_for_key(self, key: Hashable) -> Optional[AttributeCodec]:
+        """Return the compiled codec for a storage key, or None if unknown."""
+        dictionary = getattr(self, "dict", None)
+        if dictionary is None:
+            return None
+        return dictionary.codecs_by_key.get(key)
 
     def add_attribute(self, key: str, value: RadiusAttributeValue) -> None:
         """Add an attribute to the packet.
@@ -733,50 +901,41 @@ class Packet(OrderedDict):
             key (str): Attribute name or identification.
             value (Any): The attribute value.
         """
-        attr = self.dict.attributes[key.partition(":")[0]]
+        codec = self.dict.codecs[key.partition(":")[0]]
 
         (key, value) = self._encode_key_values(key, value)
 
-        if attr.is_sub_attribute and not (attr.parent and attr.parent.type == "evs"):
+        if codec.nested:
             # TLV-style nesting under the parent chain. For a 2-level
             # sub-attribute this is just ``self[parent_code][code]``; for
             # 3+ levels it's ``self[grandparent][parent_code][code]`` etc.
             # EVS-VSAs skip this entirely: their 4-tuple key already
             # identifies the slot uniquely so they live flat at the top
             # level of the packet dict.
-            tlv = self._tlv_storage_for(attr)
+            tlv = self._tlv_storage_for(codec)
             encoded = tlv.setdefault(key, [])
         else:
             encoded = self.setdefault(key, [])
 
         encoded.extend(value)
+        self._invalidate_encoding(codec.storage_path[0] if codec.nested else key)
 
-    def _tlv_storage_for(self, attr: Attribute) -> dict:
-        """Walk the parent chain to the dict that should hold ``attr``.
+    def _tlv_storage_for(self, codec: AttributeCodec) -> dict:
+        """Walk the parent chain to the dict that should hold ``codec``.
 
         For a 2-level sub-attribute returns ``self[parent_code]`` (creating
         it as a dict on the way). For 3+ levels it descends one nested
         dict per level: ``self[241][5]`` for an attribute declared as
         ``241.5.X``, and so on. The caller stores the leaf at
-        ``container[attr.code]``.
+        ``container[codec.key]``.
         """
 
-        # chain[0] is the outermost (top-level) parent; chain[-1] is the
-        # immediate parent of ``attr``.
-        chain: list[Attribute] = []
-        cur: Optional[Attribute] = attr.parent
-        while cur is not None:
-            chain.append(cur)
-            cur = cur.parent if cur.is_sub_attribute else None
-        chain.reverse()
-
         container: dict = self
-        for i, parent in enumerate(chain):
-            # Top-level parent uses its full encoded key (which is just
-            # the integer code for Extended attributes, a 2-tuple for
-            # vendor attributes). Every level below it nests under the
-            # raw child code.
-            level_key = self._encode_key(parent.name) if i == 0 else parent.code
+        # The outermost parent is stored under its full encoded key (the
+        # integer code for Extended attributes, a 2-tuple for vendor
+        # attributes); every level below it nests under the raw child
+        # code. ``storage_path`` holds exactly that sequence.
+        for level_key in codec.storage_path:
             sub = container.setdefault(level_key, {})
             if not isinstance(sub, dict):
                 raise PacketError(f"storage at level {level_key} is not a TLV map")
@@ -798,6 +957,13 @@ class Packet(OrderedDict):
         v1.0 would be unreadable in v1.1 and vice versa.
         """
         self._deferred_obfuscated.setdefault(name, []).append(value)
+        if self._template is not None:
+            # The sidecar replaces whatever is stored under its key.
+            self._invalidate_encoding(
+                self._deferred_storage_key(name.partition(":")[0])
+            )
+        else:
+            self._invalidate_encoding()
 
     def _deferred_storage_key(self, base_name: str) -> Any:
         """Return the ``self``-storage key a deferred attribute would occupy.
@@ -858,7 +1024,7 @@ class Packet(OrderedDict):
                     )
                 encoded = pw_crypt(value)
             else:
-                encoded = self._encode_value(attr, value)
+                encoded = self._encode_value(self.dict.codecs[attr.name], value)
             if tag:
                 tag_bytes = struct.pack("B", int(tag))
                 if attr.type == "integer":
@@ -901,7 +1067,7 @@ class Packet(OrderedDict):
         Builds a temporary ``OrderedDict`` mirroring ``self``'s storage
         shape — standard top-level, vendor 2-tuple, EVS 4-tuple, or TLV
         ``{parent: {sub_code: [...]}}`` — then dispatches every entry
-        through ``_encode_avp_group``. That shared helper is the same one
+        through ``_pkt_write_avp_group``. That shared helper is the same one
         the main loop uses, so deferred and stored attributes can never
         disagree on container framing.
 
@@ -941,9 +1107,10 @@ class Packet(OrderedDict):
                 key = self._encode_key(base_name)
                 pending.setdefault(key, []).extend(encoded_values)
 
-        return b"".join(
-            self._encode_avp_group(code, datalst) for code, datalst in pending.items()
-        )
+        out = bytearray()
+        for code, datalst in pending.items():
+            self._pkt_write_avp_group(out, code, datalst)
+        return bytes(out)
 
     def get(self, key: Hashable, failobj: Any = None) -> Any:
         try:
@@ -954,21 +1121,26 @@ class Packet(OrderedDict):
 
     def __getitem__(self, key: Hashable) -> dict | list:
         if not isinstance(key, str):
-            return super().__getitem__(key)
-
-        values = super().__getitem__(self._encode_key(key))
-        attr = self.dict.attributes[key]
-        if attr.type in ("tlv", "extended", "long-extended"):
+            if self._lazy_pending:
+                self._materialize_code(self._wire_code(key))
+            stored = super().__getitem__(key)
+            # The stored values are handed out and may be changed in place.
+            self._invalidate_encoding(key)
+            return stored
+
+        codec = self.dict.codecs[key]
+        encoded = codec.key
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        values = super().__getitem__(encoded)
+        if codec.container is not None:
             # Container attributes — return a map from sub-attribute name
             # to its decoded values. For 3+ level dictionaries a child
             # slot may itself be a TLV container; that nested map gets
             # decoded recursively into the same {name: [values]} shape.
-            return self._decode_container_values(attr, values)
+            return self._decode_container_values(codec.attribute, values)
         else:
-            list_result: list = []
-            for v in values:
-                list_result.append(self._decode_value(attr, v))
-            return list_result
+            return [self._decode_value(codec, v) for v in values]
 
     def _decode_container_values(self, container_attr: Attribute, stored: dict) -> dict:
         """Turn ``{code: stored}`` into ``{name: decoded}``, recursing on nested TLV."""
@@ -976,40 +1148,134 @@ class Packet(OrderedDict):
         result: dict = {}
         for sub_attr_key, sub_attr_val in stored.items():
             sub_attr_name = container_attr.sub_attributes[sub_attr_key]
-            sub_attr = self.dict.attributes[sub_attr_name]
+            sub_codec = self.dict.codecs[sub_attr_name]
             if isinstance(sub_attr_val, dict):
                 # Nested TLV — descend.
                 result[sub_attr_name] = self._decode_container_values(
-                    sub_attr, sub_attr_val
+                    sub_codec.attribute, sub_attr_val
                 )
             else:
                 for v in sub_attr_val:
                     result.setdefault(sub_attr_name, []).append(
-                        self._decode_value(sub_attr, v)
+                        self._decode_value(sub_codec, v)
                     )
         return result
 
     def __contains__(self, key: Hashable) -> bool:
         try:
-            return super().__contains__(self._encode_key(key))
+            encoded = self._encode_key(key)
         except KeyError:
             return False
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        return super().__contains__(encoded)
 
     has_key = __contains__
 
     def __delitem__(self, key: Hashable) -> None:
-        super().__delitem__(self._encode_key(key))
+        encoded = self._encode_key(key)
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        super().__delitem__(encoded)
+        self._invalidate_encoding(encoded)
 
     def __setitem__(self, key: Hashable, item: Any):
         if isinstance(key, str):
             (key, item) = self._encode_key_values(key, item)
-            super().__setitem__(key, item)
-        else:
-            super().__setitem__(key, item)
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(key))
+        super().__setitem__(key, item)
+        self._invalidate_encoding(key)
 
     def keys(self):
+        if self._lazy_pending:
+            self._materialize_all()
         return [self._decode_key(key) for key in OrderedDict.keys(self)]
 
+    def items(self):
+        if self._lazy_pending:
+            self._materialize_all()
+        self._invalidate_encoding()
+        return super().items()
+
+    def values(self):
+        if self._lazy_pending:
+            self._materialize_all()
+        self._invalidate_encoding()
+        return super().values()
+
+    def __iter__(self):
+        if self._lazy_pending:
+            self._materialize_all()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        if self._lazy_pending:
+            self._materialize_all()
+        return super().__len__()
+
+    def __eq__(self, other: object) -> bool:
+        if self._lazy_pending:
+            self._materialize_all()
+        if isinstance(other, Packet) and other._lazy_pending:
+            other._materialize_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        if self._lazy_pending:
+            self._materialize_all()
+        return super().__repr__()
+
+    def clear(self) -> None:
+        if self._lazy_index:
+            self._lazy_pending = {}
+            self._lazy_index = []
+            self._lazy_buffer = None
+        self._invalidate_encoding()
+        super().clear()
+
+    # The OrderedDict mutators below bypass ``__setitem__`` and
+    # ``__delitem__``, so they drop the cached encoding themselves.
+    def pop(self, key: Hashable, *default: Any) -> Any:
+        try:
+            encoded = self._encode_key(key)
+        except KeyError:
+            encoded = key
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        if encoded not in OrderedDict.keys(self):
+            return super().pop(encoded, *default)
+        self._invalidate_encoding(encoded)
+        return super().pop(encoded)
+
+    def popitem(self, last: bool = True) -> tuple[Hashable, Any]:
+        if self._lazy_pending:
+            self._materialize_all()
+        key, value = super().popitem(last)
+        self._invalidate_encoding(key)
+        return key, value
+
+    def setdefault(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            encoded = self._encode_key(key)
+        except KeyError:
+            encoded = key
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        if encoded not in OrderedDict.keys(self):
+            self[key] = default
+        return self[key]
+
+    def move_to_end(self, key: Hashable, last: bool = True) -> None:
+        encoded = self._encode_key(key)
+        if self._lazy_pending:
+            self._materialize_code(self._wire_code(encoded))
+        super().move_to_end(encoded, last)
+        self._invalidate_encoding(encoded)
+
     @staticmethod
     def create_authenticator() -> bytes:
         """Create a packet authenticator. All RADIUS packets contain a sixteen
@@ -1040,8 +1306,10 @@ class Packet(OrderedDict):
         method goes through the same Token / Reserved-2 logic. Returns
         the fully traced raw bytes.
         """
-        attr = self._pkt_encode_attributes()
-        raw = _pack_v11_header(self.code, 20 + len(attr), self.token) + attr
+        out = bytearray(20)
+        out += self._attribute_buffer()
+        out[:20] = _pack_v11_header(self.code, len(out), self.token)
+        raw = bytes(out)
         _trace_packet("out", raw, self)
         return raw
 
@@ -1071,11 +1339,14 @@ class Packet(OrderedDict):
             self.authenticator = self.create_authenticator()
         if self.message_authenticator:
             self._refresh_message_authenticator()
-        attr = self._pkt_encode_attributes()
-        header = struct.pack(
-            "!BBH16s", self.code, self.id, (20 + len(attr)), self.authenticator
+        # Attributes are appended after a reserved header slot, so the
+        # packet is assembled in one buffer with no final concat.
+        out = bytearray(20)
+        out += self._attribute_buffer()
+        struct.pack_into(
+            "!BBH16s", out, 0, self.code, self.id, len(out), self.authenticator
         )
-        raw = header + attr
+        raw = bytes(out)
         _trace_packet("out", raw, self)
         return raw
 
@@ -1088,12 +1359,15 @@ class Packet(OrderedDict):
         """
         if self.message_authenticator:
             self._refresh_message_authenticator()
-        attr = self._pkt_encode_attributes()
-        header = struct.pack("!BBH", self.code, self.id, (20 + len(attr)))
-        self.authenticator = hashlib.md5(
-            header[0:4] + 16 * b"\x00" + attr + self.secret
-        ).digest()
-        raw = header + self.authenticator + attr
+        # The authenticator slot stays zero while the digest is taken.
+        out = bytearray(20)
+        out += self._attribute_buffer()
+        struct.pack_into("!BBH", out, 0, self.code, self.id, len(out))
+        digest = hashlib.md5(out)
+        digest.update(self.secret)
+        self.authenticator = digest.digest()
+        out[4:20] = self.authenticator
+        raw = bytes(out)
         _trace_packet("out", raw, self)
         return raw
 
@@ -1118,14 +1392,17 @@ class Packet(OrderedDict):
         if self.message_authenticator:
             self._refresh_message_authenticator()
 
-        attr = self._pkt_encode_attributes()
-        header = struct.pack("!BBH", self.code, self.id, (20 + len(attr)))
-
-        authenticator = hashlib.md5(
-            header[0:4] + self.authenticator + attr + self.secret
-        ).digest()
-
-        raw = header + authenticator + attr
+        out = bytearray(20)
+        out += self._attribute_buffer()
+        struct.pack_into("!BBH", out, 0, self.code, self.id, len(out))
+        view = memoryview(out)
+        digest = hashlib.md5(view[:4])
+        digest.update(self.authenticator)
+        digest.update(view[20:])
+        digest.update(self.secret)
+        view.release()
+        out[4:20] = digest.digest()
+        raw = bytes(out)
         _trace_packet("out", raw, self)
         return raw
 
@@ -1150,7 +1427,6 @@ class Packet(OrderedDict):
         if rawreply is None:
             rawreply = reply.reply_packet()
 
-        reply._pkt_encode_attributes()
         # The Authenticator field in an Accounting-Response packet is called
         # the Response Authenticator, and contains a one-way MD5 hash
         # calculated over a stream of octets consisting of the Accounting
@@ -1201,10 +1477,10 @@ class Packet(OrderedDict):
     _VSA_CONTINUATION_MORE = 0x80
 
     @classmethod
-    def _pack_vsa_inner(
+    def _pack_vsa_header(
         cls,
         vsa_type: int,
-        value: bytes,
+        value_len: int,
         type_len: int,
         len_len: int,
         continuation: Optional[int] = None,
@@ -1219,34 +1495,67 @@ class Packet(OrderedDict):
         encoded = struct.pack(cls._VSA_TYPE_FORMATS[type_len], vsa_type)
         cont_size = 1 if continuation is not None else 0
         if len_len:
-            total = type_len + len_len + cont_size + len(value)
+            total = type_len + len_len + cont_size + value_len
             encoded += struct.pack(cls._VSA_LEN_FORMATS[len_len], total)
         if continuation is not None:
             encoded += struct.pack("!B", continuation)
-        return encoded + value
+        return encoded
+
+    @classmethod
+    def _pack_vsa_inner(
+        cls,
+        vsa_type: int,
+        value: bytes,
+        type_len: int,
+        len_len: int,
+        continuation: Optional[int] = None,
+    ) -> bytes:
+        """Return the inner VSA header (see ``_pack_vsa_header``) plus ``value``."""
+        return (
+            cls._pack_vsa_header(vsa_type, len(value), type_len, len_len, continuation)
+            + value
+        )
+
+    # The ``_pkt_write_*`` methods below append wire bytes to a caller's
+    # ``bytearray`` rather than returning ``bytes``: growing one buffer
+    # is amortised O(1) per byte, where ``result += ...`` on immutable
+    # bytes copies everything emitted so far and makes a large reply
+    # (dozens of VSAs, a long EAP-Message chain) quadratic to encode.
+    # The ``_pkt_encode_*`` names are thin wrappers kept for callers that
+    # want a standalone ``bytes``.
 
     def _pkt_encode_attribute(self, key: Hashable, value: Any):
+        out = bytearray()
+        self._pkt_write_attribute(out, key, value)
+        return bytes(out)
+
+    def _pkt_write_attribute(self, out: bytearray, key: Hashable, value: Any) -> None:
         if isinstance(key, tuple):
             vendor_id, vsa_type = key
             type_len, len_len, has_continuation = self._vendor_format(vendor_id)
             if has_continuation:
-                return self._pkt_encode_continuation_vsa(
-                    vendor_id, vsa_type, value, type_len, len_len
+                self._pkt_write_continuation_vsa(
+                    out, vendor_id, vsa_type, value, type_len, len_len
                 )
-            inner = self._pack_vsa_inner(vsa_type, value, type_len, len_len)
-            value = struct.pack("!L", vendor_id) + inner
-            key = 26
+                return
+            header = self._pack_vsa_header(vsa_type, len(value), type_len, len_len)
+            out += struct.pack("!BBL", 26, len(header) + len(value) + 6, vendor_id)
+            out += header
+            out += value
+            return
 
-        return struct.pack("!BB", key, (len(value) + 2)) + value
+        out += struct.pack("!BB", key, (len(value) + 2))
+        out += value
 
-    def _pkt_encode_continuation_vsa(
+    def _pkt_write_continuation_vsa(
         self,
+        out: bytearray,
         vendor_id: int,
         vsa_type: int,
         value: bytes,
         type_len: int,
         len_len: int,
-    ) -> bytes:
+    ) -> None:
         """Encode an RFC 5904 / WiMAX VSA, fragmenting on overflow.
 
         Each AVP carries one type/length pair plus a continuation byte
@@ -1262,19 +1571,23 @@ class Packet(OrderedDict):
             # caller has used a pathologically wide ``format=`` spec.
             raise ValueError("vendor format leaves no room for continuation payload")
         chunks = self._split_into_chunks(value, per_fragment_max)
-        out = b""
         for index, chunk in enumerate(chunks):
             more = self._VSA_CONTINUATION_MORE if index < len(chunks) - 1 else 0
-            inner = self._pack_vsa_inner(
-                vsa_type, chunk, type_len, len_len, continuation=more
+            header = self._pack_vsa_header(
+                vsa_type, len(chunk), type_len, len_len, continuation=more
             )
-            avp_value = struct.pack("!L", vendor_id) + inner
-            out += struct.pack("!BB", 26, len(avp_value) + 2) + avp_value
-        return out
+            out += struct.pack("!BBL", 26, len(header) + len(chunk) + 6, vendor_id)
+            out += header
+            out += chunk
 
     def _pkt_encode_tlv(self, tlv_key: str, tlv_value: Any) -> bytes:
-        tlv_attr = self.dict.attributes[self._decode_key(tlv_key)]
-        curr_avp = b""
+        out = bytearray()
+        self._pkt_write_tlv(out, tlv_key, tlv_value)
+        return bytes(out)
+
+    def _pkt_write_tlv(self, out: bytearray, tlv_key: Hashable, tlv_value: Any) -> None:
+        tlv_attr = self.dict.codecs_by_key[tlv_key].attribute
+        curr_avp = bytearray()
         avps = []
         # Nested TLV children store as a single dict rather than a list
         # of values; count them as one "instance" for the round-robin
@@ -1284,18 +1597,15 @@ class Packet(OrderedDict):
             for datalst in tlv_value.values()
         )
         for i in range(max_sub_attribute_len):
-            sub_attr_encoding = b""
+            sub_attr_encoding = bytearray()
             for code, datalst in tlv_value.items():
                 if isinstance(datalst, dict):
                     if i > 0:
                         # Nested TLV slots emit once on the first pass.
                         continue
-                    chain = self._encode_tlv_chain(datalst)
-                    sub_attr_encoding += (
-                        struct.pack("!BB", code, len(chain) + 2) + chain
-                    )
+                    self._pkt_write_tlv_slot(sub_attr_encoding, code, datalst)
                 elif i < len(datalst):
-                    sub_attr_encoding += self._pkt_encode_attribute(code, datalst[i])
+                    self._pkt_write_attribute(sub_attr_encoding, code, datalst[i])
             # split above 255. assuming len of one instance of all sub tlvs is lower than 255
             if (len(sub_attr_encoding) + len(curr_avp)) < 245:
                 curr_avp += sub_attr_encoding
@@ -1303,45 +1613,24 @@ class Packet(OrderedDict):
                 avps.append(curr_avp)
                 curr_avp = sub_attr_encoding
         avps.append(curr_avp)
-        tlv_avps = []
+        vendor_id = (
+            self.dict.vendors.get_forward(tlv_attr.vendor) if tlv_attr.vendor else None
+        )
         for avp in avps:
-            value = struct.pack("!BB", tlv_attr.code, (len(avp) + 2)) + avp
-            tlv_avps.append(value)
-        if tlv_attr.vendor:
-            vendor_avps = b""
-            for avp in tlv_avps:
-                vendor_avps += (
-                    struct.pack(
-                        "!BBL",
-                        26,
-                        (len(avp) + 6),
-                        self.dict.vendors.get_forward(tlv_attr.vendor),
-                    )
-                    + avp
-                )
-            return vendor_avps
-        else:
-            return b"".join(tlv_avps)
+            if vendor_id is not None:
+                out += struct.pack("!BBL", 26, len(avp) + 8, vendor_id)
+            out += struct.pack("!BB", tlv_attr.code, (len(avp) + 2))
+            out += avp
 
     def _is_concat_attribute(self, code: Hashable) -> bool:
         """Return True when ``code`` refers to a dictionary attribute marked ``concat``."""
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return False
-        attr = dictionary.attributes.get(self._decode_key(code))
-        return attr is not None and getattr(attr, "concat", False)
+        codec = self._codec_for_key(code)
+        return codec is not None and codec.concat
 
     def _container_type(self, code: Hashable) -> Optional[str]:
         """Return the container datatype (``tlv``, ``extended``, ``long-extended``) or None."""
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return None
-        attr = dictionary.attributes.get(self._decode_key(code))
-        if attr is None:
-            return None
-        if attr.type in ("tlv", "extended", "long-extended"):
-            return attr.type
-        return None
+        codec = self._codec_for_key(code)
+        return None if codec is None else codec.container
 
     @staticmethod
     def _split_into_chunks(data: bytes, max_chunk: int) -> list[bytes]:
@@ -1355,6 +1644,11 @@ class Packet(OrderedDict):
         return [data[i : i + max_chunk] for i in range(0, len(data), max_chunk)]
 
     def _encode_tlv_chain(self, mapping: dict) -> bytes:
+        out = bytearray()
+        self._pkt_write_tlv_chain(out, mapping)
+        return bytes(out)
+
+    def _pkt_write_tlv_chain(self, out: bytearray, mapping: dict) -> None:
         """Encode a ``{code: values_or_nested_dict}`` map as a TLV chain.
 
         Used wherever a TLV container's value needs to be linearised on
@@ -1364,17 +1658,28 @@ class Packet(OrderedDict):
         (e.g. ``241.5.1``) emit correctly.
         """
 
-        out = b""
         for code, datalst in mapping.items():
             if isinstance(datalst, dict):
-                inner = self._encode_tlv_chain(datalst)
-                out += struct.pack("!BB", code, 2 + len(inner)) + inner
+                self._pkt_write_tlv_slot(out, code, datalst)
             else:
                 for value in datalst:
-                    out += struct.pack("!BB", code, 2 + len(value)) + value
-        return out
+                    out += struct.pack("!BB", code, 2 + len(value))
+                    out += value
+
+    def _pkt_write_tlv_slot(self, out: bytearray, code: int, mapping: dict) -> None:
+        """Write one nested TLV slot: its header, then its chain in place.
+
+        The length byte isn't known until the chain is written, so a
+        placeholder header is reserved and patched afterwards.
+        """
+        start = len(out)
+        out += b"\x00\x00"
+        self._pkt_write_tlv_chain(out, mapping)
+        struct.pack_into("!BB", out, start, code, len(out) - start)
 
-    def _pkt_encode_extended(self, parent_code: int, sub_attributes: dict) -> bytes:
+    def _pkt_write_extended(
+        self, out: bytearray, parent_code: int, sub_attributes: dict
+    ) -> None:
         """Encode RFC 6929 extended attributes (types 241-244).
 
         Each sub-attribute value is emitted as one AVP of the form
@@ -1384,36 +1689,24 @@ class Packet(OrderedDict):
         nested map (3+ level dictionaries) are flattened into a TLV
         chain before being wrapped in the Extended envelope.
         """
-        result = b""
         for ext_type, values in sub_attributes.items():
             if isinstance(values, dict):
                 # Nested TLV under this Extended slot — collapse the
                 # whole nested map into one chain of inner AVPs and
                 # emit a single Extended wrapper around it.
-                chain = self._encode_tlv_chain(values)
-                if len(chain) > 252:
-                    raise ValueError(
-                        "Extended attribute value too long; declare the "
-                        "parent as long-extended to enable fragmentation"
-                    )
-                result += (
-                    struct.pack("!BBB", parent_code, 3 + len(chain), ext_type) + chain
-                )
-                continue
+                values = [self._encode_tlv_chain(values)]
             for value in values:
                 if len(value) > 252:
                     raise ValueError(
                         "Extended attribute value too long; declare the "
                         "parent as long-extended to enable fragmentation"
                     )
-                result += (
-                    struct.pack("!BBB", parent_code, 3 + len(value), ext_type) + value
-                )
-        return result
+                out += struct.pack("!BBB", parent_code, 3 + len(value), ext_type)
+                out += value
 
-    def _pkt_encode_long_extended(
-        self, parent_code: int, sub_attributes: dict
-    ) -> bytes:
+    def _pkt_write_long_extended(
+        self, out: bytearray, parent_code: int, sub_attributes: dict
+    ) -> None:
         """Encode RFC 6929 long-extended attributes (types 245-246).
 
         Values larger than 251 bytes are fragmented across multiple AVPs.
@@ -1424,7 +1717,6 @@ class Packet(OrderedDict):
         """
         from pyrad2.constants import LONG_EXTENDED_MORE_FLAG
 
-        result = b""
         for ext_type, values in sub_attributes.items():
             if isinstance(values, dict):
                 value_iter: list[bytes] = [self._encode_tlv_chain(values)]
@@ -1434,15 +1726,12 @@ class Packet(OrderedDict):
                 chunks = self._split_into_chunks(value, 251)
                 for index, chunk in enumerate(chunks):
                     more = LONG_EXTENDED_MORE_FLAG if index < len(chunks) - 1 else 0
-                    result += (
-                        struct.pack(
-                            "!BBBB", parent_code, 4 + len(chunk), ext_type, more
-                        )
-                        + chunk
+                    out += struct.pack(
+                        "!BBBB", parent_code, 4 + len(chunk), ext_type, more
                     )
-        return result
+                    out += chunk
 
-    def _pkt_encode_evs(self, key: tuple, value: bytes) -> bytes:
+    def _pkt_write_evs(self, out: bytearray, key: tuple, value: bytes) -> None:
         """Encode one RFC 6929 EVS-VSA AVP (or fragment chain in long form).
 
         ``key`` is the flat 4-tuple ``(parent, evs_slot, vendor_id,
@@ -1457,189 +1746,281 @@ class Packet(OrderedDict):
         )
 
         parent_code, ext_type, vendor_id, vsa_type = key
-        evs_header = struct.pack("!L", vendor_id) + struct.pack("!B", vsa_type)
 
         if parent_code in LONG_EXTENDED_ATTRIBUTE_TYPES:
-            result = b""
             chunks = self._split_into_chunks(value, 246)
             for index, chunk in enumerate(chunks):
                 more = LONG_EXTENDED_MORE_FLAG if index < len(chunks) - 1 else 0
-                result += (
-                    struct.pack("!BBBB", parent_code, 9 + len(chunk), ext_type, more)
-                    + evs_header
-                    + chunk
+                out += struct.pack(
+                    "!BBBBLB",
+                    parent_code,
+                    9 + len(chunk),
+                    ext_type,
+                    more,
+                    vendor_id,
+                    vsa_type,
                 )
-            return result
+                out += chunk
+            return
 
         if len(value) > 247:
             raise ValueError(
                 "EVS value too large for extended wrapper; declare the "
                 "wrapper as long-extended to enable fragmentation"
             )
-        return (
-            struct.pack("!BBB", parent_code, 8 + len(value), ext_type)
-            + evs_header
-            + value
+        out += struct.pack(
+            "!BBBLB", parent_code, 8 + len(value), ext_type, vendor_id, vsa_type
         )
+        out += value
 
-    def _encode_avp_group(self, code: Any, datalst: Any) -> bytes:
+    def _pkt_write_avp_group(self, out: bytearray, code: Any, datalst: Any) -> None:
         """Encode one stored ``(storage-key, [encoded-values])`` group.
 
         Single owner of the per-key container dispatch — EVS 4-tuples,
         TLV parents, extended / long-extended parents, vendor 2-tuples,
         and standard top-level codes all flow through here. Used by
-        both ``_pkt_encode_attributes`` and ``_encode_deferred_obfuscated``
+        both ``_pkt_write_attributes`` and ``_encode_deferred_obfuscated``
         so the two paths can never diverge on framing.
         """
         if isinstance(code, tuple) and len(code) == 4:
             # EVS-VSA: (parent_code, evs_slot, vendor_id, vendor_type)
-            return b"".join(self._pkt_encode_evs(code, v) for v in datalst)
-        container = self._container_type(code)
+            for v in datalst:
+                self._pkt_write_evs(out, code, v)
+            return
+        codec = self._codec_for_key(code)
+        container = None if codec is None else codec.container
         if container == "tlv":
-            return self._pkt_encode_tlv(code, datalst)
+            self._pkt_write_tlv(out, code, datalst)
+            return
         if container == "extended":
-            return self._pkt_encode_extended(code, datalst)
+            self._pkt_write_extended(out, code, datalst)
+            return
         if container == "long-extended":
-            return self._pkt_encode_long_extended(code, datalst)
-        out = b""
-        concat = self._is_concat_attribute(code)
-        if self._is_array_attribute(code) and len(datalst) > 1:
+            self._pkt_write_long_extended(out, code, datalst)
+            return
+        if codec is not None and codec.array and len(datalst) > 1:
             # RFC 8044 §3.8: multiple values packed into one AVP. Concat
             # the per-value byte strings into a single payload before
             # wrapping. Falls through to the standard path when there's
             # only one value — the wire result is identical either way.
-            packed = b"".join(datalst)
-            return self._pkt_encode_attribute(code, packed)
+            self._pkt_write_attribute(out, code, b"".join(datalst))
+            return
+        concat = codec is not None and codec.concat
         for data in datalst:
             if concat and len(data) > 253:
                 # Split values larger than one AVP into 253-byte chunks;
                 # the receiver concatenates per RFC 7268 §3.6.
                 for chunk in self._split_into_chunks(data, 253):
-                    out += self._pkt_encode_attribute(code, chunk)
+                    self._pkt_write_attribute(out, code, chunk)
             else:
-                out += self._pkt_encode_attribute(code, data)
-        return out
+                self._pkt_write_attribute(out, code, data)
 
     def _pkt_encode_attributes(self) -> bytes:
+        return bytes(self._attribute_buffer())
+
+    def _attribute_buffer(self) -> bytearray:
+        """Return the wire encoding of every attribute, cached until changed.
+
+        The cache is dropped by ``__setitem__``, ``__delitem__``, ``pop``,
+        ``popitem``, ``setdefault``, ``move_to_end``, ``add_attribute``,
+        ``set_obfuscated``, ``clear`` and ``decode_packet``, and ignored
+        once ``_encoding_cache_key`` changes. ``items``, ``values`` and
+        lookups by attribute code hand out the stored value lists, which
+        callers may change in place (``packet[1].append(...)``), so they
+        drop it too.
+
+        The buffer is shared: serializers copy it behind their header and
+        Message-Authenticator signing patches it in place. Hand callers
+        ``_pkt_encode_attributes`` instead.
+        """
+        if (
+            self._encoded_attributes is not None
+            and self._encoded_attributes_key == self._encoding_cache_key()
+        ):
+            return self._encoded_attributes
+        out = bytearray()
+        self._message_authenticator_offset = self._pkt_write_attributes(out)
+        self._encoded_attributes = out
+        # Taken after encoding: pw_crypt may create the authenticator.
+        self._encoded_attributes_key = self._encoding_cache_key()
+        return out
+
+    def _encoding_cache_key(self) -> Any:
+        """Return the non-attribute state the attribute encoding depends on.
+
+        Stored attributes only depend on ``radius_version`` (through the
+        deferred-obfuscation sidecar); ``set_obfuscated`` values are also
+        obfuscated with the secret and Request Authenticator.
+        """
+        if self._deferred_obfuscated:
+            return (self.radius_version, self.authenticator, self.secret)
+        return self.radius_version
+
+    def _invalidate_encoding(self, key: Optional[Hashable] = None) -> None:
+        """Drop the cached encoding, and the template block if ``key``
+        (or, when omitted, any key) came from the template."""
+        self._encoded_attributes = None
+        template = self._template
+        if template is not None and (key is None or key in template.keys):
+            self._template = None
+
+    def _pkt_write_attributes(self, out: bytearray) -> Optional[int]:
+        # Returns the offset in ``out`` of the Message-Authenticator value
+        # when exactly one 16-byte MA was written, else None.
+        #
         # Side-effect free serialization: the deferred-obfuscation sidecar
         # is encoded inline at the end and never mutates ``self``. Stored
         # entries that share a code with a deferred attribute are skipped
         # so the deferred declaration wins (its plaintext is authoritative
         # across version flips per RFC 9765 §3.5).
         deferred_codes = self._deferred_attribute_codes()
-        result = b""
-        for code, datalst in self.items():
-            if code in deferred_codes:
+        ma_offset = None
+        template = self._template
+        if template is not None:
+            # Its attributes were stored first and haven't been touched
+            # since, so the block is exactly what they would encode to.
+            out += template.encoded
+            template_keys = template.keys
+        else:
+            template_keys = frozenset()
+        if self._lazy_pending:
+            self._materialize_all()
+        for code, datalst in OrderedDict.items(self):
+            if code in deferred_codes or code in template_keys:
                 continue
             if self._is_virtual_attribute(code):
                 # FreeRADIUS-style server-internal attribute. Present in
                 # the dictionary so config can reference it; never
                 # serialised onto the wire.
                 continue
-            result += self._encode_avp_group(code, datalst)
-        result += self._encode_deferred_obfuscated()
-        return result
+            if code == 80 and len(datalst) == 1 and len(datalst[0]) == 16:
+                ma_offset = len(out) + 2
+            self._pkt_write_avp_group(out, code, datalst)
+        if self._deferred_obfuscated:
+            out += self._encode_deferred_obfuscated()
+        return ma_offset
+
+    def encode_attributes_into(self, buffer: bytearray) -> int:
+        """Append the wire encoding of every attribute to ``buffer``.
+
+        Lets a caller reuse one buffer across packets, or reserve room
+        for a header in front of the attributes, instead of receiving a
+        fresh ``bytes`` it then has to copy again.
+
+        Args:
+            buffer (bytearray): Buffer to extend in place.
+
+        Returns:
+            int: Number of bytes appended.
+        """
+        attr = self._attribute_buffer()
+        buffer += attr
+        return len(attr)
 
     def _is_virtual_attribute(self, code: Hashable) -> bool:
         """Return True when ``code`` refers to a dictionary attribute marked ``virtual``."""
-
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return False
-        attr = dictionary.attributes.get(self._decode_key(code))
-        return attr is not None and getattr(attr, "virtual", False)
+        codec = self._codec_for_key(code)
+        return codec is not None and codec.virtual
 
     def _is_array_attribute(self, code: Hashable) -> bool:
         """Return True when ``code`` refers to a dictionary attribute marked ``array``."""
+        codec = self._codec_for_key(code)
+        return codec is not None and codec.array
 
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return False
-        attr = dictionary.attributes.get(self._decode_key(code))
-        return attr is not None and getattr(attr, "array", False)
+    def _pkt_decode_vendor_attribute(self, data: Buffer) -> list[tuple]:
+        """Split one Vendor-Specific value into ``((vendor, type), value)`` pairs.
 
-    def _pkt_decode_vendor_attribute(self, data: bytes) -> list[tuple]:
-        if len(data) < 4:
-            return [(26, data)]
+        ``data`` may be a ``memoryview`` into the datagram being decoded;
+        the walker reads every header in place with ``struct.unpack_from``
+        and only copies a sub-attribute value once, into its final
+        storage. Malformed payloads fall back to ``[(26, raw_bytes)]``.
+        """
+        view = memoryview(data)
+        end = len(view)
+        if end < 4:
+            return [(26, bytes(view))]
 
-        (vendor,) = struct.unpack("!L", data[:4])
+        (vendor,) = struct.unpack_from("!L", view, 0)
         type_len, len_len, has_continuation = self._vendor_format(vendor)
         header_len = type_len + len_len
-        inner = data[4:]
+        type_format = self._VSA_TYPE_FORMATS[type_len]
+        len_format = self._VSA_LEN_FORMATS.get(len_len)
 
-        if len(inner) < header_len:
-            return [(26, data)]
+        if end - 4 < header_len:
+            return [(26, bytes(view))]
 
         tlvs: list[tuple] = []
-        offset = 0
-        while offset + header_len <= len(inner):
-            try:
-                (atype,) = struct.unpack(
-                    self._VSA_TYPE_FORMATS[type_len],
-                    inner[offset : offset + type_len],
+        offset = 4
+        while offset + header_len <= end:
+            (atype,) = struct.unpack_from(type_format, view, offset)
+            if len_format is None:
+                payload_end = end
+            else:
+                (length_value,) = struct.unpack_from(
+                    len_format, view, offset + type_len
                 )
-                if len_len == 0:
-                    payload_end = len(inner)
-                else:
-                    (length_value,) = struct.unpack(
-                        self._VSA_LEN_FORMATS[len_len],
-                        inner[offset + type_len : offset + header_len],
-                    )
-                    if length_value < header_len:
-                        return [(26, data)]
-                    payload_end = offset + length_value
-                    if payload_end > len(inner):
-                        return [(26, data)]
-            except struct.error:
-                return [(26, data)]
+                if length_value < header_len:
+                    return [(26, bytes(view))]
+                payload_end = offset + length_value
+                if payload_end > end:
+                    return [(26, bytes(view))]
 
             payload_start = offset + header_len
+            payload: bytes | memoryview
             if has_continuation:
                 # RFC 5904: one continuation byte sits between the
                 # length header and the value. Buffer fragments keyed
                 # on (vendor, atype); emit the joined value when the
                 # More flag clears.
                 if payload_start >= payload_end:
-                    return [(26, data)]
-                continuation = inner[payload_start]
-                payload = inner[payload_start + 1 : payload_end]
+                    return [(26, bytes(view))]
+                continuation = view[payload_start]
                 buf_key = (vendor, atype)
                 buf = self._vsa_continuation_buf.setdefault(buf_key, bytearray())
-                buf.extend(payload)
+                buf.extend(view[payload_start + 1 : payload_end])
                 if continuation & self._VSA_CONTINUATION_MORE:
                     offset = payload_end
                     continue
                 payload = bytes(buf)
                 del self._vsa_continuation_buf[buf_key]
             else:
-                payload = inner[payload_start:payload_end]
+                payload = view[payload_start:payload_end]
 
             try:
                 if self._pkt_is_tlv_attribute((vendor, atype)):
                     self._pkt_decode_tlv_attribute((vendor, atype), payload)
                 else:
-                    tlvs.append(((vendor, atype), payload))
+                    tlvs.append(((vendor, atype), bytes(payload)))
             except Exception:
-                return [(26, data)]
+                return [(26, bytes(view))]
 
             offset = payload_end
             if len_len == 0:
                 break
 
-        if offset != len(inner):
-            return [(26, data)]
+        if offset != end:
+            return [(26, bytes(view))]
         return tlvs
 
-    def _pkt_decode_tlv_attribute(self, code, data):
+    def _pkt_decode_tlv_attribute(
+        self,
+        code: Hashable,
+        data: Buffer,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> None:
         sub_attributes = self.setdefault(code, {})
-        parent_attr = self.dict.attributes.get(self._decode_key(code))
-        self._decode_tlv_chain_into(parent_attr, sub_attributes, data)
+        self._decode_tlv_chain_into(
+            self._attribute_for_key(code), sub_attributes, data, start, end
+        )
 
     def _decode_tlv_chain_into(
         self,
         parent_attr: Optional[Attribute],
         target: dict,
-        data: bytes,
+        data: Buffer,
+        start: int = 0,
+        end: Optional[int] = None,
     ) -> None:
         """Parse a TLV chain into ``target``, recursing on nested ``tlv`` slots.
 
@@ -1647,31 +2028,41 @@ class Packet(OrderedDict):
         these are — used to look up sub-attribute types so a nested
         ``tlv`` slot's payload gets parsed instead of stored as raw
         bytes. ``None`` falls back to flat (legacy) parsing.
+
+        The chain is walked in place over ``data[start:end]``; nested
+        slots recurse with narrowed bounds on the same buffer, so only
+        the leaf values are ever copied.
         """
 
-        loc = 0
-        while loc < len(data):
-            if loc + 2 > len(data):
-                break
-            atype, length = struct.unpack("!BB", data[loc : loc + 2])
+        view = memoryview(data)
+        if end is None:
+            end = len(view)
+        loc = start
+        while loc + 2 <= end:
+            atype = view[loc]
+            length = view[loc + 1]
             if length < 2:
                 break
-            # ``data[loc+2:loc+length]`` matches the pre-existing
-            # lenient behaviour: declared lengths that overshoot the
-            # available bytes truncate to what's there rather than
-            # rejecting the AVP.
-            inner = data[loc + 2 : loc + length]
+            # Clamping to ``end`` matches the pre-existing lenient
+            # behaviour: declared lengths that overshoot the available
+            # bytes truncate to what's there rather than rejecting the AVP.
+            stop = min(loc + length, end)
             child_attr = self._tlv_child_attr(parent_attr, atype)
             if child_attr is not None and child_attr.type == "tlv":
                 nested = target.setdefault(atype, {})
                 if not isinstance(nested, dict):
                     nested = {}
                     target[atype] = nested
-                self._decode_tlv_chain_into(child_attr, nested, inner)
+                self._decode_tlv_chain_into(child_attr, nested, view, loc + 2, stop)
             else:
-                target.setdefault(atype, []).append(inner)
+                target.setdefault(atype, []).append(bytes(view[loc + 2 : stop]))
             loc += length
 
+    def _attribute_for_key(self, key: Hashable) -> Optional[Attribute]:
+        """Return the dictionary ``Attribute`` stored under ``key``, if any."""
+        codec = self._codec_for_key(key)
+        return None if codec is None else codec.attribute
+
     def _tlv_child_attr(
         self, parent_attr: Optional[Attribute], child_code: int
     ) -> Optional[Attribute]:
@@ -1687,32 +2078,18 @@ class Packet(OrderedDict):
     def _is_tlv_extended_slot(self, parent_code: int, ext_type: int) -> bool:
         """Return True when an Extended slot is declared as a ``tlv`` container."""
 
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return False
-        parent_attr = dictionary.attributes.get(self._decode_key(parent_code))
-        sub_attr = self._tlv_child_attr(parent_attr, ext_type)
+        sub_attr = self._tlv_child_attr(self._attribute_for_key(parent_code), ext_type)
         return sub_attr is not None and sub_attr.type == "tlv"
 
     def _pkt_is_tlv_attribute(self, code):
-        attr = self.dict.attributes.get(self._decode_key(code))
-        return attr is not None and attr.type == "tlv"
+        return self._container_type(code) == "tlv"
 
     def _is_evs_slot(self, parent_code: int, ext_type: int) -> bool:
         """Return True if ``(parent_code, ext_type)`` is an EVS marker."""
-        dictionary = getattr(self, "dict", None)
-        if dictionary is None:
-            return False
-        parent_attr = dictionary.attributes.get(self._decode_key(parent_code))
-        if parent_attr is None:
-            return False
-        sub_name = parent_attr.sub_attributes.get(ext_type)
-        if sub_name is None:
-            return False
-        sub_attr = dictionary.attributes.get(sub_name)
+        sub_attr = self._tlv_child_attr(self._attribute_for_key(parent_code), ext_type)
         return sub_attr is not None and sub_attr.type == "evs"
 
-    def _pkt_decode_extended(self, parent_code: int, value: bytes) -> None:
+    def _pkt_decode_extended(self, parent_code: int, value: Buffer) -> None:
         """Decode one extended AVP (RFC 6929 §2.1).
 
         If the extended-type slot is registered as an ``evs`` marker, the
@@ -1723,16 +2100,16 @@ class Packet(OrderedDict):
         nested map. Plain leaf slots go to ``self[parent][ext_type]``
         as raw bytes appended to a list.
         """
-        if not value:
+        view = memoryview(value)
+        if not view:
             return
-        ext_type = value[0]
-        payload = value[1:]
+        ext_type = view[0]
 
-        if len(payload) >= 5 and self._is_evs_slot(parent_code, ext_type):
-            (vendor_id,) = struct.unpack("!L", payload[:4])
-            vsa_type = payload[4]
+        if len(view) >= 6 and self._is_evs_slot(parent_code, ext_type):
+            (vendor_id,) = struct.unpack_from("!L", view, 1)
+            vsa_type = view[5]
             self.setdefault((parent_code, ext_type, vendor_id, vsa_type), []).append(
-                payload[5:]
+                bytes(view[6:])
             )
             return
 
@@ -1742,70 +2119,88 @@ class Packet(OrderedDict):
             if not isinstance(nested, dict):
                 nested = {}
                 parent_dict[ext_type] = nested
-            parent_attr = self.dict.attributes.get(self._decode_key(parent_code))
-            child_attr = self._tlv_child_attr(parent_attr, ext_type)
-            self._decode_tlv_chain_into(child_attr, nested, payload)
+            child_attr = self._tlv_child_attr(
+                self._attribute_for_key(parent_code), ext_type
+            )
+            self._decode_tlv_chain_into(child_attr, nested, view, 1)
             return
-        parent_dict.setdefault(ext_type, []).append(payload)
+        parent_dict.setdefault(ext_type, []).append(bytes(view[1:]))
 
     def _pkt_decode_long_extended_fragment(
-        self, parent_code: int, value: bytes
+        self, parent_code: int, value: Buffer
     ) -> None:
         """Decode one long-extended fragment (RFC 6929 §2.2), reassembling on M=0.
 
         Fragments accumulate in ``self._long_ext_buf`` until the More flag
         clears, at which point the joined value is appended to the parent.
         EVS fragments key the buffer on the full 4-tuple so concurrent
-        vendor attributes under the same wrapper don't collide.
+        vendor attributes under the same wrapper don't collide. Fragment
+        payloads are appended straight from the datagram view, so each
+        byte is copied once into the reassembly buffer.
         """
         from pyrad2.constants import LONG_EXTENDED_MORE_FLAG
 
-        if len(value) < 2:
+        view = memoryview(value)
+        if len(view) < 2:
             return
-        ext_type = value[0]
-        flags = value[1]
-        payload = value[2:]
-
-        if len(payload) >= 5 and self._is_evs_slot(parent_code, ext_type):
-            (vendor_id,) = struct.unpack("!L", payload[:4])
-            vsa_type = payload[4]
-            chunk = payload[5:]
+        ext_type = view[0]
+        flags = view[1]
+
+        if len(view) >= 7 and self._is_evs_slot(parent_code, ext_type):
+            (vendor_id,) = struct.unpack_from("!L", view, 2)
+            vsa_type = view[6]
             buf_key = (parent_code, ext_type, vendor_id, vsa_type)
             buf = self._long_ext_buf.setdefault(buf_key, bytearray())
-            buf.extend(chunk)
+            buf.extend(view[7:])
             if not flags & LONG_EXTENDED_MORE_FLAG:
                 self.setdefault(buf_key, []).append(bytes(buf))
                 del self._long_ext_buf[buf_key]
             return
 
         buf = self._long_ext_buf.setdefault((parent_code, ext_type), bytearray())
-        buf.extend(payload)
+        buf.extend(view[2:])
         if not flags & LONG_EXTENDED_MORE_FLAG:
             parent_dict = self.setdefault(parent_code, {})
-            reassembled = bytes(buf)
             if self._is_tlv_extended_slot(parent_code, ext_type):
                 nested = parent_dict.setdefault(ext_type, {})
                 if not isinstance(nested, dict):
                     nested = {}
                     parent_dict[ext_type] = nested
-                parent_attr = self.dict.attributes.get(self._decode_key(parent_code))
-                child_attr = self._tlv_child_attr(parent_attr, ext_type)
-                self._decode_tlv_chain_into(child_attr, nested, reassembled)
+                child_attr = self._tlv_child_attr(
+                    self._attribute_for_key(parent_code), ext_type
+                )
+                self._decode_tlv_chain_into(child_attr, nested, buf)
             else:
-                parent_dict.setdefault(ext_type, []).append(reassembled)
+                parent_dict.setdefault(ext_type, []).append(bytes(buf))
             del self._long_ext_buf[(parent_code, ext_type)]
 
-    def decode_packet(self, packet: bytes) -> None:
+    def decode_packet(self, packet: bytes, lazy: bool = False) -> None:
         """Initialize the object from raw packet data.  Decode a packet as
         received from the network and decode it.
 
+        The attribute walk runs over a single ``memoryview`` of ``packet``
+        with an offset cursor: headers are read in place and every AVP
+        value is sliced exactly once, into its final storage. Consuming
+        the datagram with ``packet = packet[attrlen:]`` instead would copy
+        the remaining tail on every AVP and make decode quadratic.
+
+        With ``lazy=True`` the walk only validates the AVP headers and
+        records a ``(code, offset, length)`` index over ``packet``. The
+        AVPs sharing a wire code are decoded together the first time any
+        of their keys is read, tested, set or deleted; iterating the packet
+        (``keys()``, ``items()``, ``len()``, encoding) decodes the rest.
+        A handler that reads two attributes, or a Status-Server that
+        never looks past Message-Authenticator, skips parsing everything
+        else. Header corruption is still raised here, not on first access.
+
         Args:
             packet packet.Packet: Raw packet
+            lazy (bool): Index the attributes instead of decoding them.
         """
         raw = packet  # preserved for the optional PYRAD2_TRACE dump below
         try:
-            (self.code, self.id, length, self.authenticator) = struct.unpack(
-                "!BBH16s", packet[0:20]
+            (self.code, self.id, length, self.authenticator) = struct.unpack_from(
+                "!BBH16s", packet
             )
 
         except struct.error:
@@ -1824,6 +2219,38 @@ class Packet(OrderedDict):
             raise PacketError("Packet length is too long (%d)" % length)
 
         self.clear()
+        self._reset_reassembly_buffers()
+
+        view = memoryview(packet)
+        if lazy:
+            index = []
+            pending: dict[int, list[tuple[int, int]]] = {}
+            for key, offset, attrlen in self._walk_attributes(view, length):
+                if key == 80:
+                    # Same RFC 9765 §5.2 discard as ``_decode_avp``; the
+                    # flag is set up front because MA policy checks read
+                    # it without touching the attribute itself.
+                    if self.radius_version == RadiusVersion.V1_1:
+                        continue
+                    self.message_authenticator = True
+                index.append((key, offset, attrlen))
+                pending.setdefault(key, []).append((offset, attrlen))
+            self._lazy_buffer = packet
+            self._lazy_index = index
+            self._lazy_pending = pending
+            _trace_packet("in", raw, self)
+            return
+
+        for key, offset, attrlen in self._walk_attributes(view, length):
+            # A declared length that overshoots the datagram truncates to
+            # what's there, exactly like the historic slice-based walker.
+            self._decode_avp(view, key, offset + 2, min(offset + attrlen, length))
+
+        self._merge_concat_attributes()
+        self._split_array_attributes()
+        _trace_packet("in", raw, self)
+
+    def _reset_reassembly_buffers(self) -> None:
         # Keys are (parent_code, ext_type) for plain long-extended fragments
         # and (parent_code, ext_type, vendor_id, vendor_type) for EVS ones.
         self._long_ext_buf: dict[tuple[int, ...], bytearray] = {}
@@ -1832,99 +2259,161 @@ class Packet(OrderedDict):
         # until a fragment without the More flag arrives.
         self._vsa_continuation_buf: dict[tuple[int, int], bytearray] = {}
 
-        packet = packet[20:]
-        while packet:
-            try:
-                (key, attrlen) = struct.unpack("!BB", packet[0:2])
-            except struct.error:
+    @staticmethod
+    def _walk_attributes(
+        view: memoryview, length: int
+    ) -> Iterator[tuple[int, int, int]]:
+        """Yield ``(code, offset, length)`` for every AVP header in ``view``."""
+        offset = 20
+        while offset < length:
+            if offset + 2 > length:
                 raise PacketError("Attribute header is corrupt")
-
+            key = view[offset]
+            attrlen = view[offset + 1]
             if attrlen < 2:
                 raise PacketError("Attribute length is too small (%d)" % attrlen)
-
-            value = packet[2:attrlen]
-            if key == 26:
-                for key, value in self._pkt_decode_vendor_attribute(value):
-                    self.setdefault(key, []).append(value)
-            elif key == 80:
-                # RFC 9765 §5.2: Message-Authenticator MUST NOT appear in
-                # RADIUS/1.1 packets. When it does, the receiver MUST
-                # silently discard it or treat it as an invalid attribute
-                # per RFC 6929 §2.8. Skip both the attribute storage and
-                # the message_authenticator flag so handlers can't observe
-                # the AVP and so reply-side MA validation is impossible to
-                # trigger.
-                if self.radius_version != RadiusVersion.V1_1:
-                    self.message_authenticator = True
-                    self.setdefault(key, []).append(value)
+            yield key, offset, attrlen
+            offset += attrlen
+
+    def _decode_avp(self, view: memoryview, key: int, start: int, end: int) -> None:
+        """Decode the AVP value ``view[start:end]`` sent under wire code ``key``."""
+        if key == 26:
+            for vsa_key, value in self._pkt_decode_vendor_attribute(view[start:end]):
+                self._append_decoded(vsa_key, value)
+        elif key == 80:
+            # RFC 9765 §5.2: Message-Authenticator MUST NOT appear in
+            # RADIUS/1.1 packets. When it does, the receiver MUST
+            # silently discard it or treat it as an invalid attribute
+            # per RFC 6929 §2.8. Skip both the attribute storage and
+            # the message_authenticator flag so handlers can't observe
+            # the AVP and so reply-side MA validation is impossible to
+            # trigger.
+            if self.radius_version != RadiusVersion.V1_1:
+                self.message_authenticator = True
+                self._append_decoded(key, bytes(view[start:end]))
+        else:
+            container = self._container_type(key)
+            if container == "tlv":
+                self._pkt_decode_tlv_attribute(key, view, start, end)
+            elif container == "extended":
+                self._pkt_decode_extended(key, view[start:end])
+            elif container == "long-extended":
+                self._pkt_decode_long_extended_fragment(key, view[start:end])
             else:
-                container = self._container_type(key)
-                if container == "tlv":
-                    self._pkt_decode_tlv_attribute(key, value)
-                elif container == "extended":
-                    self._pkt_decode_extended(key, value)
-                elif container == "long-extended":
-                    self._pkt_decode_long_extended_fragment(key, value)
-                else:
-                    self.setdefault(key, []).append(value)
+                self._append_decoded(key, bytes(view[start:end]))
+
+    def _append_decoded(self, key: Hashable, value: bytes) -> None:
+        # Straight to the underlying dict: ``setdefault`` on a subclass
+        # goes through the overridden ``__contains__`` / ``__getitem__``
+        # and costs three lookups per AVP instead of one.
+        stored = OrderedDict.get(self, key)
+        if stored is None:
+            OrderedDict.__setitem__(self, key, [value])
+        else:
+            stored.append(value)
+
+    @staticmethod
+    def _wire_code(key: Hashable) -> Hashable:
+        """Return the top-level wire code a storage key is decoded from.
 
-            packet = packet[attrlen:]
+        Vendor keys ``(vendor_id, type)`` all come from Vendor-Specific
+        (26); EVS keys ``(parent, slot, vendor_id, type)`` from their
+        extended parent.
+        """
+        if isinstance(key, tuple):
+            return key[0] if len(key) == 4 else 26
+        return key
 
+    def _materialize_code(self, code: Any) -> None:
+        """Decode the indexed AVPs sent under wire code ``code``, once."""
+        entries = self._lazy_pending.pop(code, None)
+        if entries is None:
+            return
+        assert self._lazy_buffer is not None
+        view = memoryview(self._lazy_buffer)
+        length = len(view)
+        for offset, attrlen in entries:
+            self._decode_avp(view, code, offset + 2, min(offset + attrlen, length))
+        keys = [k for k in OrderedDict.keys(self) if self._wire_code(k) == code]
+        self._merge_concat_attributes(keys)
+        self._split_array_attributes(keys)
+
+    def _materialize_all(self) -> None:
+        """Decode every remaining indexed AVP, restoring wire order.
+
+        Keys materialized earlier may have been modified or deleted by
+        the caller; those edits win. Re-decoding the whole index (rather
+        than just what's pending) is what puts every key back at the
+        position an eager decode would have given it.
+        """
+        pending = self._lazy_pending
+        if not pending:
+            return
+        self._lazy_pending = {}
+        touched = {code for code, _, _ in self._lazy_index} - pending.keys()
+        assert self._lazy_buffer is not None
+        view = memoryview(self._lazy_buffer)
+        length = len(view)
+
+        current = OrderedDict(OrderedDict.items(self))
+        OrderedDict.clear(self)
+        self._reset_reassembly_buffers()
+        for code, offset, attrlen in self._lazy_index:
+            self._decode_avp(view, code, offset + 2, min(offset + attrlen, length))
         self._merge_concat_attributes()
         self._split_array_attributes()
-        _trace_packet("in", raw, self)
 
-    def _merge_concat_attributes(self) -> None:
+        for key in list(OrderedDict.keys(self)):
+            if self._wire_code(key) in touched:
+                if key in current:
+                    OrderedDict.__setitem__(self, key, current.pop(key))
+                else:
+                    OrderedDict.__delitem__(self, key)
+        # Whatever is left was added by the caller, not decoded.
+        for key, value in current.items():
+            OrderedDict.__setitem__(self, key, value)
+        self._lazy_index = []
+        self._lazy_buffer = None
+
+    def _merge_concat_attributes(self, codes: Optional[list] = None) -> None:
         """Concatenate split AVPs for attributes flagged with the ``concat`` option.
 
-        Operates on the raw bytes stored under each code, bypassing the
-        type-decoding overlays in ``__getitem__`` / ``__setitem__``.
+        Operates on the raw bytes stored under each code (or only
+        ``codes``), bypassing the type-decoding overlays in
+        ``__getitem__`` / ``__setitem__``.
         """
         dictionary = getattr(self, "dict", None)
         if dictionary is None:
             return
-        for code in list(OrderedDict.keys(self)):
-            attr = dictionary.attributes.get(self._decode_key(code))
-            if attr is None or not getattr(attr, "concat", False):
+        codecs_by_key = dictionary.codecs_by_key
+        for code in list(OrderedDict.keys(self)) if codes is None else codes:
+            codec = codecs_by_key.get(code)
+            if codec is None or not codec.concat:
                 continue
             chunks = OrderedDict.__getitem__(self, code)
             if isinstance(chunks, list) and len(chunks) > 1:
                 OrderedDict.__setitem__(self, code, [b"".join(chunks)])
 
-    # Fixed wire-byte length for every type that ``array`` is meaningful
-    # for (RFC 8044 §3.8). Variable-length types (string, octets, …) can't
-    # be ``array`` and aren't represented here.
-    _ARRAY_TYPE_SIZE = {
-        "byte": 1,
-        "short": 2,
-        "integer": 4,
-        "integer64": 8,
-        "signed": 4,
-        "date": 4,
-        "ipaddr": 4,
-        "ipv6addr": 16,
-        "ifid": 8,
-        "ether": 6,
-    }
-
-    def _split_array_attributes(self) -> None:
+    def _split_array_attributes(self, codes: Optional[list] = None) -> None:
         """Split RFC 8044 array-packed values back into one entry per element.
 
         The decoder stores each AVP's value as a single list element. For
         attributes declared ``array``, a single AVP carries N concatenated
         values — we slice the bytes into ``N`` chunks of the type's fixed
         wire length so downstream code sees the same shape as if the
-        sender had used N separate AVPs.
+        sender had used N separate AVPs. ``codes`` limits the pass to
+        those storage keys.
         """
 
         dictionary = getattr(self, "dict", None)
         if dictionary is None:
             return
-        for code in list(OrderedDict.keys(self)):
-            attr = dictionary.attributes.get(self._decode_key(code))
-            if attr is None or not getattr(attr, "array", False):
+        codecs_by_key = dictionary.codecs_by_key
+        for code in list(OrderedDict.keys(self)) if codes is None else codes:
+            codec = codecs_by_key.get(code)
+            if codec is None or not codec.array:
                 continue
-            chunk_size = self._ARRAY_TYPE_SIZE.get(attr.type)
+            chunk_size = codec.wire_size
             if chunk_size is None:
                 continue
             stored = OrderedDict.__getitem__(self, code)
@@ -1950,9 +2439,10 @@ class Packet(OrderedDict):
         else:
             last = self.authenticator + salt
 
+        ctx = self.secret_context
         out = bytearray()
         for offset in range(0, len(data), 16):
-            block = _md5_keystream_xor(self.secret, last, data[offset : offset + 16])
+            block = _md5_keystream_xor(ctx, last, data[offset : offset + 16])
             out += block
             # Chain on the previous output (matches the legacy
             # ``last = result[-16:]`` behaviour).
@@ -2033,6 +2523,8 @@ class Packet(OrderedDict):
 class StatusPacket(Packet):
     """RADIUS Status-Server packet for RFC 5997 health checks."""
 
+    __slots__ = ()
+
     def __init__(
         self,
         code: int = PacketType.StatusServer,
@@ -2088,6 +2580,8 @@ class StatusPacket(Packet):
 
 
 class AuthPacket(Packet):
+    __slots__ = ("auth_type",)
+
     def __init__(
         self,
         code: int = PacketType.AccessRequest,
@@ -2173,11 +2667,12 @@ class AuthPacket(Packet):
             # RFC 9765 §5.1.1: User-Password is plain "string" over TLS.
             return password.decode("utf-8", errors="ignore")
 
+        ctx = self.secret_context
         pw = bytearray()
         last = self.authenticator
         for offset in range(0, len(password), 16):
             block = password[offset : offset + 16]
-            pw += _md5_keystream_xor(self.secret, last, block)  # type: ignore[arg-type]
+            pw += _md5_keystream_xor(ctx, last, block)  # type: ignore[arg-type]
             # Decrypt chains on the previous *ciphertext* block, not the
             # previous plaintext output (see the encrypt counterpart).
             last = block
@@ -2233,11 +2728,12 @@ class AuthPacket(Packet):
         if len(password) % 16 != 0:
             buf += b"\x00" * (16 - (len(password) % 16))
 
+        ctx = self.secret_context
         out = bytearray()
         last = self.authenticator
         for offset in range(0, len(buf), 16):
             block = _md5_keystream_xor(
-                self.secret,
+                ctx,
                 last,
                 buf[offset : offset + 16],  # type: ignore[arg-type]
             )
@@ -2328,6 +2824,8 @@ class AcctPacket(Packet):
     of the generic :obj:`Packet` class for accounting packets.
     """
 
+    __slots__ = ()
+
     def __init__(
         self,
         code: int = PacketType.AccountingRequest,
@@ -2381,6 +2879,8 @@ class CoAPacket(Packet):
     of the generic :obj:`Packet` class for CoA packets.
     """
 
+    __slots__ = ()
+
     def __init__(
         self,
         code: int = PacketType.CoARequest,
@@ -2427,6 +2927,62 @@ class CoAPacket(Packet):
         return self._encode_v10_request_with_body_md5_authenticator()
 
 
+class PacketTemplate:
+    """A fixed block of attributes, encoded once and reused by many packets.
+
+    Pass it as ``template=`` to any packet constructor, ``create_reply``
+    or a client's ``create_*_packet``. The packet starts with a copy of
+    the template's stored attributes (so ``packet["Reply-Message"]``
+    reads as usual), and its encoder emits the template's pre-encoded
+    bytes instead of re-encoding them. Only the per-packet attributes,
+    the header and the authenticator / Message-Authenticator are
+    computed per packet. Setting, deleting or adding to any of the
+    template's attributes on a packet falls back to a full encode.
+
+    Example::
+
+        REJECT = PacketTemplate(dictionary, Reply_Message="Denied")
+        reply = request.create_reply(template=REJECT)
+        reply.code = PacketType.AccessReject
+
+    Encrypted attributes depend on each packet's authenticator and
+    can't be pre-encoded; they raise ``ValueError`` here and belong in
+    the per-packet attributes (or ``set_obfuscated``) instead. So does
+    ``Message-Authenticator``, which is computed per packet.
+    """
+
+    __slots__ = ("dictionary", "storage", "encoded", "keys")
+
+    def __init__(self, dictionary: Dictionary, **attributes):
+        """Encode ``attributes`` against ``dictionary``.
+
+        Args:
+            dictionary (Dictionary): Dictionary the packets will use.
+            attributes (dict): Attributes, named as for ``Packet``.
+        """
+        for name in attributes:
+            codec = dictionary.codecs[name.replace("_", "-").partition(":")[0]]
+            if codec.encrypt or codec.key == 80:
+                raise ValueError(
+                    "%s is computed per packet and can't be part of a "
+                    "PacketTemplate" % codec.name
+                )
+        scratch = Packet(dict=dictionary, **attributes)
+        self.dictionary = dictionary
+        self.storage: tuple[tuple[Hashable, Any], ...] = tuple(
+            OrderedDict.items(scratch)
+        )
+        self.encoded = scratch._pkt_encode_attributes()
+        self.keys = frozenset(key for key, _ in self.storage)
+
+
+def _copy_stored(value: Any) -> Any:
+    """Copy a stored attribute value (a list, or a TLV dict of them)."""
+    if isinstance(value, dict):
+        return {key: _copy_stored(sub) for key, sub in value.items()}
+    return list(value)
+
+
 def create_id() -> int:
     """Generate a packet identifier as an 8-bit integer.
 
@@ -2449,21 +3005,131 @@ def parse_packet(
     secret: bytes,
     dictionary: Optional[Dictionary],
     radius_version: RadiusVersion = RadiusVersion.V1_0,
+    lazy: bool = False,
+    secret_context: Optional[SecretContext] = None,
 ):
-    code = data[0]
-    packet_class: type[Packet]
-
-    if code == PacketType.AccessRequest:
-        packet_class = AuthPacket
-    elif code == PacketType.StatusServer:
-        packet_class = StatusPacket
-    elif code in (PacketType.AccountingRequest, PacketType.AccountingResponse):
-        packet_class = AcctPacket
-    elif code in (PacketType.CoARequest, PacketType.DisconnectRequest):
-        packet_class = CoAPacket
-    else:
-        packet_class = Packet
-
+    packet_class = _PACKET_CLASSES.get(data[0], Packet)
     return packet_class(
-        packet=data, dict=dictionary, secret=secret, radius_version=radius_version
+        packet=data,
+        dict=dictionary,
+        secret=secret,
+        radius_version=radius_version,
+        lazy=lazy,
+        secret_context=secret_context,
     )
+
+
+# Typed packet class for each code ``parse_packet`` understands; anything
+# else decodes as a plain ``Packet``.
+_PACKET_CLASSES: dict[int, type[Packet]] = {
+    PacketType.AccessRequest: AuthPacket,
+    PacketType.StatusServer: StatusPacket,
+    PacketType.AccountingRequest: AcctPacket,
+    PacketType.AccountingResponse: AcctPacket,
+    PacketType.CoARequest: CoAPacket,
+    PacketType.DisconnectRequest: CoAPacket,
+}
+
+# Codes whose Request Authenticator is an MD5 over the body and secret.
+_BODY_MD5_REQUEST_CODES = frozenset(
+    {
+        PacketType.AccountingRequest,
+        PacketType.CoARequest,
+        PacketType.DisconnectRequest,
+    }
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ParseResult:
+    """Outcome of one datagram in a ``parse_packets`` batch.
+
+    Exactly one of ``packet`` and ``error`` is set. ``index`` is the
+    datagram's position in the input, so failures can be matched back
+    to their source (a pcap frame, a log line) without keeping the
+    whole batch around.
+    """
+
+    index: int
+    data: bytes
+    packet: Optional[Packet] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def parse_packets(
+    datagrams: Iterable[bytes],
+    secrets: Union[bytes, Iterable[bytes]],
+    dictionary: Optional[Dictionary],
+    radius_version: RadiusVersion = RadiusVersion.V1_0,
+    lazy: bool = False,
+    verify: bool = True,
+) -> Iterator[ParseResult]:
+    """Decode a stream of datagrams, yielding one ``ParseResult`` each.
+
+    Meant for pcap replays and accounting backfills, where calling
+    ``parse_packet`` in a loop re-derives the same per-secret state for
+    every datagram. The batch keeps one ``SecretContext`` per distinct
+    secret, and with ``verify`` checks each request's authenticator in
+    the same pass, the way the servers do: body MD5 for
+    Accounting-, CoA- and Disconnect-Request, the structural checks of
+    ``verify_auth_request`` for Access-Request.
+
+    A datagram that fails to decode or verify yields a result carrying
+    the exception; the batch carries on with the next one. Results are
+    produced lazily, so arbitrarily large inputs stream through.
+
+    Args:
+        datagrams (Iterable[bytes]): Raw RADIUS packets.
+        secrets (bytes | Iterable[bytes]): One shared secret for the
+            whole batch, or one per datagram in the same order.
+        dictionary (Dictionary): RADIUS dictionary.
+        radius_version (RadiusVersion): Protocol profile for every packet.
+        lazy (bool): Index attributes instead of decoding them; see
+            ``Packet.decode_packet``.
+        verify (bool): Check Request Authenticators.
+
+    Yields:
+        ParseResult: In input order.
+    """
+    pairs: Iterable[tuple[bytes, bytes]]
+    if isinstance(secrets, bytes):
+        single = secrets
+        pairs = ((data, single) for data in datagrams)
+    else:
+        pairs = zip(datagrams, secrets, strict=True)
+
+    contexts: dict[bytes, SecretContext] = {}
+    for index, (data, secret) in enumerate(pairs):
+        ctx = contexts.get(secret)
+        if ctx is None:
+            ctx = contexts[secret] = SecretContext(secret)
+        try:
+            if not data:
+                raise PacketError("Empty packet")
+            pkt = _PACKET_CLASSES.get(data[0], Packet)(
+                packet=data,
+                dict=dictionary,
+                secret=secret,
+                radius_version=radius_version,
+                lazy=lazy,
+                secret_context=ctx,
+            )
+            if verify and not _verify_request_authenticator(pkt):
+                raise PacketError("Packet verification failed")
+        except Exception as exc:
+            yield ParseResult(index, data, error=exc)
+        else:
+            yield ParseResult(index, data, packet=pkt)
+
+
+def _verify_request_authenticator(pkt: Packet) -> bool:
+    """Return False if ``pkt`` is a request whose authenticator is invalid."""
+    if pkt.code == PacketType.AccessRequest:
+        return isinstance(pkt, AuthPacket) and pkt.verify_auth_request()
+    if pkt.code in _BODY_MD5_REQUEST_CODES:
+        return pkt.verify_packet()
+    return True
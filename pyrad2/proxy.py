@@ -47,9 +47,10 @@ class Proxy(Server):
         Args:
             pkt (packet.Packet): Packet to process
         """
-        if pkt.source[0] not in self.hosts:
+        remote_host = self.hosts.get(pkt.source[0])
+        if remote_host is None:
             raise ServerPacketError("Received packet from unknown host")
-        pkt.secret = self.hosts[pkt.source[0]].secret
+        pkt.secret = remote_host.secret
 
         if pkt.code not in [
             PacketType.AccessAccept,
@@ -79,6 +80,7 @@ class Proxy(Server):
             # are. ``parse_packet`` dispatches the right Packet subclass
             # by code (AccessAccept / AccountingResponse / …).
             pkt = self._grab_packet(fd)
-            self._handle_proxy_packet(pkt)
+            if pkt is not None:
+                self._dispatch(pkt, self._handle_proxy_packet)
         else:
             Server._process_input(self, fd)
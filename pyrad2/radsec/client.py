@@ -1,5 +1,6 @@
 import asyncio
 import ssl
+import time
 from typing import Iterable, Optional, Sequence
 
 from loguru import logger
@@ -7,6 +8,7 @@ from loguru import logger
 from pyrad2 import eap
 from pyrad2.constants import PacketType
 from pyrad2.host import _ClientPacketFactoryMixin
+from pyrad2.metrics import Metrics
 from pyrad2.packet import (
     AuthPacket,
     CoAPacket,
@@ -52,6 +54,7 @@ class RadSecClient(_ClientPacketFactoryMixin):
         reuse_connection: bool = True,
         reconnect_backoff: float = 0.25,
         radius_versions: Sequence[RadiusVersion] = (RadiusVersion.V1_0,),
+        metrics: Optional[Metrics] = None,
     ):
         """Initializes a RadSec client.
 
@@ -82,6 +85,8 @@ class RadSecClient(_ClientPacketFactoryMixin):
                 identical handshake behavior to historic RadSec. Pass
                 ``(V1_0, V1_1)`` to advertise both; the server picks the
                 highest mutually supported version. **Experimental.**
+            metrics (Metrics): Registry to count requests, retries and
+                timeouts, and time replies in. See ``pyrad2.metrics``.
 
         """
         self.server = server
@@ -92,6 +97,7 @@ class RadSecClient(_ClientPacketFactoryMixin):
         self.dict = dict
         self.reuse_connection = reuse_connection
         self.reconnect_backoff = reconnect_backoff
+        self.metrics = metrics
         self._reader: asyncio.StreamReader | None = None
         self._writer: asyncio.StreamWriter | None = None
         self._io_lock = asyncio.Lock()
@@ -347,7 +353,13 @@ class RadSecClient(_ClientPacketFactoryMixin):
 
     def create_packet(self, id, **kwargs) -> Packet:
         """Create a generic RADIUS packet with this client's dictionary and secret."""
-        return Packet(id=id, dict=self.dict, secret=self.secret, **kwargs)
+        return Packet(
+            id=id,
+            dict=self.dict,
+            secret=self.secret,
+            secret_context=self.secret_context,
+            **kwargs,
+        )
 
     async def _send_packet(self, packet: PacketImplementation) -> Optional[Packet]:
         """Send a packet to a RadSec server with timeout and reconnect handling.
@@ -365,10 +377,21 @@ class RadSecClient(_ClientPacketFactoryMixin):
             OSError,
         )
 
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.client_request(self.server, packet.code)
+            started = time.perf_counter()
+
         async with self._io_lock:
             for attempt in range(attempts):
+                if attempt and metrics is not None:
+                    metrics.client_retransmit(self.server, packet.code)
                 try:
-                    return await self._send_packet_once(packet)
+                    reply = await self._send_packet_once(packet)
+                    if metrics is not None:
+                        elapsed = time.perf_counter() - started
+                        metrics.client_reply(self.server, packet.code, elapsed)
+                    return reply
                 except PacketError as exc:
                     # Most PacketErrors here are non-retryable handshake-level
                     # failures: ALPN refused downgrade, certificate fingerprint
@@ -397,6 +420,8 @@ class RadSecClient(_ClientPacketFactoryMixin):
                 if attempt + 1 < attempts and self.reconnect_backoff > 0:
                     await asyncio.sleep(self.reconnect_backoff)
 
+        if metrics is not None:
+            metrics.client_timeout(self.server, packet.code)
         return None
 
     async def send_packet(self, packet: PacketImplementation) -> Optional[Packet]:
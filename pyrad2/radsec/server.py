@@ -1,12 +1,17 @@
 import asyncio
 import ssl
+import time
 from abc import abstractmethod
-from typing import Iterable, Optional, Sequence
+from concurrent.futures import Executor
+from dataclasses import replace
+from typing import Iterable, MutableMapping, Optional, Sequence
 
 from loguru import logger
 
-from pyrad2.constants import ErrorCause, PacketType
+from pyrad2 import offload
+from pyrad2.constants import ERROR_CAUSE_ATTRIBUTE, ErrorCause, PacketType
 from pyrad2.dictionary import Dictionary
+from pyrad2.metrics import DropReason, Metrics
 from pyrad2.packet import (
     AcctPacket,
     AuthPacket,
@@ -33,13 +38,26 @@ from pyrad2.tools import (
 )
 
 
-ERROR_CAUSE_ATTRIBUTE = 101
-
-
 class UnknownHost(Exception):
     pass
 
 
+def verify_request(packet: Packet) -> bool:
+    """Verify a parsed request packet using its packet-specific verifier.
+
+    Module-level so the ``offload`` workers can run the same check.
+    """
+    if isinstance(packet, AuthPacket):
+        return packet.verify_auth_request()
+    if isinstance(packet, AcctPacket):
+        return packet.verify_acct_request()
+    if isinstance(packet, CoAPacket):
+        return packet.verify_coa_request()
+    if isinstance(packet, StatusPacket):
+        return packet.verify_status_request()
+    return packet.verify_packet()
+
+
 class RadSecServer:
     """A RadSec as per RFC6614.
 
@@ -67,7 +85,7 @@ class RadSecServer:
         self,
         listen_address: str = "0.0.0.0",
         listen_port: int = 2083,
-        hosts: Optional[dict[str, RemoteHost]] = None,
+        hosts: Optional[MutableMapping[str, RemoteHost]] = None,
         dictionary: Optional[Dictionary] = None,
         verify_packet: bool = False,
         certfile: str = "certs/server/server.cert.pem",
@@ -84,13 +102,16 @@ class RadSecServer:
         enable_coa: bool = True,
         enable_disconnect: bool = True,
         radius_versions: Sequence[RadiusVersion] = (RadiusVersion.V1_0,),
+        executor: Optional[Executor] = None,
+        worker_handlers: Optional[dict[int, offload.WorkerHandler]] = None,
+        metrics: Optional[Metrics] = None,
     ):
         """Initializes a RadSec server.
 
         Args:
             listen_address (str): IP address to bind to, defaults to 0.0.0.0
             listen_port (int): Deafaults to 2083.
-            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances.
+            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances, or a ``pyrad2.clients.ClientTable`` that also matches networks.
             dictionary (Dictionary): RADIUS dictionary to use.
             verify_packet (bool): If true, the packet will be verified against its secret
             certfile (str): Path to server SSL certificate
@@ -129,6 +150,16 @@ class RadSecServer:
                 ``(V1_0, V1_1)`` to advertise both; the highest mutually
                 supported version is chosen by Python's TLS stack.
                 **Experimental.**
+            executor (Executor): Pool that runs ``worker_handlers``,
+                normally from ``offload.create_executor``.
+            worker_handlers (dict[int, WorkerHandler]): Module-level
+                functions, by request code, to run in ``executor``
+                instead of the ``handle_*`` coroutines. Each receives the
+                decoded request and returns the reply packet or ``None``;
+                see ``pyrad2.offload``.
+            metrics (Metrics): Registry to record requests, drops and
+                handler latency in, under listener ``radsec``. See
+                ``pyrad2.metrics``.
         """
         self.listen_address = listen_address
         self.listen_port = listen_port
@@ -141,6 +172,15 @@ class RadSecServer:
         self.require_eap_message_authenticator = require_eap_message_authenticator
         self.enable_coa = enable_coa
         self.enable_disconnect = enable_disconnect
+        self.executor = executor
+        self.worker_handlers = dict(worker_handlers or {})
+        self.metrics = metrics
+        self._worker_policy = offload.RequestPolicy(
+            verify=verify_packet,
+            require_message_authenticator=require_message_authenticator,
+            require_eap_message_authenticator=require_eap_message_authenticator,
+            verifier=verify_request,
+        )
         self.allowed_client_fingerprints = {
             normalize_cert_fingerprint(fingerprint)
             for fingerprint in (allowed_client_fingerprints or [])
@@ -313,16 +353,17 @@ class RadSecServer:
                 logger.debug("Data (hex): {}", data.hex())
 
                 try:
-                    reply = await self.packet_received(
+                    raw = await self._reply_bytes(
                         data, host=peername[0], radius_version=radius_version
                     )
                 except UnknownHost:
                     logger.warning("Drop package from unknown source {}", peername[0])
                     return
 
-                writer.write(reply.reply_packet())
-                await writer.drain()
-                logger.info("Sent reply to {}: {}", peername, reply.code)
+                if raw is not None:
+                    writer.write(raw)
+                    await writer.drain()
+                    logger.info("Sent reply to {}: {}", peername, raw[0])
 
                 packets_processed += 1
                 if (
@@ -340,22 +381,18 @@ class RadSecServer:
 
     def _verify_packet(self, packet: Packet) -> bool:
         """Verify a parsed request packet using its packet-specific verifier."""
-        if isinstance(packet, AuthPacket):
-            return packet.verify_auth_request()
-        if isinstance(packet, AcctPacket):
-            return packet.verify_acct_request()
-        if isinstance(packet, CoAPacket):
-            return packet.verify_coa_request()
-        if isinstance(packet, StatusPacket):
-            return packet.verify_status_request()
-        return packet.verify_packet()
+        return verify_request(packet)
 
     def _validate_message_authenticator_policy(self, packet: Packet) -> None:
         """Validate incoming Message-Authenticator policy for a packet."""
-        packet.validate_message_authenticator_policy(
-            require_message_authenticator=self.require_message_authenticator,
-            require_eap_message_authenticator=self.require_eap_message_authenticator,
-        )
+        try:
+            packet.validate_message_authenticator_policy(
+                require_message_authenticator=self.require_message_authenticator,
+                require_eap_message_authenticator=self.require_eap_message_authenticator,
+            )
+        except PacketError:
+            self._count_drop(DropReason.MESSAGE_AUTHENTICATOR)
+            raise
 
     def _prepare_reply_packet(self, request: Packet, reply: Packet) -> None:
         """Apply outgoing Message-Authenticator policy to a reply packet."""
@@ -380,25 +417,91 @@ class RadSecServer:
         self._add_error_cause(reply, ErrorCause.UnsupportedExtension)
         return reply
 
+    def _lookup_host(self, host: str) -> RemoteHost:
+        """Return the ``RemoteHost`` for ``host`` or raise ``UnknownHost``."""
+        remote_host = self.hosts.get(host) or self.hosts.get("0.0.0.0")
+        if remote_host is None:
+            self._count_drop(DropReason.UNKNOWN_HOST)
+            raise UnknownHost
+        return remote_host
+
+    def _count_drop(self, reason: DropReason) -> None:
+        if self.metrics is not None:
+            self.metrics.drop(reason)
+
+    def _start_request(self, data: bytes, host: str) -> Optional[float]:
+        """Count a request from ``host``; returns its start time with metrics."""
+        if self.metrics is None:
+            return None
+        remote_host = self._lookup_host(host)
+        self.metrics.request("radsec", data[0], remote_host.name)
+        return time.perf_counter()
+
+    async def _reply_bytes(
+        self,
+        data: bytes,
+        host: str,
+        radius_version: RadiusVersion = RadiusVersion.V1_0,
+    ) -> Optional[bytes]:
+        """Answer one request, in ``executor`` if a worker handler covers it.
+
+        The handling time is recorded however the request ends. One the
+        handler or the executor fails on counts as ``WORKER_FAILED``.
+        """
+        started = self._start_request(data, host)
+        handler = self.worker_handlers.get(data[0]) if self.executor else None
+        try:
+            if handler is None:
+                reply = await self.packet_received(
+                    data, host=host, radius_version=radius_version
+                )
+                return reply.reply_packet()
+            remote_host = self._lookup_host(host)
+            policy = self._worker_policy
+            if policy.radius_version != radius_version:
+                policy = replace(policy, radius_version=radius_version)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor,
+                    offload.process_request,
+                    handler,
+                    data,
+                    remote_host.secret,
+                    policy,
+                )
+            except offload.DroppedRequest as err:
+                self._count_drop(err.reason)
+                raise
+            except Exception:
+                self._count_drop(DropReason.WORKER_FAILED)
+                raise
+        finally:
+            if self.metrics is not None and started is not None:
+                self.metrics.handled(data[0], time.perf_counter() - started)
+
     async def packet_received(
         self,
         data: bytes,
         host: str,
         radius_version: RadiusVersion = RadiusVersion.V1_0,
     ) -> Packet:
-        if host in self.hosts:
-            remote_host = self.hosts[host]
-        elif "0.0.0.0" in self.hosts:
-            remote_host = self.hosts["0.0.0.0"]
-        else:
-            raise UnknownHost
+        remote_host = self._lookup_host(host)
 
-        packet = parse_packet(
-            data, remote_host.secret, self.dict, radius_version=radius_version
-        )
+        try:
+            packet = parse_packet(
+                data,
+                remote_host.secret,
+                self.dict,
+                radius_version=radius_version,
+                secret_context=getattr(remote_host, "secret_context", None),
+            )
+        except PacketError:
+            self._count_drop(DropReason.MALFORMED)
+            raise
 
         if self.verify_packet:
             if not self._verify_packet(packet):
+                self._count_drop(DropReason.BAD_AUTHENTICATOR)
                 raise PacketError("Packet verification failed")
 
         self._validate_message_authenticator_policy(packet)
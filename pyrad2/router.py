@@ -5,13 +5,16 @@
 ``__init__`` and delegate per-packet policy to it so the two transports
 can't drift apart:
 
-- host lookup (`lookup_secret`),
+- host lookup (`lookup_host`, `lookup_secret`),
+- admission control and load shedding (`admit`, `shed_reply`),
+- request deadlines (`stamp`, `expired`),
 - secret-aware decode (`parse`),
 - code gating on the listening port (`gate_code`),
 - per-code Request Authenticator verification (`verify_request`),
 - ``Message-Authenticator`` policy (`validate_message_authenticator_policy`
   for incoming, `prepare_reply` and `force_reply_ma` for outgoing), and
-- RFC 5080 dedup helpers (`dedup_*`, `record_reply`).
+- RFC 5080 dedup helpers (`dedup_*`, `record_reply`), and
+- metrics (`count_request`, `count_drop`, `start_timer`, `handled`).
 
 ``ServerType`` lives here too so the sync and async servers can share the
 same enum without one importing the other.
@@ -24,14 +27,23 @@ which both feed packets into the same set of router methods.
 
 from __future__ import annotations
 
+import time
 from enum import Enum
-from typing import Any, Callable, Optional
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Optional
 
 from pyrad2 import dedup
 from pyrad2 import packet as _packet
-from pyrad2.constants import PacketType
+from pyrad2.admission import (
+    UNLIMITED,
+    AdmissionController,
+    AdmissionStats,
+    ShedAction,
+    Ticket,
+)
+from pyrad2.constants import ERROR_CAUSE_ATTRIBUTE, ErrorCause, PacketType
 from pyrad2.dictionary import Dictionary
 from pyrad2.exceptions import ServerPacketError
+from pyrad2.metrics import DropReason, Metrics, Sample, stats_samples
 from pyrad2.packet import (
     AuthPacket,
     Packet,
@@ -39,6 +51,10 @@ from pyrad2.packet import (
     prepare_reply_message_authenticator,
 )
 
+if TYPE_CHECKING:
+    # ``pyrad2.deadline`` keys its settings by ``ServerType`` from here.
+    from pyrad2.deadline import DeadlineStats, Deadlines
+
 
 class ServerType(Enum):
     """Which kind of UDP transport delivered a packet.
@@ -71,6 +87,14 @@ _RESPONSE_CODES = frozenset(
 )
 
 
+# Reply sent for a shed request under ``ShedAction.REJECT``.
+_SHED_REPLY_CODES: dict[int, PacketType] = {
+    PacketType.AccessRequest: PacketType.AccessReject,
+    PacketType.CoARequest: PacketType.CoANAK,
+    PacketType.DisconnectRequest: PacketType.DisconnectNAK,
+}
+
+
 SendBytes = Callable[[bytes], None]
 
 
@@ -80,12 +104,16 @@ class RequestRouter:
     def __init__(
         self,
         *,
-        hosts: dict[str, Any],
+        hosts: Mapping[str, Any],
         dictionary: Optional[Dictionary],
         enable_pkt_verify: bool = True,
         require_message_authenticator: bool = True,
         require_eap_message_authenticator: bool = True,
         dedup_cache: Optional[dedup.ResponseCache] = None,
+        lazy_decode: bool = False,
+        admission: Optional[AdmissionController] = None,
+        deadlines: Optional[Deadlines] = None,
+        metrics: Optional[Metrics] = None,
     ) -> None:
         self.hosts = hosts
         self.dictionary = dictionary
@@ -93,31 +121,145 @@ class RequestRouter:
         self.require_message_authenticator = require_message_authenticator
         self.require_eap_message_authenticator = require_eap_message_authenticator
         self.dedup_cache = dedup_cache
+        self.lazy_decode = lazy_decode
+        self.admission = admission
+        self.deadlines = deadlines
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_collector(self.collect_metrics)
 
     # --- Host lookup ----------------------------------------------------
-    def lookup_secret(self, addr: str) -> bytes:
-        """Return the shared secret for ``addr``.
+    def lookup_host(self, addr: str) -> Any:
+        """Return the ``RemoteHost`` entry for ``addr``.
 
         Raises ``ServerPacketError`` if the source is not in ``hosts``
-        and there's no ``"0.0.0.0"`` wildcard entry. Drops happen here
+        and there's no ``"0.0.0.0"`` wildcard entry. With a
+        ``ClientTable`` the source also matches the longest network
+        prefix containing it. Drops happen here
         before any attribute parsing so unknown peers can't push the
         dictionary decoder.
         """
         host = self.hosts.get(addr) or self.hosts.get("0.0.0.0")
         if host is None:
+            self.count_drop(DropReason.UNKNOWN_HOST)
             raise ServerPacketError("Received packet from unknown host")
-        return host.secret
+        return host
+
+    def lookup_secret(self, addr: str) -> bytes:
+        """Return the shared secret for ``addr`` (see ``lookup_host``)."""
+        return self.lookup_host(addr).secret
+
+    # --- Admission ------------------------------------------------------
+    def admit(self, host: Any, source: str, code: int) -> Optional[Ticket]:
+        """Ask the admission controller to take on a request.
+
+        Returns the request's ``Ticket``, released once the request is
+        answered, or ``None`` if it is to be shed. Without a controller
+        every request is admitted.
+        """
+        if self.admission is None:
+            return UNLIMITED
+        ticket = self.admission.admit(host, source, code)
+        if ticket is None:
+            self.count_drop(DropReason.SHED)
+        return ticket
+
+    def admission_stats(self) -> Optional[AdmissionStats]:
+        """Return the controller's ``stats()``, or ``None`` without one."""
+        if self.admission is None:
+            return None
+        return self.admission.stats()
+
+    def shed_reply(self, data: bytes, host: Any) -> Optional[Packet]:
+        """Return the reply to a shed request, or ``None`` to drop it.
+
+        Only ``ShedAction.REJECT`` replies, and only to codes that have a
+        negative reply. The request is decoded lazily, so none of its
+        attributes are.
+        """
+        if self.admission is None or self.admission.shed_action is ShedAction.DROP:
+            return None
+        code = _SHED_REPLY_CODES.get(data[0])
+        if code is None:
+            return None
+        request = _packet.parse_packet(
+            data,
+            host.secret,
+            self.dictionary,
+            lazy=True,
+            secret_context=getattr(host, "secret_context", None),
+        )
+        reply = request.create_reply()
+        reply.code = code
+        reply[ERROR_CAUSE_ATTRIBUTE] = [
+            int(ErrorCause.ResourcesUnavailable).to_bytes(4, "big")
+        ]
+        self.prepare_reply(request, reply)
+        return reply
+
+    # --- Deadlines ------------------------------------------------------
+    def stamp(self) -> Optional[float]:
+        """Return the receive time to stamp a request with.
+
+        ``None`` without deadlines, so nothing reads the clock then.
+        """
+        if self.deadlines is None:
+            return None
+        return self.deadlines.clock()
+
+    def expired(
+        self,
+        server_type: ServerType,
+        received_at: Optional[float],
+        key: Optional[dedup.DedupKey] = None,
+    ) -> bool:
+        """True if a request waited past its deadline.
+
+        The request's dedup in-flight mark is dropped, so the NAS's
+        retransmission is handled rather than discarded as a duplicate.
+        """
+        if self.deadlines is None or not self.deadlines.expired(
+            server_type, received_at
+        ):
+            return False
+        self.count_drop(DropReason.EXPIRED)
+        self.dedup_drop_in_flight(key)
+        return True
+
+    def deadline_stats(self) -> Optional[dict[ServerType, DeadlineStats]]:
+        """Return the deadlines' ``stats()``, or ``None`` without them."""
+        if self.deadlines is None:
+            return None
+        return self.deadlines.stats()
 
     # --- Parse + verify -------------------------------------------------
-    def parse(self, data: bytes, secret: bytes) -> Packet:
+    def parse(
+        self,
+        data: bytes,
+        secret: bytes,
+        secret_context: Optional[_packet.SecretContext] = None,
+    ) -> Packet:
         """Decode ``data`` into the appropriate typed Packet.
 
         Calls ``pyrad2.packet.parse_packet`` indirectly so test fixtures
-        that monkey-patch the module-level symbol still take effect.
+        that monkey-patch the module-level symbol still take effect. With
+        ``lazy_decode`` the packet only indexes its attributes, so dedup
+        hits and Status-Server never decode AVPs nobody reads.
+        ``secret_context`` is the host's precomputed hash state for
+        ``secret``; the packet and its reply reuse it.
         """
         if not data:
             raise ServerPacketError("Empty packet")
-        return _packet.parse_packet(data, secret, self.dictionary)
+        kwargs: dict[str, Any] = {}
+        if self.lazy_decode:
+            kwargs["lazy"] = True
+        if secret_context is not None:
+            kwargs["secret_context"] = secret_context
+        try:
+            return _packet.parse_packet(data, secret, self.dictionary, **kwargs)
+        except PacketError:
+            self.count_drop(DropReason.MALFORMED)
+            raise
 
     @staticmethod
     def reject_response_codes(code: int) -> None:
@@ -159,24 +301,31 @@ class RequestRouter:
         if not isinstance(pkt, Packet):
             return
         if pkt.code == PacketType.AccessRequest:
-            if not isinstance(pkt, AuthPacket) or not pkt.verify_auth_request():
-                raise PacketError("Packet verification failed")
+            verified = isinstance(pkt, AuthPacket) and pkt.verify_auth_request()
         elif pkt.code in (
             PacketType.AccountingRequest,
             PacketType.CoARequest,
             PacketType.DisconnectRequest,
         ):
-            if not pkt.verify_packet():
-                raise PacketError("Packet verification failed")
+            verified = pkt.verify_packet()
+        else:
+            return
+        if not verified:
+            self.count_drop(DropReason.BAD_AUTHENTICATOR)
+            raise PacketError("Packet verification failed")
 
     def validate_message_authenticator_policy(self, pkt: Any) -> None:
         """Apply BlastRADIUS / EAP / Status-Server MA rules to ``pkt``."""
         if not isinstance(pkt, Packet):
             return
-        pkt.validate_message_authenticator_policy(
-            require_message_authenticator=self.require_message_authenticator,
-            require_eap_message_authenticator=self.require_eap_message_authenticator,
-        )
+        try:
+            pkt.validate_message_authenticator_policy(
+                require_message_authenticator=self.require_message_authenticator,
+                require_eap_message_authenticator=self.require_eap_message_authenticator,
+            )
+        except PacketError:
+            self.count_drop(DropReason.MESSAGE_AUTHENTICATOR)
+            raise
 
     # --- Reply prep -----------------------------------------------------
     def prepare_reply(self, request: Any, reply: Any) -> None:
@@ -218,11 +367,55 @@ class RequestRouter:
             return None
         return dedup.key_for(pkt, source=source)
 
+    def dedup_key_for_datagram(
+        self, data: bytes, source: Optional[tuple] = None
+    ) -> Optional[dedup.DedupKey]:
+        """Return the dedup key for undecoded ``data`` (or ``None``)."""
+        if self.dedup_cache is None:
+            return None
+        return dedup.key_for_datagram(data, source)
+
     def dedup_consult(
-        self, key: Optional[dedup.DedupKey], resend: SendBytes
+        self,
+        key: Optional[dedup.DedupKey],
+        resend: SendBytes,
+        request: Optional[bytes] = None,
     ) -> dedup.DispatchAction:
-        """Returns PROCESS / DROP / RESENT for the cache."""
-        return dedup.consult_cache(self.dedup_cache, key, resend)
+        """Returns PROCESS / DROP / RESENT for the cache.
+
+        ``request`` is the raw request datagram; pass it so the reply
+        cached for ``key`` is only replayed to the same bytes.
+        """
+        action = dedup.consult_cache(self.dedup_cache, key, resend, request)
+        self._count_dedup(action)
+        return action
+
+    def dedup_precheck(
+        self, data: bytes, source: Any, resend: SendBytes
+    ) -> dedup.DispatchAction:
+        """Answer or drop a retransmitted datagram before it is decoded.
+
+        Returns RESENT or DROP as ``dedup_consult`` does; PROCESS marks
+        nothing in flight, the decoded request is consulted as usual.
+        """
+        if self.dedup_cache is None:
+            return dedup.DispatchAction.PROCESS
+        key = dedup.key_for_datagram(data, source)
+        action = dedup.precheck_cache(self.dedup_cache, key, resend, data)
+        self._count_dedup(action)
+        return action
+
+    def dedup_sweep(self) -> int:
+        """Drop expired cache entries; returns how many were removed."""
+        if self.dedup_cache is None:
+            return 0
+        return self.dedup_cache.sweep()
+
+    def dedup_stats(self) -> Optional[dedup.CacheStats]:
+        """Return the cache's ``stats()``, or ``None`` without a cache."""
+        if self.dedup_cache is None:
+            return None
+        return self.dedup_cache.stats()
 
     def dedup_drop_in_flight(self, key: Optional[dedup.DedupKey]) -> None:
         """Remove the in-flight marker for ``key`` (idempotent)."""
@@ -233,9 +426,79 @@ class RequestRouter:
         """Cache ``raw`` if ``reply`` carries a dedup key from its request."""
         dedup.record_if_keyed(self.dedup_cache, reply, raw)
 
+    def dedup_record(self, key: Optional[dedup.DedupKey], raw: bytes) -> None:
+        """Cache ``raw`` as the reply for ``key`` (no-op without a key)."""
+        if key is not None and self.dedup_cache is not None:
+            self.dedup_cache.record_reply(key, raw)
+
     # --- Convenience ----------------------------------------------------
     def attach_dedup_key(self, request: Any, reply: Any) -> None:
         """Carry the request's dedup key forward onto its reply."""
         request_key = getattr(request, "_dedup_key", None)
         if request_key is not None:
             reply._dedup_key = request_key  # type: ignore[attr-defined]
+
+    # --- Metrics --------------------------------------------------------
+    def count_request(self, server_type: ServerType, code: int, host: Any) -> None:
+        """Count a datagram read on ``server_type``'s listener from ``host``."""
+        if self.metrics is not None:
+            self.metrics.request(
+                server_type.name.lower(), code, getattr(host, "name", "")
+            )
+
+    def count_drop(self, reason: DropReason) -> None:
+        """Count a request dropped before its handler ran."""
+        if self.metrics is not None:
+            self.metrics.drop(reason)
+
+    def _count_dedup(self, action: dedup.DispatchAction) -> None:
+        if self.metrics is None or action is dedup.DispatchAction.PROCESS:
+            return
+        if action is dedup.DispatchAction.DROP:
+            self.metrics.drop(DropReason.DUPLICATE)
+        else:
+            self.metrics.drop(DropReason.RESENT)
+
+    def start_timer(self) -> Optional[float]:
+        """Return the time a handler starts, or ``None`` without metrics."""
+        if self.metrics is None:
+            return None
+        return time.perf_counter()
+
+    def handled(self, code: int, started: Optional[float]) -> None:
+        """Record the time since ``start_timer`` as a request's handling time."""
+        if self.metrics is not None and started is not None:
+            self.metrics.handled(code, time.perf_counter() - started)
+
+    def collect_metrics(self) -> list[Sample]:
+        """Return the dedup cache, admission and deadline counters."""
+        samples: list[Sample] = []
+        if self.dedup_cache is not None:
+            samples += stats_samples(
+                "dedup",
+                self.dedup_cache.stats(),
+                counters=(
+                    "hits",
+                    "misses",
+                    "in_flight_drops",
+                    "expired",
+                    "evicted_entries",
+                    "evicted_bytes",
+                    "rejected_oversize",
+                ),
+            )
+        if self.admission is not None:
+            samples += stats_samples(
+                "admission",
+                self.admission.stats(),
+                counters=("admitted", "shed_rate", "shed_in_flight"),
+            )
+        if self.deadlines is not None:
+            for server_type, stats in self.deadlines.stats().items():
+                samples += stats_samples(
+                    "deadline",
+                    stats,
+                    counters=("expired", "wait_total"),
+                    labels=(("listener", server_type.name.lower()),),
+                )
+        return samples
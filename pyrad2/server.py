@@ -4,17 +4,30 @@ if os.name == "nt":
     import selectors
 else:
     import select
+import functools
 import socket
-from dataclasses import dataclass
-from typing import Callable, Optional
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, MutableMapping, Optional
 
 from loguru import logger
 
-from pyrad2 import dedup, host, packet
+from pyrad2 import (
+    admission,
+    batchio,
+    deadline,
+    dedup,
+    host,
+    metrics,
+    packet,
+    scheduler,
+    threadpool,
+)
 from pyrad2.dictionary import Dictionary
 from pyrad2.exceptions import ServerPacketError
 from pyrad2.constants import PacketType
-from pyrad2.router import RequestRouter
+from pyrad2.metrics import DropReason, Sample, stats_samples
+from pyrad2.router import RequestRouter, ServerType
 
 
 @dataclass
@@ -28,6 +41,8 @@ class RemoteHost:
         authport (int): Port used for authentication packets.
         acctport (int): Port used for accounting packets.
         coaport (int): Port used for CoA packets.
+        limits (Limits): Admission limits of this host, in place of the
+            server's per-host default. See ``pyrad2.admission``.
     """
 
     address: str
@@ -36,6 +51,18 @@ class RemoteHost:
     authport: int = 1812
     acctport: int = 1813
     coaport: int = 3799
+    limits: Optional[admission.Limits] = None
+    _secret_context: Optional[packet.SecretContext] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def secret_context(self) -> packet.SecretContext:
+        """Precomputed hash state for ``secret``, shared by this host's packets."""
+        self._secret_context = packet.SecretContext.for_secret(
+            self._secret_context, self.secret
+        )
+        return self._secret_context
 
 
 class Server(host.Host):
@@ -46,7 +73,7 @@ class Server(host.Host):
     in derived classes.
 
     Attributes:
-        hosts (dict): Hosts who are allowed to talk to us. Dictionary of Host class instances.
+        hosts (MutableMapping): Hosts who are allowed to talk to us, by address.
         _poll (select.poll): Poll object for network sockets.
         _fdmap (dict): Map of file descriptors to network sockets.
         MaxPacketSize (int): Maximum size of a RADIUS packet. (class variable)
@@ -60,7 +87,7 @@ class Server(host.Host):
         authport: int = 1812,
         acctport: int = 1813,
         coaport: int = 3799,
-        hosts: Optional[dict] = None,
+        hosts: Optional[MutableMapping[str, RemoteHost]] = None,
         dict: Optional[Dictionary] = None,
         auth_enabled: bool = True,
         acct_enabled: bool = True,
@@ -72,6 +99,18 @@ class Server(host.Host):
         dedup_ttl: float = 30.0,
         dedup_max_entries: int = 4096,
         dedup_cache: Optional[dedup.ResponseCache] = None,
+        dedup_shards: int = 1,
+        dedup_max_bytes: Optional[int] = None,
+        dedup_sweep_interval: float = 1.0,
+        lazy_decode: bool = False,
+        reuse_port: bool = False,
+        io_batch_size: int = 1,
+        admission: Optional[admission.AdmissionController] = None,
+        scheduler: Optional[scheduler.Scheduler] = None,
+        deadlines: Optional[deadline.Deadlines] = None,
+        workers: int = 0,
+        worker_backlog: Optional[int] = None,
+        metrics: Optional[metrics.Metrics] = None,
     ):
         """Initializes a sync server.
 
@@ -80,7 +119,7 @@ class Server(host.Host):
             authport (int): Port to listen on for authentication packets.
             acctport (int): Port to listen on for accounting packets.
             coaport (int): Port to listen on for CoA packets.
-            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances.
+            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances, or a ``pyrad2.clients.ClientTable`` that also matches networks.
             dict (Dictionary): RADIUS dictionary to use.
             auth_enabled (bool): Enable auth server (default: True).
             acct_enabled (bool): Enable accounting server (default: True).
@@ -105,10 +144,64 @@ class Server(host.Host):
                 LRU eviction kicks in.
             dedup_cache (ResponseCache): Provide a pre-built cache to share
                 between servers or to inject a custom clock for tests.
+            dedup_shards (int): Number of independently locked shards the
+                cache is split into (default: 1). ``dedup_max_entries`` is
+                divided between them.
+            dedup_max_bytes (int): Approximate memory budget of the cache,
+                keys and replies included. Least recently used entries
+                are evicted to stay within it (default: no budget).
+            dedup_sweep_interval (float): Seconds between sweeps that
+                drop expired cache entries.
+            lazy_decode (bool): Index request attributes on receipt and
+                decode each one on first access (default: False). Saves
+                work when handlers read only a few attributes.
+            reuse_port (bool): Set ``SO_REUSEPORT`` on the listening
+                sockets so several processes can bind the same ports and
+                let the kernel spread requests between them (default:
+                False). See ``pyrad2.cluster``.
+            io_batch_size (int): On Linux, read up to this many waiting
+                datagrams per ``recvmmsg`` call and send the replies they
+                produce with one ``sendmmsg`` (default: 1, one syscall per
+                datagram). Ignored where ``pyrad2.batchio`` is
+                unavailable.
+            admission (AdmissionController): Rate and in-flight limits,
+                per NAS and overall. Requests over a limit are shed
+                before they are decoded. See ``pyrad2.admission``.
+            scheduler (Scheduler): Queue decoded requests and handle them
+                in weighted-fair order across auth, accounting and CoA.
+                Each poll round reads up to a class's weight in datagrams
+                from each ready socket. See ``pyrad2.scheduler``.
+            deadlines (Deadlines): How long a request of each class may
+                wait in the scheduler queue or for a handler thread.
+                Requests that waited longer are skipped, as their NAS has
+                retransmitted by then. See ``pyrad2.deadline``.
+            workers (int): Handle requests on this many threads instead
+                of in the poll loop (default: 0, in the poll loop). The
+                poll thread then only reads datagrams, answers
+                retransmissions and applies admission control. See
+                ``pyrad2.threadpool``.
+            worker_backlog (int): Requests that may wait for a handler
+                thread before new ones are dropped (default: four per
+                thread). With a ``scheduler``, its ``max_queue`` applies
+                instead.
+            metrics (Metrics): Registry to record requests, drops and
+                handler latency in. See ``pyrad2.metrics``.
         """
         super().__init__(authport, acctport, coaport, dict)
+        self.reuse_port = reuse_port
+        self.io_batch_size = io_batch_size
+        self.scheduler = scheduler
+        self._pool = (
+            threadpool.HandlerPool(workers, worker_backlog, scheduler)
+            if workers
+            else None
+        )
+        self._batch: Optional[batchio.MessageBatch] = None
+        # While a batch is being handled: its socket and the replies
+        # queued for the closing ``sendmmsg``.
+        self._batch_replies: Optional[tuple[socket.socket, list]] = None
 
-        self.hosts = hosts or {}
+        self.hosts = {} if hosts is None else hosts
         self.auth_enabled = auth_enabled
         self.authfds: list[socket.socket] = []
         self.acct_enabled = acct_enabled
@@ -122,10 +215,15 @@ class Server(host.Host):
             self._dedup_cache: Optional[dedup.ResponseCache] = dedup_cache
         elif dedup_enabled:
             self._dedup_cache = dedup.ResponseCache(
-                ttl=dedup_ttl, max_entries=dedup_max_entries
+                ttl=dedup_ttl,
+                max_entries=dedup_max_entries,
+                shards=dedup_shards,
+                max_bytes=dedup_max_bytes,
             )
         else:
             self._dedup_cache = None
+        self.dedup_sweep_interval = dedup_sweep_interval
+        self._next_sweep = 0.0
 
         # Shared transport-neutral dispatch helper. The async server owns
         # its own RequestRouter instance with the same fields, so the
@@ -137,7 +235,13 @@ class Server(host.Host):
             require_message_authenticator=self.require_message_authenticator,
             require_eap_message_authenticator=self.require_eap_message_authenticator,
             dedup_cache=self._dedup_cache,
+            lazy_decode=lazy_decode,
+            admission=admission,
+            deadlines=deadlines,
+            metrics=metrics,
         )
+        if metrics is not None:
+            metrics.add_collector(self._collect_metrics)
 
         if addresses:
             for addr in addresses:
@@ -201,22 +305,22 @@ class Server(host.Host):
         addr_family = self._get_addr_info(addr)
         for family, address in addr_family:
             if self.auth_enabled:
-                authfd = socket.socket(family, socket.SOCK_DGRAM)
-                authfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                authfd.bind((address, self.authport))
-                self.authfds.append(authfd)
-
+                self.authfds.append(self._bind_socket(family, address, self.authport))
             if self.acct_enabled:
-                acctfd = socket.socket(family, socket.SOCK_DGRAM)
-                acctfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                acctfd.bind((address, self.acctport))
-                self.acctfds.append(acctfd)
-
+                self.acctfds.append(self._bind_socket(family, address, self.acctport))
             if self.coa_enabled:
-                coafd = socket.socket(family, socket.SOCK_DGRAM)
-                coafd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                coafd.bind((address, self.coaport))
-                self.coafds.append(coafd)
+                self.coafds.append(self._bind_socket(family, address, self.coaport))
+
+    def _bind_socket(
+        self, family: socket.AddressFamily, address: str | int, port: int
+    ) -> socket.socket:
+        """Create a UDP socket bound to ``(address, port)``."""
+        fd = socket.socket(family, socket.SOCK_DGRAM)
+        fd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            fd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        fd.bind((address, port))
+        return fd
 
     def handle_auth_packet(self, pkt: packet.Packet):
         """Authentication packet handler.
@@ -267,22 +371,22 @@ class Server(host.Host):
         request's socket and skips the handler entirely. On an in-flight
         duplicate, drops silently. Otherwise runs the handler and lets
         ``send_reply_packet`` populate the cache.
+
+        A request claimed when it was read already carries its key and
+        its in-flight mark, which whoever claimed it drops.
         """
+        if getattr(pkt, "_dedup_key", None) is not None:
+            handler(pkt)
+            return
         key = self._router.dedup_key_for(pkt)
         fd = getattr(pkt, "fd", None)
 
         def _resend(raw: bytes) -> None:
             if fd is not None:
-                fd.sendto(raw, pkt.source)
+                self._sendto(fd, raw, pkt.source)
 
-        action = self._router.dedup_consult(key, _resend)
-        if action is dedup.DispatchAction.DROP:
-            logger.debug("Dropping duplicate in-flight request from {}", pkt.source)
-            return
-        if action is dedup.DispatchAction.RESENT:
-            logger.debug(
-                "Resent cached reply for duplicate request from {}", pkt.source
-            )
+        action = self._router.dedup_consult(key, _resend, dedup.raw_request(pkt))
+        if not self._log_dedup_action(action, pkt.source):
             return
 
         if key is not None:
@@ -292,6 +396,17 @@ class Server(host.Host):
         finally:
             self._router.dedup_drop_in_flight(key)
 
+    @staticmethod
+    def _log_dedup_action(action: dedup.DispatchAction, source: Any) -> bool:
+        """Log a dedup hit; True if the request should be handled."""
+        if action is dedup.DispatchAction.DROP:
+            logger.debug("Dropping duplicate in-flight request from {}", source)
+            return False
+        if action is dedup.DispatchAction.RESENT:
+            logger.debug("Resent cached reply for duplicate request from {}", source)
+            return False
+        return True
+
     def _lookup_secret(self, addr: str) -> bytes:
         """Return the shared secret for ``addr`` or raise ``ServerPacketError``."""
         return self._router.lookup_secret(addr)
@@ -370,7 +485,9 @@ class Server(host.Host):
         else:
             raise ServerPacketError("Received non-coa packet on coa port")
 
-    def _grab_packet(self, fd: socket.socket) -> packet.Packet:
+    def _grab_packet(
+        self, fd: socket.socket, server_type: Optional[ServerType] = None
+    ) -> Optional[packet.Packet]:
         """Read a packet from a network connection.
         This method assumes there is data waiting to be read.
 
@@ -379,22 +496,155 @@ class Server(host.Host):
         the packet with the host's real shared secret (which lets
         ``verify_*_request`` MD5 checks pass without a re-parse).
 
+        Retransmissions of a request already answered or in progress are
+        handled from the raw header here, before decoding; for those this
+        returns ``None``.
+
         Args:
             fd (socket.socket): Socket to read packet from
+            server_type (ServerType): Listener ``fd`` belongs to, for
+                metrics.
 
         Returns:
-            packet.Packet: RADIUS packet
+            packet.Packet: RADIUS packet, or ``None`` for a retransmission
         """
         (data, source) = fd.recvfrom(self.MAX_PACKET_SIZE)
-        secret = self._router.lookup_secret(source[0])
-        pkt = self._router.parse(data, secret)
+        return self._packet_from_datagram(fd, data, source, server_type)
+
+    def _packet_from_datagram(
+        self,
+        fd: socket.socket,
+        data: bytes,
+        source: Any,
+        server_type: Optional[ServerType] = None,
+        claim: bool = False,
+    ) -> Optional[packet.Packet]:
+        """Decode a datagram received on ``fd`` from ``source``.
+
+        Returns ``None`` if the dedup cache resent or dropped it. See
+        ``_admit_datagram`` for ``claim``; the mark is dropped if the
+        datagram fails to decode.
+        """
+        admitted = self._admit_datagram(fd, data, source, server_type, claim)
+        if admitted is None:
+            return None
+        try:
+            return self._decode_datagram(fd, data, source, *admitted)
+        except BaseException:
+            self._router.dedup_drop_in_flight(admitted[3])
+            raise
+
+    def _admit_datagram(
+        self,
+        fd: socket.socket,
+        data: bytes,
+        source: Any,
+        server_type: Optional[ServerType] = None,
+        claim: bool = False,
+    ) -> Optional[
+        tuple[Any, admission.Ticket, Optional[float], Optional[dedup.DedupKey]]
+    ]:
+        """Look up the sender of a datagram and admit it, undecoded.
+
+        Returns the ``RemoteHost``, the admission ticket, the receive
+        time and the dedup key, or ``None`` if the dedup cache resent or
+        dropped the datagram or it was shed. Datagrams on a
+        ``server_type`` listener are counted as requests.
+
+        With ``claim`` the request is marked in flight, in the same step
+        as the dedup check, so retransmissions that arrive while it is
+        queued are dropped; the caller must drop the mark once it is
+        done with the request. Otherwise the key is ``None`` and the
+        decoded request is checked again before its handler runs.
+        """
+        received_at = self._router.stamp()
+        remote_host = self._router.lookup_host(source[0])
+        if server_type is not None and data:
+            self._router.count_request(server_type, data[0], remote_host)
+
+        def _resend(raw: bytes) -> None:
+            self._sendto(fd, raw, source)
+
+        key = None
+        if claim:
+            key = self._router.dedup_key_for_datagram(data, source)
+            action = self._router.dedup_consult(key, _resend, data)
+        else:
+            action = self._router.dedup_precheck(data, source, _resend)
+        if not self._log_dedup_action(action, source):
+            return None
+        ticket = (
+            self._router.admit(remote_host, source[0], data[0])
+            if data
+            else admission.UNLIMITED
+        )
+        if ticket is None:
+            self._router.dedup_drop_in_flight(key)
+            self._shed_request(fd, data, remote_host, source)
+            return None
+        return remote_host, ticket, received_at, key
+
+    def _decode_datagram(
+        self,
+        fd: socket.socket,
+        data: bytes,
+        source: Any,
+        remote_host: Any,
+        ticket: admission.Ticket,
+        received_at: Optional[float],
+        key: Optional[dedup.DedupKey] = None,
+    ) -> packet.Packet:
+        """Decode an admitted datagram; the ticket is released on error.
+
+        ``key`` is the dedup key the request was claimed under, if any.
+        """
+        try:
+            pkt = self._router.parse(
+                data,
+                remote_host.secret,
+                getattr(remote_host, "secret_context", None),
+            )
+        except BaseException:
+            ticket.release()
+            raise
+        # Released by ``_dispatch`` once the handler returns.
+        pkt._admission = ticket
+        pkt._received_at = received_at
         pkt.source = source
         # Stash the originating fd on the packet so ``send_reply_packet``
         # and the dedup-cache resend path can route the reply back over
         # the same socket without re-discovering it.
         pkt.fd = fd  # type: ignore[attr-defined]
+        if key is not None:
+            pkt._dedup_key = key  # type: ignore[attr-defined]
         return pkt
 
+    def _dispatch(
+        self, pkt: packet.Packet, handler: Callable[[packet.Packet], None]
+    ) -> None:
+        """Run ``handler`` on ``pkt``, then release its admission ticket."""
+        started = self._router.start_timer()
+        try:
+            handler(pkt)
+        finally:
+            if started is not None:
+                self._router.handled(pkt.code, started)
+            pkt._admission.release()
+
+    def _shed_request(
+        self, fd: socket.socket, data: bytes, remote_host: Any, source: Any
+    ) -> None:
+        """Drop or reject a request the admission controller turned away."""
+        logger.debug("Over admission limits; shedding request from {}", source)
+        reply = self._router.shed_reply(data, remote_host)
+        if reply is not None:
+            reply.source = source
+            self.send_reply_packet(fd, reply)
+
+    def admission_stats(self) -> Optional[admission.AdmissionStats]:
+        """Return the admission controller's counters, if one is set."""
+        return self._router.admission_stats()
+
     def _prepare_sockets(self) -> None:
         """Prepare all sockets to receive packets."""
         for fd in self.authfds + self.acctfds + self.coafds:
@@ -437,9 +687,40 @@ class Server(host.Host):
         # retransmission gets a byte-identical answer (which matters for
         # the EAP State attribute and the Message-Authenticator).
         raw = pkt.reply_packet()
-        fd.sendto(raw, pkt.source)  # type: ignore[call-overload]
+        self._sendto(fd, raw, pkt.source)
         self._router.record_reply(pkt, raw)
 
+    def _sendto(self, fd: socket.socket, raw: bytes, addr: Any) -> None:
+        """Send ``raw``, or queue it for the current batch's ``sendmmsg``."""
+        if self._batch_replies is not None and self._batch_replies[0] is fd:
+            self._batch_replies[1].append((raw, addr))
+        else:
+            fd.sendto(raw, addr)
+
+    def dedup_stats(self) -> Optional[dedup.CacheStats]:
+        """Return the dedup cache's usage and counters, if it is enabled."""
+        return self._router.dedup_stats()
+
+    def _poll_timeout(self) -> Optional[int]:
+        """Milliseconds ``poll`` may block before the next cache sweep.
+
+        Zero while the scheduler holds requests, which are handled
+        between polls.
+        """
+        if self._pool is None and self.scheduler is not None and len(self.scheduler):
+            return 0
+        if self._dedup_cache is None:
+            return None
+        return int(self.dedup_sweep_interval * 1000)
+
+    def _sweep_dedup_cache(self) -> None:
+        """Drop expired dedup entries once per ``dedup_sweep_interval``."""
+        now = time.monotonic()
+        if self._dedup_cache is None or now < self._next_sweep:
+            return
+        self._next_sweep = now + self.dedup_sweep_interval
+        self._router.dedup_sweep()
+
     def _process_input(self, fd: socket.socket) -> None:
         """Process available data.
         If this packet should be dropped instead of processed a
@@ -454,16 +735,245 @@ class Server(host.Host):
             fd (socket.socket): Socket to read the packet from
         """
         if self.auth_enabled and fd.fileno() in self._realauthfds:
-            pkt = self._grab_packet(fd)
-            self._handle_auth_packet(pkt)
+            handler = self._handle_auth_packet
+            server_type = ServerType.Auth
         elif self.acct_enabled and fd.fileno() in self._realacctfds:
-            pkt = self._grab_packet(fd)
-            self._handle_acct_packet(pkt)
+            handler = self._handle_acct_packet
+            server_type = ServerType.Acct
         elif self.coa_enabled:
-            pkt = self._grab_packet(fd)
-            self._handle_coa_packet(pkt)
+            handler = self._handle_coa_packet
+            server_type = ServerType.Coa
         else:
             raise ServerPacketError("Received packet for unknown handler")
+        if self._pool is not None:
+            self._submit_input(fd, handler, server_type)
+        elif self.scheduler is not None:
+            self._queue_input(fd, handler, server_type)
+        elif self._batch is None:
+            pkt = self._grab_packet(fd, server_type)
+            if pkt is not None:
+                self._dispatch(pkt, handler)
+        else:
+            self._process_batch(fd, self._batch, handler, server_type)
+
+    def _queue_input(
+        self,
+        fd: socket.socket,
+        handler: Callable[[packet.Packet], None],
+        server_type: ServerType,
+    ) -> None:
+        """Read waiting datagrams from ``fd`` into the scheduler.
+
+        Reads one ``recvmmsg`` batch, or up to the class's weight in
+        datagrams, so busier classes don't crowd the others out of the
+        queues. Requests are marked in flight before they are queued.
+        Status-Server is answered straight away.
+        """
+        assert self.scheduler is not None
+        if self._batch is not None:
+            datagrams = self._batch.recv(fd)
+        else:
+            datagrams = self._recv_upto(fd, self.scheduler.weight(server_type))
+        for data, source in datagrams:
+            try:
+                pkt = self._packet_from_datagram(
+                    fd, data, source, server_type, claim=True
+                )
+                if pkt is None:
+                    continue
+                if pkt.code == PacketType.StatusServer:
+                    self._dispatch(pkt, handler)
+                elif not self.scheduler.push(
+                    server_type, source[0], (pkt, handler, server_type)
+                ):
+                    pkt._admission.release()
+                    self._router.dedup_drop_in_flight(getattr(pkt, "_dedup_key", None))
+                    self._router.count_drop(DropReason.QUEUE_FULL)
+                    logger.warning(
+                        "{} queue full; dropping request from {}",
+                        server_type.name,
+                        source,
+                    )
+            except ServerPacketError as err:
+                logger.info("Dropping packet: " + str(err))
+            except packet.PacketError as err:
+                logger.info("Received a broken packet: " + str(err))
+
+    def _submit_input(
+        self,
+        fd: socket.socket,
+        handler: Callable[[packet.Packet], None],
+        server_type: ServerType,
+    ) -> None:
+        """Read waiting datagrams from ``fd`` and queue them for the pool.
+
+        Requests are marked in flight before they are queued; decoding
+        is left to the handler threads. Status-Server is answered
+        straight away.
+        """
+        assert self._pool is not None
+        if self._batch is not None:
+            datagrams = self._batch.recv(fd)
+        else:
+            datagrams = [fd.recvfrom(self.MAX_PACKET_SIZE)]
+        for data, source in datagrams:
+            try:
+                admitted = self._admit_datagram(
+                    fd, data, source, server_type, claim=True
+                )
+                if admitted is None:
+                    continue
+                if data[:1] == bytes([PacketType.StatusServer]):
+                    pkt = self._decode_datagram(fd, data, source, *admitted)
+                    self._dispatch(pkt, handler)
+                    continue
+                job = functools.partial(
+                    self._run_job, fd, data, source, admitted, handler, server_type
+                )
+                if not self._pool.submit(server_type, source[0], job):
+                    admitted[1].release()
+                    self._router.dedup_drop_in_flight(admitted[3])
+                    self._router.count_drop(DropReason.QUEUE_FULL)
+                    logger.warning(
+                        "Handler threads busy; dropping request from {}", source
+                    )
+            except ServerPacketError as err:
+                logger.info("Dropping packet: " + str(err))
+            except packet.PacketError as err:
+                logger.info("Received a broken packet: " + str(err))
+
+    def _run_job(
+        self,
+        fd: socket.socket,
+        data: bytes,
+        source: Any,
+        admitted: tuple[
+            Any, admission.Ticket, Optional[float], Optional[dedup.DedupKey]
+        ],
+        handler: Callable[[packet.Packet], None],
+        server_type: ServerType,
+    ) -> None:
+        """Decode and handle a datagram on a handler thread.
+
+        The request's in-flight mark is dropped once it is handled,
+        rejected or expired.
+        """
+        remote_host, ticket, received_at, key = admitted
+        try:
+            if self._router.expired(server_type, received_at):
+                ticket.release()
+                logger.debug("Request from {} expired while queued", source)
+                return
+            pkt = self._decode_datagram(
+                fd, data, source, remote_host, ticket, received_at, key
+            )
+            self._dispatch(pkt, handler)
+        except ServerPacketError as err:
+            logger.info("Dropping packet: " + str(err))
+        except packet.PacketError as err:
+            logger.info("Received a broken packet: " + str(err))
+        finally:
+            self._router.dedup_drop_in_flight(key)
+
+    def _recv_upto(self, fd: socket.socket, limit: int) -> list[tuple[bytes, Any]]:
+        """Read one datagram, then up to ``limit - 1`` more without blocking."""
+        datagrams = [fd.recvfrom(self.MAX_PACKET_SIZE)]
+        flags = getattr(socket, "MSG_DONTWAIT", 0)
+        if flags:
+            for _ in range(limit - 1):
+                try:
+                    datagrams.append(fd.recvfrom(self.MAX_PACKET_SIZE, flags))
+                except BlockingIOError:
+                    break
+        return datagrams
+
+    def _run_queued(self) -> None:
+        """Handle up to ``batch_size`` queued requests in scheduler order.
+
+        Each request's in-flight mark is dropped once it is handled,
+        rejected or expired.
+        """
+        if self.scheduler is None or self._pool is not None:
+            return
+        for _ in range(self.scheduler.batch_size):
+            item = self.scheduler.pop()
+            if item is None:
+                return
+            pkt, handler, server_type = item
+            key = getattr(pkt, "_dedup_key", None)
+            received_at = pkt._received_at
+            if self._router.expired(server_type, received_at, key):
+                pkt._admission.release()
+                logger.debug("Request from {} expired while queued", pkt.source)
+                continue
+            try:
+                self._dispatch(pkt, handler)
+            except ServerPacketError as err:
+                logger.info("Dropping packet: " + str(err))
+            except packet.PacketError as err:
+                logger.info("Received a broken packet: " + str(err))
+            finally:
+                self._router.dedup_drop_in_flight(key)
+
+    def deadline_stats(self) -> Optional[dict[ServerType, deadline.DeadlineStats]]:
+        """Return expired-request counts per class, if deadlines are set."""
+        return self._router.deadline_stats()
+
+    def worker_stats(self) -> Optional[threadpool.PoolStats]:
+        """Return the handler threads' counters, if ``workers`` is set."""
+        if self._pool is None:
+            return None
+        return self._pool.stats()
+
+    def scheduler_stats(self) -> Optional[dict[ServerType, scheduler.QueueStats]]:
+        """Return queue depth and wait time per class, if scheduling."""
+        if self.scheduler is None:
+            return None
+        return self.scheduler.stats()
+
+    def _collect_metrics(self) -> list[Sample]:
+        """Return the scheduler and handler-thread counters."""
+        samples: list[Sample] = []
+        for server_type, stats in (self.scheduler_stats() or {}).items():
+            samples += stats_samples(
+                "queue",
+                stats,
+                counters=("queued", "dispatched", "dropped", "wait_total"),
+                labels=(("listener", server_type.name.lower()),),
+            )
+        pool = self.worker_stats()
+        if pool is not None:
+            samples += stats_samples("workers", pool, counters=("completed", "dropped"))
+        return samples
+
+    def _process_batch(
+        self,
+        fd: socket.socket,
+        batch: batchio.MessageBatch,
+        handler: Callable[[packet.Packet], None],
+        server_type: Optional[ServerType] = None,
+    ) -> None:
+        """Handle every datagram one ``recvmmsg`` returns, then send the
+        replies with one ``sendmmsg``.
+
+        Each datagram gets the error handling the main loop gives a
+        single packet, so one bad packet doesn't cost the rest.
+        """
+        replies: list = []
+        self._batch_replies = (fd, replies)
+        try:
+            for data, source in batch.recv(fd):
+                try:
+                    pkt = self._packet_from_datagram(fd, data, source, server_type)
+                    if pkt is not None:
+                        self._dispatch(pkt, handler)
+                except ServerPacketError as err:
+                    logger.info("Dropping packet: " + str(err))
+                except packet.PacketError as err:
+                    logger.info("Received a broken packet: " + str(err))
+        finally:
+            self._batch_replies = None
+            batch.send_all(fd, replies)
 
     def run(self) -> None:
         """Main loop.
@@ -477,10 +987,17 @@ class Server(host.Host):
             self._poll = select.poll()
         self._fdmap: dict[int, socket.socket] = {}
         self._prepare_sockets()
+        if self.io_batch_size > 1 and batchio.AVAILABLE:
+            self._batch = batchio.MessageBatch(self.io_batch_size, self.MAX_PACKET_SIZE)
+        if self._pool is not None:
+            self._pool.start()
 
         while True:
             if os.name == "nt":
-                for key, mask in self._sel.select(timeout=1):
+                timeout = self._poll_timeout()
+                for key, mask in self._sel.select(
+                    timeout=1 if timeout is None else min(timeout / 1000, 1)
+                ):
                     if mask & selectors.EVENT_READ:
                         try:
                             fdo = self._fdmap[key.fd]
@@ -492,7 +1009,7 @@ class Server(host.Host):
                     else:
                         logger.error("Unexpected event in server main loop")
             else:
-                for fd, event in self._poll.poll():
+                for fd, event in self._poll.poll(self._poll_timeout()):
                     if event == select.POLLIN:
                         try:
                             fdo = self._fdmap[fd]
@@ -503,3 +1020,5 @@ class Server(host.Host):
                             logger.info("Received a broken packet: " + str(err))
                     else:
                         logger.error("Unexpected event in server main loop")
+            self._run_queued()
+            self._sweep_dedup_cache()
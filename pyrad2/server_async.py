@@ -1,14 +1,17 @@
 import asyncio
+import inspect
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
 from datetime import datetime, timezone
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, MutableMapping, Optional
 
 from loguru import logger
 
-from pyrad2 import dedup
-from pyrad2.constants import ErrorCause, PacketType
+from pyrad2 import admission, batchio, deadline, dedup, metrics, offload, scheduler
+from pyrad2.constants import ERROR_CAUSE_ATTRIBUTE, ErrorCause, PacketType
 from pyrad2.dictionary import Dictionary
-from pyrad2.packet import Packet, StatusPacket
+from pyrad2.metrics import DropReason, Sample, stats_samples
+from pyrad2.packet import Packet, SecretContext, StatusPacket
 from pyrad2.router import RequestRouter, ServerType
 from pyrad2.server import RemoteHost, ServerPacketError
 
@@ -17,7 +20,11 @@ from pyrad2.server import RemoteHost, ServerPacketError
 __all__ = ["DatagramProtocolServer", "RemoteHost", "ServerAsync", "ServerType"]
 
 
-ERROR_CAUSE_ATTRIBUTE = 101
+# Handler signature shared by sync and ``async def`` handlers. Sync
+# handlers return ``None``; coroutine handlers may return the reply.
+RequestHandler = Callable[
+    ["DatagramProtocolServer", Packet, tuple[str | Any, int]], Any
+]
 
 
 class DatagramProtocolServer(asyncio.DatagramProtocol):
@@ -27,9 +34,15 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
         port: int,
         server: "ServerAsync",
         server_type: ServerType,
-        hosts: dict[str, RemoteHost],
+        hosts: MutableMapping[str, RemoteHost],
         request_callback: Callable,
+        max_concurrent_handlers: int = 64,
+        max_pending_handlers: int = 1024,
     ):
+        if max_concurrent_handlers < 1:
+            raise ValueError("max_concurrent_handlers must be at least 1")
+        if max_pending_handlers < 0:
+            raise ValueError("max_pending_handlers must not be negative")
         self.ip = ip
         self.port = port
         self.server = server
@@ -37,6 +50,14 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
         self.server_type = server_type
         self.request_callback = request_callback
         self.transport: asyncio.DatagramTransport
+        # Coroutine handlers run as tasks; at most ``max_concurrent_handlers``
+        # of them hold a slot, the rest wait for one. Once the running and
+        # waiting tasks together reach the backlog limit, new requests are
+        # dropped and the NAS's retransmission retries them.
+        self.max_concurrent_handlers = max_concurrent_handlers
+        self.max_pending_handlers = max_pending_handlers
+        self.handler_slots = asyncio.Semaphore(max_concurrent_handlers)
+        self.handler_tasks: set[asyncio.Task] = set()
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         self.transport = transport  # type: ignore
@@ -58,10 +79,20 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
         self.server._router.record_reply(reply, raw)
 
     def _handle_status_server(
-        self, data: bytes, secret: bytes, addr: tuple[str | Any, int]
+        self,
+        data: bytes,
+        secret: bytes,
+        addr: tuple[str | Any, int],
+        secret_context: Optional[SecretContext] = None,
     ) -> None:
         """Reply to Status-Server without invoking normal request callbacks."""
-        req = StatusPacket(secret=secret, dict=self.server.dict, packet=data)
+        req = StatusPacket(
+            secret=secret,
+            secret_context=secret_context,
+            dict=self.server.dict,
+            packet=data,
+            lazy=self.server._router.lazy_decode,
+        )
         self.server._router.validate_message_authenticator_policy(req)
         reply = self.server.create_status_response(req, self.server_type)
         logger.debug(
@@ -79,6 +110,7 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
         )
         receive_date = datetime.now(timezone.utc)
         router = self.server._router
+        received_at = router.stamp()
 
         # The protocol's own ``hosts`` mapping is authoritative for lookup
         # (it can be a per-listener subset of the server's hosts). The
@@ -86,11 +118,13 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
         # we resolved here.
         remote_host = self.hosts.get(addr[0]) or self.hosts.get("0.0.0.0")
         if not remote_host:
+            router.count_drop(DropReason.UNKNOWN_HOST)
             logger.warning(
                 "[{}:{}] Drop packet from unknown source {}", self.ip, self.port, addr
             )
             return
         secret = remote_host.secret
+        secret_context = getattr(remote_host, "secret_context", None)
 
         try:
             logger.debug(
@@ -103,20 +137,42 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
             if len(data) < 1:
                 raise ServerPacketError("Packet too short to contain a code byte")
             code = data[0]
+            router.count_request(self.server_type, code, remote_host)
             router.reject_response_codes(code)
 
             # Status-Server has its own reply path: validate MA and
             # synthesize the reply without invoking the user handler.
             if code == PacketType.StatusServer:
                 router.gate_code(code, self.server_type)
-                self._handle_status_server(data, secret, addr)
+                self._handle_status_server(data, secret, addr, secret_context)
                 return
 
             router.gate_code(code, self.server_type)
-            req = router.parse(data, secret)
-            router.verify_request(req)
-            router.validate_message_authenticator_policy(req)
-            self.request_callback(self, req, addr)
+            # Retransmissions are answered from the raw header, before
+            # any decode or MD5/HMAC work.
+            if not self.server._dedup_precheck(self, data, addr):
+                return
+            # Load is shed before decode; the request holds its ticket
+            # until answered, or until the task it was handed to ends.
+            ticket = router.admit(remote_host, addr[0], code)
+            if ticket is None:
+                self.server._shed_request(self, data, remote_host, addr)
+                return
+            try:
+                worker_handler = self.server.worker_handler_for(code)
+                if worker_handler is not None:
+                    self.server._offload_request(
+                        self, data, secret, addr, worker_handler, ticket, received_at
+                    )
+                    return
+                req = router.parse(data, secret, secret_context)
+                router.verify_request(req)
+                router.validate_message_authenticator_policy(req)
+                req._admission = ticket
+                req._received_at = received_at
+                self.request_callback(self, req, addr)
+            finally:
+                ticket.release()
         except Exception as exc:
             if self.server.debug:
                 logger.exception(
@@ -144,7 +200,25 @@ class DatagramProtocolServer(asyncio.DatagramProtocol):
     def error_received(self, exc: Exception) -> None:
         logger.error("[{}:{}] Error received: {}", self.ip, self.port, exc)
 
+    def backlog_full(self) -> bool:
+        """True once running plus waiting handler tasks reach the limit."""
+        return len(self.handler_tasks) >= (
+            self.max_concurrent_handlers + self.max_pending_handlers
+        )
+
+    def spawn_handler(self, coro: Any) -> asyncio.Task:
+        """Run ``coro`` as a handler task tracked by this listener."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self.handler_tasks.add(task)
+        task.add_done_callback(self.handler_tasks.discard)
+        return task
+
     async def close_transport(self):
+        tasks = list(self.handler_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
         if self.transport:
             logger.debug("[{}:{}] Close transport...", self.ip, self.port)
             self.transport.close()
@@ -168,7 +242,7 @@ class ServerAsync(ABC):
         auth_port: int = 1812,
         acct_port: int = 1813,
         coa_port: int = 3799,
-        hosts: Optional[Dict[str, RemoteHost]] = None,
+        hosts: Optional[MutableMapping[str, RemoteHost]] = None,
         dictionary: Optional[Dictionary] = None,
         enable_pkt_verify: bool = True,
         debug: bool = False,
@@ -178,6 +252,19 @@ class ServerAsync(ABC):
         dedup_ttl: float = 30.0,
         dedup_max_entries: int = 4096,
         dedup_cache: Optional[dedup.ResponseCache] = None,
+        dedup_shards: int = 1,
+        dedup_max_bytes: Optional[int] = None,
+        dedup_sweep_interval: float = 1.0,
+        lazy_decode: bool = False,
+        max_concurrent_handlers: int = 64,
+        max_pending_handlers: int = 1024,
+        executor: Optional[Executor] = None,
+        worker_handlers: Optional[Dict[int, offload.WorkerHandler]] = None,
+        io_batch_size: int = 1,
+        admission: Optional[admission.AdmissionController] = None,
+        scheduler: Optional[scheduler.Scheduler] = None,
+        deadlines: Optional[deadline.Deadlines] = None,
+        metrics: Optional[metrics.Metrics] = None,
     ):
         """Initialize an async server.
 
@@ -185,7 +272,7 @@ class ServerAsync(ABC):
             auth_port (int): Port to listen on for authentication packets.
             acct_port (int): Port to listen on for accounting packets.
             coa_port (int): Port to listen on for Dynamic Authorization packets.
-            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances.
+            hosts (dict[str, RemoteHost]): Hosts who we can talk to. A dictionary mapping IP to RemoteHost class instances, or a ``pyrad2.clients.ClientTable`` that also matches networks.
             dictionary (Dictionary): RADIUS dictionary to use.
             enable_pkt_verify (bool): If true, the packet will be verified
                 against its secret (default: True).
@@ -202,8 +289,51 @@ class ServerAsync(ABC):
                 LRU eviction kicks in.
             dedup_cache (ResponseCache): Provide a pre-built cache to share
                 between servers or to inject a custom clock for tests.
+            dedup_shards (int): Number of independently locked shards the
+                cache is split into (default: 1). ``dedup_max_entries`` is
+                divided between them.
+            dedup_max_bytes (int): Approximate memory budget of the cache,
+                keys and replies included. Least recently used entries
+                are evicted to stay within it (default: no budget).
+            dedup_sweep_interval (float): Seconds between sweeps that
+                drop expired cache entries, run while
+                transports are open.
+            lazy_decode (bool): Index request attributes on receipt and
+                decode each one on first access (default: False). Saves
+                work when handlers read only a few attributes.
+            max_concurrent_handlers (int): Per listener, the number of
+                ``async def`` handler calls allowed to run at once.
+            max_pending_handlers (int): Per listener, the number of
+                further requests allowed to wait for a handler slot.
+                Requests beyond that are dropped and left to the NAS to
+                retransmit.
+            executor (Executor): Pool that runs ``worker_handlers``,
+                normally from ``offload.create_executor``.
+            worker_handlers (dict[int, WorkerHandler]): Module-level
+                functions, by request code, to run in ``executor``
+                instead of the handler methods. Each receives the decoded
+                request and returns the reply packet or ``None``; see
+                ``pyrad2.offload``. Worker handlers share the
+                ``max_concurrent_handlers`` slots.
+            io_batch_size (int): On Linux, read up to this many datagrams
+                per ``recvmmsg`` call and flush the replies of each loop
+                iteration with one ``sendmmsg`` (default: 1, the loop's
+                own transport). See ``pyrad2.batchio``.
+            admission (AdmissionController): Rate and in-flight limits,
+                per NAS and overall. Requests over a limit are shed
+                before they are decoded. See ``pyrad2.admission``.
+            scheduler (Scheduler): Queue decoded requests and hand them
+                to the handlers in weighted-fair order across auth,
+                accounting and CoA, instead of in arrival order. See
+                ``pyrad2.scheduler``.
+            deadlines (Deadlines): How long a request of each class may
+                wait for its handler. Requests that waited longer are
+                skipped, as their NAS has retransmitted by then. See
+                ``pyrad2.deadline``.
+            metrics (Metrics): Registry to record requests, drops and
+                handler latency in. See ``pyrad2.metrics``.
         """
-        self.hosts = hosts or {}
+        self.hosts = {} if hosts is None else hosts
         self.dict = dictionary
         self.enable_pkt_verify = enable_pkt_verify
         self.debug = debug
@@ -213,14 +343,32 @@ class ServerAsync(ABC):
             self._dedup_cache: Optional[dedup.ResponseCache] = dedup_cache
         elif dedup_enabled:
             self._dedup_cache = dedup.ResponseCache(
-                ttl=dedup_ttl, max_entries=dedup_max_entries
+                ttl=dedup_ttl,
+                max_entries=dedup_max_entries,
+                shards=dedup_shards,
+                max_bytes=dedup_max_bytes,
             )
         else:
             self._dedup_cache = None
+        self.dedup_sweep_interval = dedup_sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
 
         self.auth_port = auth_port
         self.acct_port = acct_port
         self.coa_port = coa_port
+        self.max_concurrent_handlers = max_concurrent_handlers
+        self.max_pending_handlers = max_pending_handlers
+        self.executor = executor
+        self.worker_handlers = dict(worker_handlers or {})
+        self.io_batch_size = io_batch_size
+        self.scheduler = scheduler
+        self._drain_pending = False
+        self._worker_policy = offload.RequestPolicy(
+            verify=enable_pkt_verify,
+            require_message_authenticator=require_message_authenticator,
+            require_eap_message_authenticator=require_eap_message_authenticator,
+            lazy_decode=lazy_decode,
+        )
 
         self.auth_protocols: list[asyncio.Protocol] = []
         self.acct_protocols: list[asyncio.Protocol] = []
@@ -236,7 +384,13 @@ class ServerAsync(ABC):
             require_message_authenticator=self.require_message_authenticator,
             require_eap_message_authenticator=self.require_eap_message_authenticator,
             dedup_cache=self._dedup_cache,
+            lazy_decode=lazy_decode,
+            admission=admission,
+            deadlines=deadlines,
+            metrics=metrics,
         )
+        if metrics is not None:
+            metrics.add_collector(self._collect_metrics)
 
     def validate_message_authenticator_policy(self, req: Packet) -> None:
         """Validate incoming Message-Authenticator policy for a request."""
@@ -264,7 +418,7 @@ class ServerAsync(ABC):
 
     def _select_handler(
         self, protocol: "DatagramProtocolServer", req: Packet
-    ) -> Callable[["DatagramProtocolServer", Packet, tuple[str | Any, int]], None]:
+    ) -> RequestHandler:
         """Map (server_type, packet code) to the user-overridable handler."""
         if protocol.server_type == ServerType.Acct:
             return self.handle_acct_packet
@@ -299,17 +453,211 @@ class ServerAsync(ABC):
         protocol: "DatagramProtocolServer",
         req: Packet,
         addr: tuple[str | Any, int],
-        handler: Callable[
-            ["DatagramProtocolServer", Packet, tuple[str | Any, int]], None
-        ],
+        handler: RequestHandler,
     ) -> None:
-        """Wrap ``handler(protocol, req, addr)`` with RFC 5080 dedup."""
+        """Wrap ``handler(protocol, req, addr)`` with RFC 5080 dedup.
+
+        Coroutine handlers are scheduled rather than awaited here; the
+        request stays marked in flight until their task finishes, so
+        retransmissions that arrive meanwhile are still dropped.
+        """
         key = self._router.dedup_key_for(req, source=addr)
+        if not self._dedup_admit(protocol, key, addr, dedup.raw_request(req)):
+            return
+
+        if key is not None:
+            req._dedup_key = key  # type: ignore[attr-defined]
+        if self.scheduler is not None:
+            self._schedule(protocol, req, addr, handler, key)
+            return
+        self._run_handler(protocol, req, addr, handler, key)
+
+    def _run_handler(
+        self,
+        protocol: "DatagramProtocolServer",
+        req: Packet,
+        addr: tuple[str | Any, int],
+        handler: RequestHandler,
+        key: Optional[dedup.DedupKey],
+    ) -> None:
+        """Call ``handler``, or start its task if it is a coroutine."""
+        if self._expired(protocol, req._received_at, addr, key):
+            return
+        if inspect.iscoroutinefunction(handler):
+            if not self._backlog_admit(protocol, key, addr):
+                return
+            ticket = req._admission
+            ticket.retain()
+            protocol.spawn_handler(
+                self._run_async_handler(protocol, req, addr, handler, key, ticket)
+            )
+            return
+        started = self._router.start_timer()
+        try:
+            handler(protocol, req, addr)
+        finally:
+            if started is not None:
+                self._router.handled(req.code, started)
+            self._router.dedup_drop_in_flight(key)
+
+    def _schedule(
+        self,
+        protocol: "DatagramProtocolServer",
+        req: Packet,
+        addr: tuple[str | Any, int],
+        handler: RequestHandler,
+        key: Optional[dedup.DedupKey],
+    ) -> None:
+        """Queue a request for ``_drain_queue``; it stays marked in flight."""
+        assert self.scheduler is not None
+        item = (protocol, req, addr, handler, key)
+        if not self.scheduler.push(protocol.server_type, addr[0], item):
+            self._router.dedup_drop_in_flight(key)
+            self._router.count_drop(DropReason.QUEUE_FULL)
+            logger.warning(
+                "[{}:{}] {} queue full; dropping request from {}",
+                protocol.ip,
+                protocol.port,
+                protocol.server_type.name,
+                addr,
+            )
+            return
+        req._admission.retain()
+        if not self._drain_pending:
+            self._drain_pending = True
+            asyncio.get_running_loop().call_soon(self._drain_queue)
+
+    def _drain_queue(self) -> None:
+        """Dispatch up to ``batch_size`` queued requests in scheduler order.
+
+        Reschedules itself while requests remain, so the loop reads the
+        sockets between batches and new Access-Requests can overtake
+        queued accounting.
+        """
+        assert self.scheduler is not None
+        for _ in range(self.scheduler.batch_size):
+            item = self.scheduler.pop()
+            if item is None:
+                break
+            protocol, req, addr, handler, key = item
+            try:
+                self._run_handler(protocol, req, addr, handler, key)
+            except Exception as exc:
+                msg = "[{}:{}] Unexpected error: {}".format(
+                    protocol.ip, protocol.port, exc
+                )
+                if self.debug:
+                    logger.exception(msg)
+                else:
+                    logger.error(msg)
+            finally:
+                req._admission.release()
+        if len(self.scheduler):
+            asyncio.get_running_loop().call_soon(self._drain_queue)
+        else:
+            self._drain_pending = False
+
+    def _expired(
+        self,
+        protocol: "DatagramProtocolServer",
+        received_at: Optional[float],
+        addr: tuple[str | Any, int],
+        key: Optional[dedup.DedupKey],
+    ) -> bool:
+        """True if the request waited past its deadline and is skipped."""
+        if not self._router.expired(protocol.server_type, received_at, key):
+            return False
+        logger.debug(
+            "[{}:{}] Request from {} expired while queued; skipping handler",
+            protocol.ip,
+            protocol.port,
+            addr,
+        )
+        return True
+
+    def deadline_stats(self) -> Optional[dict[ServerType, deadline.DeadlineStats]]:
+        """Return expired-request counts per class, if deadlines are set."""
+        return self._router.deadline_stats()
+
+    def scheduler_stats(self) -> Optional[dict[ServerType, scheduler.QueueStats]]:
+        """Return queue depth and wait time per class, if scheduling."""
+        if self.scheduler is None:
+            return None
+        return self.scheduler.stats()
+
+    def _collect_metrics(self) -> list[Sample]:
+        """Return the scheduler's counters, per class."""
+        samples: list[Sample] = []
+        for server_type, stats in (self.scheduler_stats() or {}).items():
+            samples += stats_samples(
+                "queue",
+                stats,
+                counters=("queued", "dispatched", "dropped", "wait_total"),
+                labels=(("listener", server_type.name.lower()),),
+            )
+        return samples
+
+    def _shed_request(
+        self,
+        protocol: "DatagramProtocolServer",
+        data: bytes,
+        remote_host: RemoteHost,
+        addr: tuple[str | Any, int],
+    ) -> None:
+        """Drop or reject a request the admission controller turned away."""
+        logger.debug(
+            "[{}:{}] Over admission limits; shedding request from {}",
+            protocol.ip,
+            protocol.port,
+            addr,
+        )
+        reply = self._router.shed_reply(data, remote_host)
+        if reply is not None:
+            protocol.send_response(reply, addr)
+
+    def admission_stats(self) -> Optional[admission.AdmissionStats]:
+        """Return the admission controller's counters, if one is set."""
+        return self._router.admission_stats()
+
+    def _dedup_precheck(
+        self,
+        protocol: "DatagramProtocolServer",
+        data: bytes,
+        addr: tuple[str | Any, int],
+    ) -> bool:
+        """Check the undecoded datagram against the dedup cache.
+
+        False if it was a retransmission, now resent or dropped.
+        """
 
         def _resend(raw: bytes) -> None:
             protocol.transport.sendto(raw, addr)
 
-        action = self._router.dedup_consult(key, _resend)
+        action = self._router.dedup_precheck(data, addr, _resend)
+        return self._log_dedup_action(protocol, action, addr)
+
+    def _dedup_admit(
+        self,
+        protocol: "DatagramProtocolServer",
+        key: Optional[dedup.DedupKey],
+        addr: tuple[str | Any, int],
+        request: Optional[bytes] = None,
+    ) -> bool:
+        """Consult the dedup cache; True if the request should be handled."""
+
+        def _resend(raw: bytes) -> None:
+            protocol.transport.sendto(raw, addr)
+
+        action = self._router.dedup_consult(key, _resend, request)
+        return self._log_dedup_action(protocol, action, addr)
+
+    def _log_dedup_action(
+        self,
+        protocol: "DatagramProtocolServer",
+        action: dedup.DispatchAction,
+        addr: tuple[str | Any, int],
+    ) -> bool:
+        """Log a dedup hit; True if the request should be handled."""
         if action is dedup.DispatchAction.DROP:
             logger.debug(
                 "[{}:{}] Dropping duplicate in-flight request from {}",
@@ -317,7 +665,7 @@ class ServerAsync(ABC):
                 protocol.port,
                 addr,
             )
-            return
+            return False
         if action is dedup.DispatchAction.RESENT:
             logger.debug(
                 "[{}:{}] Resent cached reply for duplicate request from {}",
@@ -325,14 +673,145 @@ class ServerAsync(ABC):
                 protocol.port,
                 addr,
             )
+            return False
+        return True
+
+    def _backlog_admit(
+        self,
+        protocol: "DatagramProtocolServer",
+        key: Optional[dedup.DedupKey],
+        addr: tuple[str | Any, int],
+    ) -> bool:
+        """Check room for another handler task; False drops the request."""
+        if not protocol.backlog_full():
+            return True
+        self._router.dedup_drop_in_flight(key)
+        self._router.count_drop(DropReason.QUEUE_FULL)
+        logger.warning(
+            "[{}:{}] Handler backlog full; dropping request from {}",
+            protocol.ip,
+            protocol.port,
+            addr,
+        )
+        return False
+
+    def worker_handler_for(self, code: int) -> Optional[offload.WorkerHandler]:
+        """Return the worker handler for ``code`` if it runs off the loop."""
+        if self.executor is None:
+            return None
+        return self.worker_handlers.get(code)
+
+    def _offload_request(
+        self,
+        protocol: "DatagramProtocolServer",
+        data: bytes,
+        secret: bytes,
+        addr: tuple[str | Any, int],
+        handler: offload.WorkerHandler,
+        ticket: admission.Ticket = admission.UNLIMITED,
+        received_at: Optional[float] = None,
+    ) -> None:
+        """Hand an undecoded request to the executor, with RFC 5080 dedup.
+
+        The dedup key comes from the raw header, so retransmissions are
+        answered or dropped here without the request being decoded.
+        """
+        key = self._router.dedup_key_for_datagram(data, source=addr)
+        if not self._dedup_admit(protocol, key, addr, data):
+            return
+        if not self._backlog_admit(protocol, key, addr):
             return
+        ticket.retain()
+        protocol.spawn_handler(
+            self._run_worker_handler(
+                protocol, data, secret, addr, handler, key, ticket, received_at
+            )
+        )
 
-        if key is not None:
-            req._dedup_key = key  # type: ignore[attr-defined]
+    async def _run_worker_handler(
+        self,
+        protocol: "DatagramProtocolServer",
+        data: bytes,
+        secret: bytes,
+        addr: tuple[str | Any, int],
+        handler: offload.WorkerHandler,
+        key: Optional[dedup.DedupKey],
+        ticket: admission.Ticket = admission.UNLIMITED,
+        received_at: Optional[float] = None,
+    ) -> None:
+        """Run a worker handler in the executor and send the reply bytes.
+
+        A request the worker rejects is counted under its reason; one the
+        handler or the executor fails on counts as ``WORKER_FAILED``.
+        """
+        loop = asyncio.get_running_loop()
         try:
-            handler(protocol, req, addr)
+            async with protocol.handler_slots:
+                if self._expired(protocol, received_at, addr, key):
+                    return
+                started = self._router.start_timer()
+                try:
+                    raw = await loop.run_in_executor(
+                        self.executor,
+                        offload.process_request,
+                        handler,
+                        data,
+                        secret,
+                        self._worker_policy,
+                    )
+                except offload.DroppedRequest as err:
+                    self._router.count_drop(err.reason)
+                    raise
+                except Exception:
+                    self._router.count_drop(DropReason.WORKER_FAILED)
+                    raise
+                finally:
+                    self._router.handled(data[0], started)
+            if raw is not None:
+                protocol.transport.sendto(raw, addr)
+                self._router.dedup_record(key, raw)
+        except Exception as exc:
+            msg = "[{}:{}] Error for packet from {}: {}".format(
+                protocol.ip, protocol.port, addr, exc
+            )
+            if self.debug:
+                logger.exception(msg)
+            else:
+                logger.error(msg)
         finally:
             self._router.dedup_drop_in_flight(key)
+            ticket.release()
+
+    async def _run_async_handler(
+        self,
+        protocol: "DatagramProtocolServer",
+        req: Packet,
+        addr: tuple[str | Any, int],
+        handler: RequestHandler,
+        key: Optional[dedup.DedupKey],
+        ticket: admission.Ticket = admission.UNLIMITED,
+    ) -> None:
+        """Run a coroutine handler in a listener slot and send its reply."""
+        try:
+            async with protocol.handler_slots:
+                received_at = req._received_at
+                if self._expired(protocol, received_at, addr, key):
+                    return
+                started = self._router.start_timer()
+                reply = await handler(protocol, req, addr)
+                self._router.handled(req.code, started)
+            if reply is not None:
+                self._router.attach_dedup_key(req, reply)
+                protocol.send_response(reply, addr)
+        except Exception as exc:
+            msg = "[{}:{}] Unexpected error: {}".format(protocol.ip, protocol.port, exc)
+            if self.debug:
+                logger.exception(msg)
+            else:
+                logger.error(msg)
+        finally:
+            self._router.dedup_drop_in_flight(key)
+            ticket.release()
 
     async def initialize_transports(
         self,
@@ -369,6 +848,18 @@ class ServerAsync(ABC):
                 )
 
         await asyncio.gather(*tasks)
+        if self._dedup_cache is not None and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_dedup_cache())
+
+    def dedup_stats(self) -> Optional[dedup.CacheStats]:
+        """Return the dedup cache's usage and counters, if it is enabled."""
+        return self._router.dedup_stats()
+
+    async def _sweep_dedup_cache(self) -> None:
+        """Drop expired dedup entries every ``dedup_sweep_interval``."""
+        while True:
+            await asyncio.sleep(self.dedup_sweep_interval)
+            self._router.dedup_sweep()
 
     async def _start_transport(
         self, ip: str, port: int, server_type: ServerType, proto_list: list
@@ -376,14 +867,32 @@ class ServerAsync(ABC):
         if any(proto.ip == ip for proto in proto_list):
             return
         protocol = DatagramProtocolServer(
-            ip, port, self, server_type, self.hosts, self._request_handler
+            ip,
+            port,
+            self,
+            server_type,
+            self.hosts,
+            self._request_handler,
+            max_concurrent_handlers=self.max_concurrent_handlers,
+            max_pending_handlers=self.max_pending_handlers,
         )
-        await asyncio.get_running_loop().create_datagram_endpoint(
-            lambda: protocol, local_addr=(ip, port), reuse_port=True
+        await batchio.create_datagram_endpoint(
+            protocol,
+            local_addr=(ip, port),
+            reuse_port=True,
+            batch_size=self.io_batch_size,
         )
         proto_list.append(protocol)
 
     async def deinitialize_transports(self):
+        if self.scheduler is not None:
+            for _, req, _, _, key in self.scheduler.drain():
+                self._router.dedup_drop_in_flight(key)
+                req._admission.release()
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
         for proto_list in (
             self.auth_protocols,
             self.acct_protocols,
@@ -420,6 +929,10 @@ class ServerAsync(ABC):
         authentication packet has been received. It can be overriden in
         derived classes to add custom behaviour.
 
+        Overrides may be ``async def``. They then run as tasks, and a
+        returned reply packet is sent, and cached for retransmissions,
+        on the handler's behalf.
+
         Args:
             protocol (DatagramProtocolServer): The protocol to use when sending responses
             pkt (packet.Packet): Packet to process.
@@ -436,6 +949,10 @@ class ServerAsync(ABC):
         accounting packet has been received. It can be overriden in
         derived classes to add custom behaviour.
 
+        Overrides may be ``async def``. They then run as tasks, and a
+        returned reply packet is sent, and cached for retransmissions,
+        on the handler's behalf.
+
         Args:
             protocol (DatagramProtocolServer): The protocol to use when sending responses
             pkt (packet.Packet): Packet to process.
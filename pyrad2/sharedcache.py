@@ -0,0 +1,590 @@
+"""RFC 5080 response caches shared between processes.
+
+``ResponseCache`` lives in process memory. A restart forgets every
+reply, and with ``SO_REUSEPORT`` workers (see ``pyrad2.cluster``) a
+retransmission that lands on another worker after a restart or
+rebalance finds an empty cache. Either way the handler runs twice:
+accounting is counted twice and EAP rounds re-run.
+
+Both caches here keep their entries outside the Python heap, in a
+fixed-size hash table of slots. They are ``ResponseCache`` subclasses,
+so they plug into the ``dedup_cache=`` argument of ``Server``,
+``ServerAsync`` and ``RequestRouter``:
+
+- ``MappedResponseCache`` maps a file. A restarted server, or a sibling
+  mapping the same path, answers retransmissions from it at once::
+
+      cache = MappedResponseCache("/var/lib/radius/dedup.cache")
+      server = MyServer(dictionary=dictionary, dedup_cache=cache)
+
+- ``SharedMemoryResponseCache`` lives in ``multiprocessing.shared_memory``
+  and also shares the in-flight marks, so all workers on a host see one
+  dedup state. Create it before forking the workers::
+
+      cache = SharedMemoryResponseCache()
+
+      def make_server(index):
+          return serve(MyServer(dedup_cache=cache), enable_auth=True)
+
+      Supervisor(make_server).run()
+
+Each key hashes to a bucket of ``ways`` slots. A new entry takes the
+bucket's slot for the same key, else a free or expired one, else the one
+closest to expiry. Writers lock the bucket. Readers take no lock: every
+slot has a sequence counter, odd while a write is in progress, plus a
+CRC, and a read that races a write counts as a miss.
+"""
+
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import replace
+from multiprocessing import shared_memory
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from loguru import logger
+
+from pyrad2 import dedup
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+_MAGIC = b"PYRAD2DC"
+_VERSION = 2
+# magic, version, ways, slots, slot size
+_HEADER = struct.Struct("<8sHHII")
+_HEADER_SIZE = 64
+# seq, crc32, expires_at, key length, flags, reply length, digest
+_SLOT = struct.Struct("<IIdBBH16s")
+_SEQ = struct.Struct("<I")
+_KEY_AREA = 64
+
+# Slot flags.
+_HAS_DIGEST = 1
+_IN_FLIGHT = 2
+
+DEFAULT_SLOT_SIZE = 4608
+
+
+class _SlotTable:
+    """Hash table of cache slots over a writable buffer.
+
+    ``lock(bucket)`` is a context manager that excludes other writers of
+    ``bucket``, in this process and any other one using the buffer.
+    """
+
+    def __init__(
+        self,
+        buf: memoryview,
+        slots: int,
+        slot_size: int,
+        ways: int,
+        lock: Callable[[int], ContextManager[Any]],
+    ) -> None:
+        self.buf = buf
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.buckets = slots // ways
+        self.max_reply = slot_size - _SLOT.size - _KEY_AREA
+        self.lock = lock
+
+    @staticmethod
+    def size_for(slots: int, slot_size: int) -> int:
+        return _HEADER_SIZE + slots * slot_size
+
+    def format(self) -> None:
+        """Write the header and empty every slot."""
+        self.buf[: _HEADER.size] = _HEADER.pack(
+            _MAGIC, _VERSION, self.ways, self.slots, self.slot_size
+        )
+        self.clear()
+
+    def matches_header(self) -> bool:
+        header = _HEADER.unpack_from(self.buf, 0)
+        return header == (_MAGIC, _VERSION, self.ways, self.slots, self.slot_size)
+
+    def bucket_of(self, packed: bytes) -> int:
+        # Stable across processes, unlike ``hash()``.
+        return zlib.crc32(packed) % self.buckets
+
+    def _offsets(self, bucket: int) -> range:
+        start = _HEADER_SIZE + bucket * self.ways * self.slot_size
+        return range(start, start + self.ways * self.slot_size, self.slot_size)
+
+    @staticmethod
+    def _checksum(header: bytes, packed: bytes, raw: bytes) -> int:
+        # Everything after the seq and crc fields.
+        return zlib.crc32(raw, zlib.crc32(packed, zlib.crc32(header[8:])))
+
+    def get(
+        self, packed: bytes, now: float
+    ) -> Optional[tuple[bytes, Optional[bytes], bool]]:
+        """Return ``(reply, digest, in_flight)`` for a live, intact slot."""
+        buf = self.buf
+        for off in self._offsets(self.bucket_of(packed)):
+            seq, crc, expires_at, key_len, flags, raw_len, digest = _SLOT.unpack_from(
+                buf, off
+            )
+            if expires_at <= now or key_len != len(packed):
+                continue
+            key_off = off + _SLOT.size
+            if buf[key_off : key_off + key_len] != packed:
+                continue
+            if seq & 1:
+                return None  # Being written.
+            raw_off = key_off + _KEY_AREA
+            raw = bytes(buf[raw_off : raw_off + raw_len])
+            header = bytes(buf[off:key_off])
+            if (
+                _SEQ.unpack_from(buf, off)[0] != seq
+                or self._checksum(header, packed, raw) != crc
+            ):
+                return None  # Torn by a concurrent write.
+            return (
+                raw,
+                digest if flags & _HAS_DIGEST else None,
+                bool(flags & _IN_FLIGHT),
+            )
+        return None
+
+    def _write(
+        self,
+        off: int,
+        packed: bytes,
+        raw: bytes,
+        digest: Optional[bytes],
+        expires_at: float,
+        flags: int,
+    ) -> None:
+        """Rewrite the slot at ``off``; caller holds its bucket's lock."""
+        buf = self.buf
+        seq = _SEQ.unpack_from(buf, off)[0]
+        _SEQ.pack_into(buf, off, (seq + 1) & 0xFFFFFFFF)
+        key_off = off + _SLOT.size
+        buf[key_off : key_off + len(packed)] = packed
+        raw_off = key_off + _KEY_AREA
+        buf[raw_off : raw_off + len(raw)] = raw
+        if digest is not None:
+            flags |= _HAS_DIGEST
+        fields = (expires_at, len(packed), flags, len(raw), digest or b"")
+        crc = self._checksum(_SLOT.pack(0, 0, *fields), packed, raw)
+        _SLOT.pack_into(buf, off, (seq + 1) & 0xFFFFFFFF, crc, *fields)
+        _SEQ.pack_into(buf, off, (seq + 2) & 0xFFFFFFFF)
+
+    def _empty(self, off: int) -> None:
+        self._write(off, b"", b"", None, 0.0, 0)
+
+    def _find(self, bucket: int, packed: bytes) -> tuple[int, float, bool]:
+        """Pick the slot for ``packed``: ``(offset, expires_at, same_key)``."""
+        buf = self.buf
+        victim, victim_expiry = -1, float("inf")
+        for off in self._offsets(bucket):
+            _, _, expires_at, key_len, _, _, _ = _SLOT.unpack_from(buf, off)
+            key_off = off + _SLOT.size
+            if key_len == len(packed) and buf[key_off : key_off + key_len] == packed:
+                return off, expires_at, True
+            if expires_at < victim_expiry:
+                victim, victim_expiry = off, expires_at
+        return victim, victim_expiry, False
+
+    def put(
+        self,
+        packed: bytes,
+        raw: bytes,
+        digest: Optional[bytes],
+        expires_at: float,
+        now: float,
+    ) -> bool:
+        """Store a reply; True if a live entry of another key was evicted."""
+        bucket = self.bucket_of(packed)
+        with self.lock(bucket):
+            off, victim_expiry, same_key = self._find(bucket, packed)
+            self._write(off, packed, raw, digest, expires_at, 0)
+        return not same_key and victim_expiry > now
+
+    def claim(
+        self, packed: bytes, digest: Optional[bytes], expires_at: float, now: float
+    ) -> tuple[Optional[tuple[bytes, Optional[bytes], bool]], bool]:
+        """Mark ``packed`` in flight unless it already has a live slot.
+
+        The check and the mark are made under the bucket lock, so of two
+        processes claiming a key only one writes the mark. A reply cached
+        for a request with another ``digest`` (the NAS reused the
+        Identifier) is replaced by the mark. Returns the live slot as
+        ``get`` does, or ``None`` if the mark was written, and whether a
+        live entry of another key was evicted for it.
+        """
+        bucket = self.bucket_of(packed)
+        with self.lock(bucket):
+            found = self.get(packed, now)
+            if found is not None and (
+                found[2] or digest is None or found[1] in (None, digest)
+            ):
+                return found, False
+            off, victim_expiry, same_key = self._find(bucket, packed)
+            self._write(off, packed, b"", digest, expires_at, _IN_FLIGHT)
+        return None, not same_key and victim_expiry > now
+
+    def drop_in_flight(self, packed: bytes) -> None:
+        """Empty the slot of ``packed`` if it holds an in-flight mark."""
+        bucket = self.bucket_of(packed)
+        with self.lock(bucket):
+            off, _, same_key = self._find(bucket, packed)
+            if same_key and _SLOT.unpack_from(self.buf, off)[4] & _IN_FLIGHT:
+                self._empty(off)
+
+    def expire(self, now: float) -> int:
+        """Empty every expired slot; returns how many were emptied."""
+        removed = 0
+        buf = self.buf
+        for bucket in range(self.buckets):
+            for off in self._offsets(bucket):
+                if 0 < _SLOT.unpack_from(buf, off)[2] <= now:
+                    with self.lock(bucket):
+                        if 0 < _SLOT.unpack_from(buf, off)[2] <= now:
+                            self._empty(off)
+                            removed += 1
+        return removed
+
+    def count(self, now: float) -> tuple[int, int]:
+        """Return the number of live ``(replies, in-flight marks)``."""
+        replies = in_flight = 0
+        for bucket in range(self.buckets):
+            for off in self._offsets(bucket):
+                _, _, expires_at, _, flags, _, _ = _SLOT.unpack_from(self.buf, off)
+                if expires_at > now:
+                    if flags & _IN_FLIGHT:
+                        in_flight += 1
+                    else:
+                        replies += 1
+        return replies, in_flight
+
+    def clear(self) -> None:
+        for bucket in range(self.buckets):
+            with self.lock(bucket):
+                for off in self._offsets(bucket):
+                    self._empty(off)
+
+
+class _SlotResponseCache(dedup.ResponseCache):
+    """``ResponseCache`` whose entries live in a ``_SlotTable``.
+
+    With ``shared_in_flight`` the in-flight marks are table slots too,
+    visible to every process; they lapse after ``in_flight_ttl`` so a
+    worker that dies mid-request doesn't block its key. Otherwise they
+    stay in this process's memory.
+    """
+
+    _table: _SlotTable
+
+    def __init__(
+        self,
+        ttl: float,
+        slots: int,
+        slot_size: int,
+        ways: int,
+        clock: Callable[[], float],
+        shared_in_flight: bool,
+        in_flight_ttl: float,
+    ) -> None:
+        if ways <= 0 or slots <= 0 or slots % ways:
+            raise ValueError("slots must be a positive multiple of ways")
+        if slot_size <= _SLOT.size + _KEY_AREA:
+            raise ValueError("slot_size is too small")
+        super().__init__(ttl=ttl, max_entries=slots, clock=clock)
+        self.shared_in_flight = shared_in_flight
+        self.in_flight_ttl = in_flight_ttl
+        self._hits = 0
+        self._misses = 0
+        self._drops = 0
+        self._evicted = 0
+        self._expired = 0
+        self._rejected = 0
+
+    def lookup(self, key: dedup.DedupKey, request: Optional[bytes] = None):
+        entry = self._lookup_table(dedup.pack_key(key), request)
+        if entry is not None or self.shared_in_flight:
+            return entry
+        return super().lookup(key, request)
+
+    def lookup_or_mark(self, key: dedup.DedupKey, request: Optional[bytes] = None):
+        if self.shared_in_flight:
+            return self._slot_entry(self._claim(key, request), request)
+        packed = dedup.pack_key(key)
+        # ``record_reply`` swaps the mark for the reply under this lock.
+        with self._shard(packed).lock:
+            entry = self._lookup_table(packed, request)
+            if entry is None:
+                entry = super().lookup_or_mark(key, request)
+            return entry
+
+    def _lookup_table(self, packed: bytes, request: Optional[bytes]):
+        """Return the table's reply or in-flight mark for ``packed``."""
+        return self._slot_entry(self._table.get(packed, self._clock()), request)
+
+    def _slot_entry(
+        self,
+        found: Optional[tuple[bytes, Optional[bytes], bool]],
+        request: Optional[bytes],
+    ):
+        """Map a slot from the table to what ``lookup`` returns."""
+        if found is None:
+            return None
+        raw, digest, in_flight = found
+        if in_flight:
+            self._drops += 1
+            return dedup.IN_FLIGHT
+        if request is None or digest is None or digest == dedup.request_digest(request):
+            self._hits += 1
+            return raw
+        return None
+
+    def mark_in_flight(
+        self, key: dedup.DedupKey, request: Optional[bytes] = None
+    ) -> None:
+        if not self.shared_in_flight:
+            super().mark_in_flight(key, request)
+            return
+        self._claim(key, request)
+
+    def _claim(
+        self, key: dedup.DedupKey, request: Optional[bytes]
+    ) -> Optional[tuple[bytes, Optional[bytes], bool]]:
+        """Mark ``key`` in flight in the table unless it has a live slot.
+
+        Returns that slot, or ``None`` if the key is now marked (or too
+        long for the table, and so handled unmarked).
+        """
+        packed = dedup.pack_key(key)
+        if len(packed) > _KEY_AREA:
+            self._misses += 1
+            return None
+        digest = dedup.request_digest(request) if request is not None else None
+        now = self._clock()
+        found, evicted = self._table.claim(
+            packed, digest, now + self.in_flight_ttl, now
+        )
+        if found is None:
+            self._misses += 1
+        if evicted:
+            self._evicted += 1
+        return found
+
+    def drop_in_flight(self, key: dedup.DedupKey) -> None:
+        if not self.shared_in_flight:
+            super().drop_in_flight(key)
+            return
+        packed = dedup.pack_key(key)
+        if len(packed) <= _KEY_AREA:
+            self._table.drop_in_flight(packed)
+
+    def record_reply(
+        self, key: dedup.DedupKey, raw: bytes, ttl: Optional[float] = None
+    ) -> None:
+        if not isinstance(raw, (bytes, bytearray)):
+            raise TypeError("raw must be bytes")
+        packed = dedup.pack_key(key)
+        with self._shard(packed).lock:
+            self._record(key, packed, bytes(raw), ttl)
+
+    def _record(
+        self, key: dedup.DedupKey, packed: bytes, raw: bytes, ttl: Optional[float]
+    ) -> None:
+        now = self._clock()
+        digest = None
+        if self.shared_in_flight:
+            found = self._table.get(packed, now) if len(packed) <= _KEY_AREA else None
+            if found is not None and found[2]:
+                digest = found[1]
+        else:
+            digest = self._shard(packed).in_flight.pop(packed, None)
+        if len(packed) > _KEY_AREA or len(raw) > self._table.max_reply:
+            self._rejected += 1
+            self.drop_in_flight(key)
+            return
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        if self._table.put(packed, raw, digest, expires_at, now):
+            self._evicted += 1
+
+    def sweep(self) -> int:
+        removed = self._table.expire(self._clock())
+        self._expired += removed
+        return removed
+
+    def stats(self) -> dedup.CacheStats:
+        """Return usage of the shared table and this process's counters."""
+        base = super().stats()
+        replies, in_flight = self._table.count(self._clock())
+        return replace(
+            base,
+            entries=replies,
+            bytes_used=replies * self._table.slot_size,
+            in_flight=in_flight if self.shared_in_flight else base.in_flight,
+            hits=self._hits,
+            misses=base.misses + self._misses,
+            in_flight_drops=base.in_flight_drops + self._drops,
+            expired=self._expired,
+            evicted_entries=self._evicted,
+            rejected_oversize=self._rejected,
+        )
+
+    def clear(self) -> None:
+        super().clear()
+        self._table.clear()
+
+    def __len__(self) -> int:
+        return self._table.count(self._clock())[0]
+
+
+class MappedResponseCache(_SlotResponseCache):
+    """``ResponseCache`` whose replies live in a memory-mapped file."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 30.0,
+        slots: int = 4096,
+        slot_size: int = DEFAULT_SLOT_SIZE,
+        ways: int = 8,
+        clock: Callable[[], float] = time.time,
+        shared_in_flight: bool = False,
+        in_flight_ttl: float = 10.0,
+    ) -> None:
+        """Map ``path``, creating or re-formatting it as needed.
+
+        An existing file with the same geometry is reused, entries and
+        all. A file with another geometry is wiped, so every process
+        sharing a file must pass the same ``slots``, ``slot_size`` and
+        ``ways``.
+
+        Args:
+            path (str): Cache file. Processes that share it share entries.
+            ttl (float): Lifetime in seconds of a cached reply.
+            slots (int): Number of entries the file holds; a multiple of
+                ``ways``.
+            slot_size (int): Bytes per entry. Replies that don't fit in
+                ``slot_size - 100`` bytes are not cached.
+            ways (int): Slots per hash bucket.
+            clock (Callable): Wall-clock time source, shared by every
+                process using the file.
+            shared_in_flight (bool): Keep in-flight marks in the file too
+                (default: False, per process).
+            in_flight_ttl (float): Seconds a shared in-flight mark lasts
+                if the request never completes.
+        """
+        super().__init__(
+            ttl, slots, slot_size, ways, clock, shared_in_flight, in_flight_ttl
+        )
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = _SlotTable.size_for(slots, slot_size)
+        with self._file_lock(0, _HEADER_SIZE):
+            fresh = os.fstat(self._fd).st_size != size
+            if fresh:
+                os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+            self._table = _SlotTable(
+                memoryview(self._mmap), slots, slot_size, ways, self._lock_bucket
+            )
+            if fresh or not self._table.matches_header():
+                if not fresh:
+                    logger.warning("Re-formatting dedup cache file {}", path)
+                self._table.format()
+
+    @contextmanager
+    def _file_lock(self, offset: int, length: int) -> Iterator[None]:
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def _lock_bucket(self, bucket: int) -> ContextManager[None]:
+        table = self._table
+        length = table.ways * table.slot_size
+        return self._file_lock(_HEADER_SIZE + bucket * length, length)
+
+    def close(self) -> None:
+        """Unmap and close the file; entries stay in it."""
+        self._table.buf.release()
+        self._mmap.close()
+        os.close(self._fd)
+
+
+class SharedMemoryResponseCache(_SlotResponseCache):
+    """``ResponseCache`` in shared memory, for forked worker processes.
+
+    Replies and in-flight marks are shared: a duplicate is answered or
+    dropped by whichever worker receives it. Bucket writes take one of
+    ``lock_stripes`` process-shared locks, created here, so workers must
+    be forked after the cache is created (as ``pyrad2.cluster`` does).
+    Reads take no lock.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30.0,
+        slots: int = 4096,
+        slot_size: int = DEFAULT_SLOT_SIZE,
+        ways: int = 8,
+        lock_stripes: int = 64,
+        in_flight_ttl: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        name: Optional[str] = None,
+    ) -> None:
+        """Create the shared table.
+
+        Args:
+            ttl (float): Lifetime in seconds of a cached reply.
+            slots (int): Number of entries; a multiple of ``ways``.
+            slot_size (int): Bytes per entry. Replies that don't fit in
+                ``slot_size - 100`` bytes are not cached.
+            ways (int): Slots per hash bucket.
+            lock_stripes (int): Number of writer locks buckets share.
+            in_flight_ttl (float): Seconds an in-flight mark lasts if
+                the request never completes, e.g. its worker died.
+            clock (Callable): Time source; ``time.monotonic`` is the
+                same clock in every process on the host.
+            name (str): Name of the shared memory block (default: a
+                random one).
+        """
+        super().__init__(ttl, slots, slot_size, ways, clock, True, in_flight_ttl)
+        if lock_stripes <= 0:
+            raise ValueError("lock_stripes must be positive")
+        size = _SlotTable.size_for(slots, slot_size)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._creator = os.getpid()
+        self._locks = [multiprocessing.Lock() for _ in range(lock_stripes)]
+        # SharedMemory may round the block up to a whole page.
+        buf = self._shm.buf
+        assert buf is not None
+        self._table = _SlotTable(buf[:size], slots, slot_size, ways, self._lock_bucket)
+        self._table.format()
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _lock_bucket(self, bucket: int) -> ContextManager[Any]:
+        return self._locks[bucket % len(self._locks)]
+
+    def close(self) -> None:
+        """Detach from the shared memory; the creating process also
+        frees it."""
+        self._table.buf.release()
+        self._shm.close()
+        if os.getpid() == self._creator:
+            self._shm.unlink()
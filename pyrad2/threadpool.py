@@ -0,0 +1,174 @@
+"""Handler threads for the sync ``Server``.
+
+``Server.run`` handles each request in its poll loop, so one slow handler,
+say a database lookup or an upstream proxy, holds up every listener.
+With ``Server(workers=N)`` the poll thread only reads datagrams, looks up
+the NAS, answers retransmissions from the dedup cache and applies
+admission control. Decoding, the authenticator checks, the handler and
+``send_reply_packet`` run on one of N ``HandlerPool`` threads::
+
+    server = MyServer(dictionary=dictionary, hosts=hosts, workers=8)
+
+Requests wait for a thread in a bounded queue. Once ``backlog`` requests
+are waiting, new ones are dropped and counted, and the NAS retransmits.
+The poll thread never blocks on the pool, so it keeps answering
+retransmissions and Status-Server while the handlers catch up. With a
+``Scheduler`` the threads take requests in its weighted-fair order, and
+its per-class ``max_queue`` bounds the queue instead.
+
+On a standard CPython build the threads overlap only while handlers wait
+on I/O. On a free-threaded build they decode and verify requests in
+parallel as well. The threads share the dedup cache, the admission
+controller, the deadlines and the scheduler, which are all locked.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from pyrad2.router import ServerType
+from pyrad2.scheduler import Scheduler
+
+Job = Callable[[], None]
+
+
+@dataclass(frozen=True, slots=True)
+class PoolStats:
+    """Counters of a ``HandlerPool``."""
+
+    workers: int
+    busy: int
+    queued: int
+    completed: int
+    dropped: int
+
+
+class HandlerPool:
+    """Fixed set of threads running request jobs from a bounded queue."""
+
+    def __init__(
+        self,
+        workers: int,
+        backlog: Optional[int] = None,
+        scheduler: Optional[Scheduler] = None,
+        name: str = "pyrad2-handler",
+    ):
+        """Initialize a handler pool.
+
+        Args:
+            workers (int): Number of threads.
+            backlog (int): Requests that may wait for a thread before new
+                ones are dropped (default: four per thread). Unused with
+                a ``scheduler``.
+            scheduler (Scheduler): Queue requests here and take them in
+                its order, instead of first come, first served.
+            name (str): Prefix of the thread names.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        backlog = 4 * workers if backlog is None else backlog
+        if backlog < 1:
+            raise ValueError("backlog must be at least 1")
+        self.workers = workers
+        self.backlog = backlog
+        self.scheduler = scheduler
+        self.name = name
+        self._fifo: deque[Job] = deque()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        self._busy = 0
+        self._completed = 0
+        self._dropped = 0
+
+    def start(self) -> None:
+        """Start the threads; does nothing if they are running."""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(
+                    target=self._work, name=f"{self.name}-{i}", daemon=True
+                )
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Let the threads finish the queued jobs, then wait for them."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, server_type: ServerType, source: Any, job: Job) -> bool:
+        """Queue ``job``, a request of ``server_type`` from ``source``.
+
+        Returns False, and drops the job, if the queue is full.
+        """
+        with self._cond:
+            if self.scheduler is not None:
+                queued = self.scheduler.push(server_type, source, job)
+            elif len(self._fifo) < self.backlog:
+                self._fifo.append(job)
+                queued = True
+            else:
+                queued = False
+            if not queued:
+                self._dropped += 1
+                return False
+            self._cond.notify()
+        return True
+
+    def __len__(self) -> int:
+        with self._cond:
+            return self._queued()
+
+    def stats(self) -> PoolStats:
+        """Return the pool's counters."""
+        with self._cond:
+            return PoolStats(
+                workers=self.workers,
+                busy=self._busy,
+                queued=self._queued(),
+                completed=self._completed,
+                dropped=self._dropped,
+            )
+
+    def _queued(self) -> int:
+        if self.scheduler is not None:
+            return len(self.scheduler)
+        return len(self._fifo)
+
+    def _pop(self) -> Optional[Job]:
+        if self.scheduler is not None:
+            return self.scheduler.pop()
+        return self._fifo.popleft() if self._fifo else None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._pop()
+                while job is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    job = self._pop()
+                self._busy += 1
+            try:
+                job()
+            except Exception:
+                logger.exception("Unhandled error in request handler")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._completed += 1
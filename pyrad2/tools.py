@@ -3,6 +3,7 @@ import ssl
 import struct
 from asyncio import StreamReader
 from collections.abc import Buffer
+from functools import partial
 from hashlib import sha256
 from ipaddress import (
     IPv4Address,
@@ -12,6 +13,7 @@ from ipaddress import (
     ip_network,
     ip_address,
 )
+from typing import Any, Callable
 
 
 def encode_string(origstr: str) -> bytes:
@@ -428,80 +430,64 @@ def decode_date(num: Buffer) -> bytes:
     return (struct.unpack("!I", num))[0]
 
 
+# Per-datatype codecs. ``Dictionary`` binds the matching pair onto each
+# attribute's ``AttributeCodec`` so the packet layer never dispatches on
+# the type string; ``encode_attr`` / ``decode_attr`` use the same tables.
+ENCODERS: dict[str, Callable[[Any], bytes | str]] = {
+    "string": encode_string,
+    "octets": encode_octets,
+    "integer": encode_integer,
+    "ipaddr": encode_address,
+    "ipv6prefix": encode_ipv6_prefix,
+    "ipv4prefix": encode_ipv4_prefix,
+    "ipv6addr": encode_ipv6_address,
+    "combo-ip": encode_combo_ip,
+    "abinary": encode_ascend_binary,
+    "signed": partial(encode_integer, format="!i"),
+    "short": partial(encode_integer, format="!H"),
+    "byte": partial(encode_integer, format="!B"),
+    "date": encode_date,
+    "integer64": encode_integer64,
+    "ifid": encode_ifid,
+    "ether": encode_ether,
+}
+
+DECODERS: dict[str, Callable[[Any], Any]] = {
+    "string": decode_string,
+    "octets": decode_octets,
+    "integer": decode_integer,
+    "ipaddr": decode_address,
+    "ipv6prefix": decode_ipv6_prefix,
+    "ipv4prefix": decode_ipv4_prefix,
+    "ipv6addr": decode_ipv6_address,
+    "combo-ip": decode_combo_ip,
+    "abinary": decode_ascend_binary,
+    "signed": partial(decode_integer, format="!i"),
+    "short": partial(decode_integer, format="!H"),
+    "byte": partial(decode_integer, format="!B"),
+    "date": decode_date,
+    "integer64": decode_integer64,
+    "ifid": decode_ifid,
+    "ether": decode_ether,
+}
+
+
 def encode_attr(datatype: str, value) -> bytes | str:
     """Encode a RADIUS attribute (type, value, length) into bytes."""
-    if datatype == "string":
-        return encode_string(value)
-    elif datatype == "octets":
-        return encode_octets(value)
-    elif datatype == "integer":
-        return encode_integer(value)
-    elif datatype == "ipaddr":
-        return encode_address(value)
-    elif datatype == "ipv6prefix":
-        return encode_ipv6_prefix(value)
-    elif datatype == "ipv4prefix":
-        return encode_ipv4_prefix(value)
-    elif datatype == "ipv6addr":
-        return encode_ipv6_address(value)
-    elif datatype == "combo-ip":
-        return encode_combo_ip(value)
-    elif datatype == "abinary":
-        return encode_ascend_binary(value)
-    elif datatype == "signed":
-        return encode_integer(value, "!i")
-    elif datatype == "short":
-        return encode_integer(value, "!H")
-    elif datatype == "byte":
-        return encode_integer(value, "!B")
-    elif datatype == "date":
-        return encode_date(value)
-    elif datatype == "integer64":
-        return encode_integer64(value)
-    elif datatype == "ifid":
-        return encode_ifid(value)
-    elif datatype == "ether":
-        return encode_ether(value)
-    else:
-        raise ValueError("Unknown attribute type %s" % datatype)
+    try:
+        encoder = ENCODERS[datatype]
+    except KeyError:
+        raise ValueError("Unknown attribute type %s" % datatype) from None
+    return encoder(value)
 
 
 def decode_attr(datatype: str, value) -> bytes | str:
     """Decode a RADIUS attribute from bytes into a type and value."""
-    if datatype == "string":
-        return decode_string(value)
-    elif datatype == "octets":
-        return decode_octets(value)
-    elif datatype == "integer":
-        return decode_integer(value)
-    elif datatype == "ipaddr":
-        return decode_address(value)
-    elif datatype == "ipv6prefix":
-        return decode_ipv6_prefix(value)
-    elif datatype == "ipv4prefix":
-        return decode_ipv4_prefix(value)
-    elif datatype == "ipv6addr":
-        return decode_ipv6_address(value)
-    elif datatype == "combo-ip":
-        return decode_combo_ip(value)
-    elif datatype == "abinary":
-        return decode_ascend_binary(value)
-    elif datatype == "signed":
-        return decode_integer(value, "!i")
-    elif datatype == "short":
-        return decode_integer(value, "!H")
-    elif datatype == "byte":
-        return decode_integer(value, "!B")
-    elif datatype == "date":
-        return decode_date(value)
-    elif datatype == "integer64":
-        return decode_integer64(value)
-    elif datatype == "ifid":
-        return decode_ifid(value)
-    elif datatype == "ether":
-        return decode_ether(value)
-    else:
-        raise ValueError("Unknown attribute type %s" % datatype)
+    try:
+        decoder = DECODERS[datatype]
+    except KeyError:
+        raise ValueError("Unknown attribute type %s" % datatype) from None
+    return decoder(value)
 
 
 def get_cert_fingerprint(cert: bytes) -> str:
@@ -0,0 +1,126 @@
+"""Micro-benchmarks for the packet codec.
+
+Times ``Packet.decode_packet`` over datagrams of growing size, and
+``Packet._pkt_write_attributes`` over packets carrying a growing number
+of Vendor-Specific attributes, and prints the cost per attribute. A
+linear codec shows a flat ``ns/AVP`` column as the packet grows; a
+quadratic one (consuming the datagram with ``packet = packet[attrlen:]``
+on decode, or growing the output with ``bytes +=`` on encode) shows it
+climbing with every row.
+
+Run via ``make bench`` or directly:
+
+    uv run python scripts/bench_codec.py
+    uv run python scripts/bench_codec.py --repeat 200
+
+Numbers are wall-clock best-of-``--rounds`` and only meaningful relative
+to each other on the same machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from pyrad2.dictionary import Dictionary  # noqa: E402
+from pyrad2.packet import Packet  # noqa: E402
+
+DICTIONARY_PATH = REPO_ROOT / "examples" / "dictionary"
+
+# Packet sizes to sweep. The largest is just under RFC 7930's 8 KB cap
+# that ``decode_packet`` enforces.
+SIZES: tuple[int, ...] = (512, 1024, 2048, 4096, 8190)
+
+# NAS-Port (code 5, integer): the smallest common AVP at 6 wire bytes,
+# i.e. the worst case for per-AVP overhead.
+SMALL_AVP_CODE = 5
+
+# Attribute counts to sweep for encode. Replies carrying dozens to
+# hundreds of Cisco-AVPair-style VSAs are where ``bytes +=`` hurts.
+ENCODE_COUNTS: tuple[int, ...] = (32, 64, 128, 256, 512, 1024)
+
+# Raw (vendor_id, type) key so the benchmark doesn't depend on a vendor
+# dictionary: Cisco (9) AVPair (1).
+VSA_KEY = (9, 1)
+VSA_VALUE = b"shell:priv-lvl=15"
+
+
+def build_datagram(size: int) -> tuple[bytes, int]:
+    """Return an Accounting-Request of at most ``size`` bytes and its AVP count."""
+    count = (size - 20) // 6
+    attributes = b"".join(
+        struct.pack("!BBI", SMALL_AVP_CODE, 6, i) for i in range(count)
+    )
+    header = struct.pack("!BBH16s", 4, 1, 20 + len(attributes), 16 * b"\x00")
+    return header + attributes, count
+
+
+def best_of(func: Callable[[], None], repeat: int, rounds: int) -> float:
+    """Return the fastest per-call time (seconds) over ``rounds`` batches."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def bench_decode(dictionary: Dictionary, repeat: int, rounds: int) -> None:
+    print("decode_packet")
+    print(f"  {'bytes':>6}  {'AVPs':>5}  {'µs/packet':>10}  {'ns/AVP':>7}")
+    for size in SIZES:
+        raw, count = build_datagram(size)
+        pkt = Packet(dict=dictionary, secret=b"secret")
+
+        elapsed = best_of(lambda: pkt.decode_packet(raw), repeat, rounds)
+        print(
+            f"  {len(raw):>6}  {count:>5}  {elapsed * 1e6:>10.1f}"
+            f"  {elapsed * 1e9 / count:>7.0f}"
+        )
+
+
+def bench_encode(dictionary: Dictionary, repeat: int, rounds: int) -> None:
+    # Times the writer rather than ``_pkt_encode_attributes``, which
+    # would return its cached bytes after the first call.
+    print("_pkt_write_attributes")
+    print(f"  {'AVPs':>5}  {'bytes':>6}  {'µs/packet':>10}  {'ns/AVP':>7}")
+    for count in ENCODE_COUNTS:
+        pkt = Packet(dict=dictionary, secret=b"secret")
+        pkt[VSA_KEY] = [VSA_VALUE] * count
+        size = len(pkt._pkt_encode_attributes())
+
+        elapsed = best_of(
+            lambda: pkt._pkt_write_attributes(bytearray()), repeat, rounds
+        )
+        print(
+            f"  {count:>5}  {size:>6}  {elapsed * 1e6:>10.1f}"
+            f"  {elapsed * 1e9 / count:>7.0f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--repeat", type=int, default=100, help="calls per timing batch"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=5, help="batches; the fastest is reported"
+    )
+    args = parser.parse_args(argv)
+
+    dictionary = Dictionary(str(DICTIONARY_PATH))
+    bench_decode(dictionary, args.repeat, args.rounds)
+    bench_encode(dictionary, args.repeat, args.rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
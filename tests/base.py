@@ -19,6 +19,11 @@ def capture_logs(level="INFO", format="{level}:{name}:{message}"):
     logger.remove(handler_id)
 
 
+def encoded_request(cls, dictionary, ident):
+    """Encode an empty ``cls`` request with Identifier ``ident``."""
+    return cls(id=ident, secret=b"secret", dict=dictionary).request_packet()
+
+
 class DummyServer(ServerAsync):
     def handle_auth_packet(self, protocol, pkt, addr):
         self.auth_called = True
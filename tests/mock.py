@@ -111,11 +111,12 @@ def origkey(klass):
     return "_originals_" + klass.__name__
 
 
-def MockClassMethod(klass, name, myfunc=None):
+def MockClassMethod(klass, name, myfunc=None, result=None):
     def func(self, *args, **kwargs):
         if not hasattr(self, "called"):
             self.called = []
         self.called.append((name, args, kwargs))
+        return result
 
     key = origkey(klass)
     if not hasattr(klass, key):
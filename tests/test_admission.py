@@ -0,0 +1,174 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import admission, packet
+from pyrad2.admission import AdmissionController, Limits, ShedAction
+from pyrad2.constants import ERROR_CAUSE_ATTRIBUTE, ErrorCause, PacketType
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+
+from .base import DummyServer, encoded_request
+
+AUTH = PacketType.AccessRequest
+
+
+class TestAdmissionController:
+    def setup_method(self):
+        self.now = [0.0]
+        self.host = RemoteHost("10.0.0.1", b"secret", "nas")
+
+    def _controller(self, **kwargs):
+        return AdmissionController(clock=lambda: self.now[0], **kwargs)
+
+    def test_limits_are_validated(self):
+        with pytest.raises(ValueError):
+            Limits(rate=0)
+        with pytest.raises(ValueError):
+            Limits(burst=0.5)
+        with pytest.raises(ValueError):
+            Limits(max_in_flight=0)
+
+    def test_token_bucket_per_source(self):
+        control = self._controller(per_host=Limits(rate=2, burst=2))
+        results = [control.admit(self.host, "10.0.0.1", AUTH) for _ in range(3)]
+        assert [r is not None for r in results] == [True, True, False]
+        # Another NAS behind the same entry has its own bucket.
+        assert control.admit(self.host, "10.0.0.2", AUTH) is not None
+
+        self.now[0] += 0.5
+        assert control.admit(self.host, "10.0.0.1", AUTH) is not None
+        assert control.admit(self.host, "10.0.0.1", AUTH) is None
+        stats = control.stats()
+        assert (stats.admitted, stats.shed_rate, stats.shed) == (4, 2, 2)
+
+    def test_in_flight_limit_and_ticket_holds(self):
+        control = self._controller(per_host=Limits(max_in_flight=1))
+        ticket = control.admit(self.host, "10.0.0.1", AUTH)
+        assert control.admit(self.host, "10.0.0.1", AUTH) is None
+
+        ticket.retain()
+        ticket.release()
+        assert control.stats().in_flight == 1
+        ticket.release()
+        assert control.stats().in_flight == 0
+        assert control.admit(self.host, "10.0.0.1", AUTH) is not None
+        assert control.stats().shed_in_flight == 1
+
+    def test_total_limit_refunds_host_token(self):
+        control = self._controller(
+            per_host=Limits(rate=1, burst=1), total=Limits(max_in_flight=1)
+        )
+        held = control.admit(self.host, "10.0.0.1", AUTH)
+        assert control.admit(self.host, "10.0.0.2", AUTH) is None
+        held.release()
+        assert control.admit(self.host, "10.0.0.2", AUTH) is not None
+
+        control = self._controller(
+            per_host=Limits(rate=1, burst=1), total=Limits(rate=1, burst=1)
+        )
+        assert control.admit(self.host, "10.0.0.1", AUTH) is not None
+        assert control.admit(self.host, "10.0.0.2", AUTH) is None
+        self.now[0] += 1.0
+        assert control.admit(self.host, "10.0.0.2", AUTH) is not None
+
+    def test_host_limits_override_default(self):
+        control = self._controller(per_host=Limits(max_in_flight=1))
+        big = RemoteHost("10.0.0.9", b"secret", "bng", limits=Limits(max_in_flight=3))
+        assert all(control.admit(big, "10.0.0.9", AUTH) for _ in range(3))
+        assert control.admit(big, "10.0.0.9", AUTH) is None
+
+    def test_status_server_and_unlisted_hosts_are_not_limited(self):
+        control = self._controller(total=Limits(max_in_flight=1))
+        control.admit(self.host, "10.0.0.1", AUTH)
+        ticket = control.admit(self.host, "10.0.0.1", PacketType.StatusServer)
+        assert ticket is admission.UNLIMITED
+        assert control.stats().tracked_hosts == 0
+
+    def test_idle_sources_are_pruned(self, monkeypatch):
+        monkeypatch.setattr(admission, "_PRUNE_AT", 4)
+        control = self._controller(per_host=Limits(rate=10))
+        busy = control.admit(self.host, "10.0.0.1", AUTH)
+        for i in range(2, 5):
+            control.admit(self.host, f"10.0.0.{i}", AUTH).release()
+        self.now[0] += 1.0
+        control.admit(self.host, "10.0.0.99", AUTH)
+        assert control.stats().tracked_hosts == 2
+        busy.release()
+        assert control.stats().in_flight == 1
+
+
+class TestServerShedding:
+    async def test_async_server_rejects_over_in_flight_limit(self, full_dictionary):
+        release = asyncio.Event()
+
+        class SlowServer(DummyServer):
+            async def handle_auth_packet(self, protocol, pkt, addr):
+                await release.wait()
+                reply = self.create_reply_packet(pkt)
+                reply.code = PacketType.AccessAccept
+                return reply
+
+        server = SlowServer(
+            dictionary=full_dictionary,
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            require_message_authenticator=False,
+            admission=AdmissionController(
+                per_host=Limits(max_in_flight=1), shed_action=ShedAction.REJECT
+            ),
+        )
+        protocol = DatagramProtocolServer(
+            ip="10.0.0.2",
+            port=1812,
+            server=server,
+            server_type=ServerType.Auth,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        protocol.transport = MagicMock()
+        addr = ("10.0.0.1", 4000)
+
+        protocol.datagram_received(
+            encoded_request(packet.AuthPacket, full_dictionary, 1), addr
+        )
+        await asyncio.sleep(0)
+        protocol.datagram_received(
+            encoded_request(packet.AuthPacket, full_dictionary, 2), addr
+        )
+
+        raw, _ = protocol.transport.sendto.call_args.args
+        reply = packet.Packet(packet=raw, secret=b"secret", dict=full_dictionary)
+        assert (reply.code, reply.id) == (PacketType.AccessReject, 2)
+        assert reply[ERROR_CAUSE_ATTRIBUTE] == [
+            int(ErrorCause.ResourcesUnavailable).to_bytes(4, "big")
+        ]
+        assert server.admission_stats().in_flight == 1
+
+        release.set()
+        await asyncio.gather(*protocol.handler_tasks)
+        assert server.admission_stats().in_flight == 0
+        assert protocol.transport.sendto.call_count == 2
+
+    def test_sync_server_drops_over_rate(self, full_dictionary):
+        handled = []
+        server = Server(
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            admission=AdmissionController(per_host=Limits(rate=1, burst=1)),
+        )
+        server.handle_auth_packet = handled.append
+        fd = MagicMock()
+        source = ("10.0.0.1", 4000)
+
+        for ident in (1, 2):
+            data = encoded_request(packet.AuthPacket, full_dictionary, ident)
+            pkt = server._packet_from_datagram(fd, data, source)
+            if pkt is not None:
+                server._dispatch(pkt, server._handle_auth_packet)
+
+        assert [pkt.id for pkt in handled] == [1]
+        assert not fd.sendto.called
+        stats = server.admission_stats()
+        assert (stats.admitted, stats.shed_rate, stats.in_flight) == (1, 1, 0)
@@ -0,0 +1,173 @@
+import asyncio
+import socket
+
+import pytest
+
+from pyrad2 import batchio, packet
+from pyrad2.client_async import ClientAsync
+from pyrad2.constants import PacketType
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import ServerAsync
+
+pytestmark = pytest.mark.skipif(
+    not batchio.AVAILABLE, reason="recvmmsg/sendmmsg not available"
+)
+
+
+def free_udp_port():
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+@pytest.fixture
+def udp_pair():
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(("127.0.0.1", 0))
+    b.bind(("127.0.0.1", 0))
+    b.settimeout(1)
+    yield a, b
+    a.close()
+    b.close()
+
+
+class AcctServer(ServerAsync):
+    def handle_auth_packet(self, protocol, pkt, addr):
+        pass
+
+    def handle_acct_packet(self, protocol, pkt, addr):
+        reply = self.create_reply_packet(pkt)
+        reply.code = PacketType.AccountingResponse
+        protocol.send_response(reply, addr)
+
+
+class SyncAcctServer(Server):
+    def handle_acct_packet(self, pkt):
+        reply = self.create_reply_packet(pkt)
+        reply.code = PacketType.AccountingResponse
+        self.send_reply_packet(pkt.fd, reply)
+
+
+class TestMessageBatch:
+    def test_recv_drains_up_to_size(self, udp_pair):
+        a, b = udp_pair
+        batch = batchio.MessageBatch(4)
+        assert batch.recv(a) == []
+        for i in range(6):
+            b.sendto(b"x%d" % i, a.getsockname())
+
+        first = batch.recv(a)
+        second = batch.recv(a)
+
+        assert [data for data, _ in first] == [b"x0", b"x1", b"x2", b"x3"]
+        assert [data for data, _ in second] == [b"x4", b"x5"]
+        assert {addr for _, addr in first + second} == {b.getsockname()}
+
+    def test_send_all_in_chunks(self, udp_pair):
+        a, b = udp_pair
+        batch = batchio.MessageBatch(2)
+        batch.send_all(a, [(b"r%d" % i, b.getsockname()) for i in range(5)])
+        assert [b.recvfrom(16) for _ in range(5)] == [
+            (b"r%d" % i, a.getsockname()) for i in range(5)
+        ]
+
+    def test_ipv6_addresses_round_trip(self):
+        a = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        b = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        try:
+            a.bind(("::1", 0))
+            b.bind(("::1", 0))
+        except OSError:
+            a.close()
+            b.close()
+            pytest.skip("no IPv6 loopback")
+        b.settimeout(1)
+        batch = batchio.MessageBatch(2)
+        b.sendto(b"ping", a.getsockname())
+        ((data, addr),) = batch.recv(a)
+        assert addr == b.getsockname()
+        batch.send_all(a, [(b"pong", addr)])
+        assert b.recvfrom(16)[0] == b"pong"
+        a.close()
+        b.close()
+
+
+class TestSyncServerBatch:
+    def test_batch_replies_and_skips_broken_packets(self, full_dictionary, udp_pair):
+        _, nas = udp_pair
+        server = SyncAcctServer(
+            addresses=["127.0.0.1"],
+            acctport=free_udp_port(),
+            auth_enabled=False,
+            dict=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"secret", "nas")},
+            io_batch_size=8,
+        )
+        fd = server.acctfds[0]
+        requests = [
+            packet.AcctPacket(id=i, secret=b"secret", dict=full_dictionary)
+            for i in range(3)
+        ]
+        nas.sendto(requests[0].request_packet(), fd.getsockname())
+        nas.sendto(b"\x04\x09\x00", fd.getsockname())
+        for req in requests[1:]:
+            nas.sendto(req.request_packet(), fd.getsockname())
+
+        server._process_batch(fd, batchio.MessageBatch(8), server._handle_acct_packet)
+
+        replies = {}
+        for _ in range(3):
+            raw = nas.recv(4096)
+            replies[raw[1]] = raw
+        for req in requests:
+            raw = replies[req.id]
+            assert req.verify_reply(req.create_reply(packet=raw), raw)
+        fd.close()
+
+
+class TestAsyncBatchTransport:
+    async def test_client_and_server_over_batched_sockets(self, full_dictionary):
+        port = free_udp_port()
+        server = AcctServer(
+            acct_port=port,
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"secret", "nas")},
+            io_batch_size=8,
+        )
+        client = ClientAsync(
+            "127.0.0.1",
+            acct_port=port,
+            secret=b"secret",
+            dict=full_dictionary,
+            timeout=2,
+            io_batch_size=8,
+        )
+        await server.initialize_transports(enable_acct=True)
+        await client.initialize_transports(enable_acct=True)
+        try:
+            transport = server.acct_protocols[0].transport
+            assert isinstance(transport, batchio.BatchDatagramTransport)
+            assert isinstance(
+                client.protocol_acct.transport, batchio.BatchDatagramTransport
+            )
+
+            requests = [client.create_acct_packet() for _ in range(10)]
+            replies = await asyncio.gather(*(client.send_packet(r) for r in requests))
+
+            assert [r.code for r in replies] == [PacketType.AccountingResponse] * 10
+        finally:
+            await client.deinitialize_transports()
+            await server.deinitialize_transports()
+
+    async def test_batch_size_one_uses_loop_transport(self):
+        protocol = asyncio.DatagramProtocol()
+        transport, _ = await batchio.create_datagram_endpoint(
+            protocol, local_addr=("127.0.0.1", 0), batch_size=1
+        )
+        try:
+            assert not isinstance(transport, batchio.BatchDatagramTransport)
+        finally:
+            transport.close()
@@ -52,6 +52,16 @@ class TestConstruction:
         assert client.secret == "secret"
         assert client.dict is marker
 
+    def test_packets_share_secret_context(self):
+        client = Client(self.server, secret=b"secret")
+        auth = client.create_auth_packet()
+        acct = client.create_acct_packet()
+        assert auth.secret_context is client.secret_context
+        assert acct.secret_context is client.secret_context
+
+        client.secret = b"other"
+        assert client.secret_context.secret == b"other"
+
 
 class TestSocket:
     def setup_method(self):
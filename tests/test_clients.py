@@ -0,0 +1,137 @@
+import ipaddress
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import packet
+from pyrad2.clients import ClientTable
+from pyrad2.constants import PacketType
+from pyrad2.exceptions import ServerPacketError
+from pyrad2.router import RequestRouter
+from pyrad2.server import RemoteHost
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+
+from .base import DummyServer
+
+
+def _host(name):
+    return RemoteHost(name, name.encode(), name)
+
+
+class TestClientTable:
+    def setup_method(self):
+        self.table = ClientTable(
+            {
+                "10.0.0.0/8": _host("site"),
+                "10.1.2.0/24": _host("lab"),
+                "10.1.2.3": _host("core"),
+                "2001:db8::/32": _host("v6"),
+                "2001:db8:1::/48": _host("v6-lab"),
+            }
+        )
+
+    def _name(self, addr):
+        host = self.table.get(addr)
+        return None if host is None else host.name
+
+    def test_longest_prefix_wins(self):
+        assert self._name("10.1.2.3") == "core"
+        assert self._name("10.1.2.4") == "lab"
+        assert self._name("10.200.0.1") == "site"
+        assert self._name("11.0.0.1") is None
+
+    def test_ipv6_and_mapped_addresses(self):
+        assert self._name("2001:db8:1::5") == "v6-lab"
+        assert self._name("2001:db8:2::5") == "v6"
+        assert self._name("2001:db9::1") is None
+        assert self._name("::ffff:10.1.2.4") == "lab"
+        assert self._name("fe80::1%eth0") is None
+
+    def test_mapping_interface(self):
+        assert "10.9.9.9" in self.table
+        assert "192.0.2.1" not in self.table
+        assert self.table["10.1.2.3"].name == "core"
+        assert self.table["10.1.2.0/24"].name == "lab"
+        with pytest.raises(KeyError):
+            self.table["192.0.2.1"]
+        assert self.table.get("not-an-address") is None
+        assert len(self.table) == 5
+        assert "10.1.2.3" in list(self.table)
+
+    def test_writes_publish_new_snapshots(self):
+        before = self.table._snapshot
+        self.table["10.1.2.3/32"] = _host("replaced")
+        del self.table["10.1.2.0/24"]
+
+        assert self._name("10.1.2.3") == "replaced"
+        assert self._name("10.1.2.4") == "site"
+        assert len(self.table) == 4
+        assert before.lookup("10.1.2.4").name == "lab"
+
+        self.table.replace({"0.0.0.0/0": _host("any")})
+        assert self._name("10.1.2.3") == self._name("192.0.2.1") == "any"
+        assert self._name("2001:db8::1") is None
+
+    def test_invalid_keys_are_rejected(self):
+        with pytest.raises(ValueError):
+            self.table["10.0.0.1/8"] = _host("typo")
+        with pytest.raises(ValueError):
+            ClientTable({"nas.example.com": _host("name")})
+        with pytest.raises(KeyError):
+            del self.table["192.0.2.0/24"]
+        assert len(self.table) == 5
+
+    def test_many_prefixes(self):
+        table = ClientTable(
+            (f"10.{i // 256}.{i % 256}.0/24", _host(str(i))) for i in range(4096)
+        )
+        assert table["10.3.7.200"].name == str(3 * 256 + 7)
+        assert len(table._snapshot.v4) == 1
+        network = ipaddress.ip_network("10.15.255.0/24")
+        assert table[str(network.network_address + 1)].name == "4095"
+
+
+class TestServersAcceptClientTable:
+    def test_router_lookup(self):
+        router = RequestRouter(
+            hosts=ClientTable({"192.0.2.0/24": _host("nas")}), dictionary=None
+        )
+        assert router.lookup_secret("192.0.2.77") == b"nas"
+        with pytest.raises(ServerPacketError):
+            router.lookup_host("198.51.100.1")
+
+    def test_empty_table_is_kept(self, full_dictionary):
+        table = ClientTable()
+        server = DummyServer(dictionary=full_dictionary, hosts=table)
+        assert server.hosts is table
+
+    def test_async_protocol_answers_subnet_member(self, full_dictionary):
+        hosts = ClientTable({"192.0.2.0/24": RemoteHost("192.0.2.0/24", b"s", "nas")})
+        handled = []
+
+        class AuthServer(DummyServer):
+            def handle_auth_packet(self, protocol, pkt, addr):
+                handled.append(addr)
+                reply = self.create_reply_packet(pkt)
+                reply.code = PacketType.AccessAccept
+                protocol.send_response(reply, addr)
+
+        server = AuthServer(
+            dictionary=full_dictionary,
+            hosts=hosts,
+            require_message_authenticator=False,
+        )
+        protocol = DatagramProtocolServer(
+            ip="192.0.2.1",
+            port=1812,
+            server=server,
+            server_type=ServerType.Auth,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        protocol.transport = MagicMock()
+        data = packet.AuthPacket(id=1, secret=b"s", dict=full_dictionary)
+        protocol.datagram_received(data.request_packet(), ("192.0.2.50", 1000))
+        protocol.datagram_received(data.request_packet(), ("198.51.100.1", 1000))
+
+        assert handled == [("192.0.2.50", 1000)]
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import socket
+import time
+
+import pytest
+
+from pyrad2 import cluster
+from pyrad2.server import Server
+
+from .base import DummyServer
+
+
+def wait_until(predicate, supervisor, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        supervisor.poll(0.05)
+        if predicate():
+            return
+    raise AssertionError("condition not reached")
+
+
+async def count_and_idle():
+    cluster.counters()["ticks"] += 1
+    cluster.ready()
+    await asyncio.Event().wait()
+
+
+@pytest.fixture
+def supervisor():
+    supervisors = []
+
+    def make(factory, **kwargs):
+        kwargs.setdefault("restart_delay", 0)
+        kwargs.setdefault("shutdown_timeout", 5)
+        kwargs.setdefault("report_interval", 0.05)
+        sup = cluster.Supervisor(factory, **kwargs)
+        supervisors.append(sup)
+        return sup
+
+    yield make
+    for sup in supervisors:
+        sup.stop()
+
+
+class TestSupervisor:
+    def test_counters_are_summed_across_workers(self, supervisor):
+        sup = supervisor(lambda index: count_and_idle(), workers=3)
+        sup.start()
+        wait_until(lambda: sup.totals()["ticks"] == 3, sup)
+
+        sup.stop()
+        # Exited workers' counters are kept.
+        assert sup.totals()["ticks"] == 3
+
+    def test_crashed_worker_is_restarted(self, supervisor, tmp_path):
+        marker = tmp_path / "crashed"
+
+        def crash_once(index):
+            if index == 0 and not marker.exists():
+                marker.touch()
+                os._exit(3)
+            return count_and_idle()
+
+        sup = supervisor(crash_once, workers=2)
+        sup.start()
+        wait_until(lambda: sup.restarts == 1 and sup.totals()["ticks"] == 2, sup)
+        assert all(w.process.is_alive() for w in sup._workers.values())
+
+    def test_rolling_restart_replaces_every_worker(self, supervisor):
+        sup = supervisor(lambda index: count_and_idle(), workers=2)
+        sup.start()
+        wait_until(lambda: sup.totals()["ticks"] == 2, sup)
+        before = {w.process.pid for w in sup._workers.values()}
+
+        sup.rolling_restart()
+
+        after = {w.process.pid for w in sup._workers.values()}
+        assert before.isdisjoint(after)
+        assert all(w.process.is_alive() for w in sup._workers.values())
+        wait_until(lambda: sup.totals()["ticks"] == 4, sup)
+        assert sup.restarts == 0
+
+    def test_worker_is_ready_once_it_says_so(self, supervisor, tmp_path):
+        go = tmp_path / "go"
+
+        async def ready_on_signal():
+            while not go.exists():
+                await asyncio.sleep(0.01)
+            cluster.ready()
+            await asyncio.Event().wait()
+
+        sup = supervisor(lambda index: ready_on_signal(), workers=1)
+        sup.start()
+        pid = sup._workers[0].process.pid
+        # Reporting counters, but not yet ready.
+        wait_until(lambda: pid in sup._reports.live, sup)
+        sup.poll(0.2)
+        assert not sup._workers[0].ready
+
+        go.touch()
+        wait_until(lambda: sup._workers[0].ready, sup)
+
+    def test_serve_is_ready_after_binding(self, supervisor):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+
+        def make_server(index):
+            server = DummyServer(auth_port=port, hosts={})
+            return cluster.serve(server, enable_auth=True, addresses=["127.0.0.1"])
+
+        sup = supervisor(make_server, workers=1)
+        sup.start()
+        wait_until(lambda: sup._workers[0].ready, sup)
+
+    @pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="Linux only")
+    def test_workers_are_pinned(self, supervisor):
+        cpu = min(os.sched_getaffinity(0))
+
+        def report_affinity(index):
+            cluster.counters()[f"cpu{sorted(os.sched_getaffinity(0))}"] += 1
+            return count_and_idle()
+
+        sup = supervisor(report_affinity, workers=2, cpus=[cpu])
+        sup.start()
+        wait_until(lambda: sup.totals()[f"cpu{[cpu]}"] == 2, sup)
+
+    def test_rejects_bad_factory_result(self, supervisor):
+        sup = supervisor(lambda index: None, workers=1, restart_delay=60)
+        sup.start()
+        worker = sup._workers[0]
+        worker.process.join(5)
+        assert worker.process.exitcode == 1
+
+    def test_rejects_zero_workers(self):
+        with pytest.raises(ValueError):
+            cluster.Supervisor(lambda index: None, workers=0)
+
+    def test_rejects_pinning_without_affinity_support(self, monkeypatch):
+        monkeypatch.delattr(os, "sched_setaffinity", raising=False)
+        with pytest.raises(ValueError, match="requires Linux"):
+            cluster.Supervisor(lambda index: None, workers=1, cpus=[0])
+        # Without pinning the supervisor is still available.
+        cluster.Supervisor(lambda index: None, workers=1)
+
+
+class TestReusePort:
+    def test_two_servers_share_a_port(self):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+
+        first = Server(
+            addresses=["127.0.0.1"], authport=port, acct_enabled=False, reuse_port=True
+        )
+        second = Server(
+            addresses=["127.0.0.1"], authport=port, acct_enabled=False, reuse_port=True
+        )
+        try:
+            assert first.authfds[0].getsockname() == second.authfds[0].getsockname()
+        finally:
+            for fd in first.authfds + second.authfds:
+                fd.close()
@@ -0,0 +1,145 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import packet
+from pyrad2.deadline import Deadlines
+from pyrad2.scheduler import Scheduler
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+
+from .base import DummyServer, encoded_request
+
+AUTH, ACCT = ServerType.Auth, ServerType.Acct
+HOSTS = {"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")}
+ADDR = ("10.0.0.1", 4000)
+
+
+class TestDeadlines:
+    def test_expiry_is_counted_per_class(self):
+        now = [10.0]
+        deadlines = Deadlines({AUTH: 3.0}, clock=lambda: now[0])
+        assert not deadlines.expired(AUTH, 8.0)
+        assert deadlines.expired(AUTH, 6.0)
+        assert deadlines.expired(AUTH, 5.0)
+        assert not deadlines.expired(ACCT, 0.0)
+        assert not deadlines.expired(AUTH, None)
+
+        stats = deadlines.stats()[AUTH]
+        assert (stats.expired, stats.wait_total, stats.wait_max) == (2, 9.0, 5.0)
+        assert deadlines.stats()[ACCT].expired == 0
+
+    def test_deadlines_must_be_positive(self):
+        with pytest.raises(ValueError):
+            Deadlines({AUTH: 0})
+
+
+class Recorder(DummyServer):
+    def __init__(self, **kwargs):
+        super().__init__(
+            dictionary=kwargs.pop("dictionary"),
+            hosts=HOSTS,
+            require_message_authenticator=False,
+            **kwargs,
+        )
+        self.handled = []
+
+    def handle_acct_packet(self, protocol, pkt, addr):
+        self.handled.append(pkt.id)
+
+
+def _protocol(server, server_type, **kwargs):
+    protocol = DatagramProtocolServer(
+        ip="10.0.0.2",
+        port=1813,
+        server=server,
+        server_type=server_type,
+        hosts=server.hosts,
+        request_callback=server._request_handler,
+        **kwargs,
+    )
+    protocol.transport = MagicMock()
+    return protocol
+
+
+class TestAsyncDeadlines:
+    async def test_queued_requests_expire_and_leave_dedup(self, full_dictionary):
+        now = [0.0]
+        server = Recorder(
+            dictionary=full_dictionary,
+            scheduler=Scheduler(),
+            deadlines=Deadlines({ACCT: 5.0}, clock=lambda: now[0]),
+        )
+        protocol = _protocol(server, ACCT)
+        data = [
+            encoded_request(packet.AcctPacket, full_dictionary, i) for i in range(2)
+        ]
+
+        protocol.datagram_received(data[0], ADDR)
+        protocol.datagram_received(data[1], ADDR)
+        now[0] = 5.0
+        await asyncio.sleep(0)
+
+        assert server.handled == []
+        assert server.deadline_stats()[ACCT].expired == 2
+        assert server.dedup_stats().in_flight == 0
+
+        # The NAS's retransmission is handled as a fresh request.
+        protocol.datagram_received(data[0], ADDR)
+        await asyncio.sleep(0)
+        assert server.handled == [0]
+
+    async def test_wait_for_handler_slot_counts(self, full_dictionary):
+        now = [0.0]
+        release = asyncio.Event()
+        started = []
+
+        class Slow(Recorder):
+            async def handle_acct_packet(self, protocol, pkt, addr):
+                started.append(pkt.id)
+                await release.wait()
+
+        server = Slow(
+            dictionary=full_dictionary,
+            deadlines=Deadlines({ACCT: 5.0}, clock=lambda: now[0]),
+        )
+        protocol = _protocol(server, ACCT, max_concurrent_handlers=1)
+        for i in range(2):
+            protocol.datagram_received(
+                encoded_request(packet.AcctPacket, full_dictionary, i), ADDR
+            )
+        await asyncio.sleep(0)
+        now[0] = 6.0
+        release.set()
+        await asyncio.gather(*protocol.handler_tasks)
+
+        assert started == [0]
+        assert server.deadline_stats()[ACCT].wait_max == 6.0
+
+
+class TestSyncDeadlines:
+    def test_expired_queue_entries_are_skipped(self, full_dictionary):
+        now = [0.0]
+        server = Server(
+            hosts=HOSTS,
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            scheduler=Scheduler(weights={ACCT: 2}),
+            deadlines=Deadlines({ACCT: 5.0}, clock=lambda: now[0]),
+        )
+        handled = []
+        server.handle_acct_packet = lambda pkt: handled.append(pkt.id)
+        fd = MagicMock()
+        fd.recvfrom.side_effect = [
+            (encoded_request(packet.AcctPacket, full_dictionary, i), ADDR)
+            for i in range(2)
+        ]
+
+        server._queue_input(fd, server._handle_acct_packet, ACCT)
+        now[0] = 5.0
+        server._run_queued()
+
+        assert handled == []
+        assert server.deadline_stats()[ACCT].expired == 2
+        assert len(server.scheduler) == 0
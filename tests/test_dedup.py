@@ -1,9 +1,12 @@
+import asyncio
+import threading
 from unittest.mock import MagicMock
 
 import pytest
 
 from pyrad2 import dedup, packet
 from pyrad2.constants import PacketType
+from pyrad2.radsec.v11 import RadiusVersion
 from pyrad2.server import RemoteHost, Server
 from pyrad2.server_async import DatagramProtocolServer, ServerType
 
@@ -53,6 +56,26 @@ class TestDedupKey:
 
         assert dedup.key_for(Stub()) is None
 
+    def test_key_for_datagram_matches_decoded_key(self):
+        pkt = _make_auth_packet(self.dictionary)
+        assert dedup.key_for_datagram(pkt.raw_packet, pkt.source) == dedup.key_for(pkt)
+        assert dedup.key_for_datagram(pkt.raw_packet[:19], pkt.source) is None
+
+    def test_key_for_datagram_uses_v11_token(self):
+        req = packet.AuthPacket(
+            secret=b"radsec", dict=self.dictionary, radius_version=RadiusVersion.V1_1
+        )
+        req.token = b"\x01\x02\x03\x04"
+        raw = req.request_packet()
+        pkt = packet.parse_packet(
+            raw, b"radsec", self.dictionary, radius_version=RadiusVersion.V1_1
+        )
+        pkt.source = ("10.0.0.1", 2083)
+
+        key = dedup.key_for_datagram(raw, pkt.source, RadiusVersion.V1_1)
+        assert key == dedup.key_for(pkt)
+        assert key.request_authenticator == b"\x01\x02\x03\x04"
+
 
 class TestResponseCache:
     def setup_method(self):
@@ -89,6 +112,93 @@ class TestResponseCache:
         assert self.cache.lookup(keys[2]) == b"r-2"
         assert self.cache.lookup(keys[4]) == b"r-4"
 
+    def test_sweep_ignores_lru_order(self):
+        short, long = self.key, dedup.DedupKey("10.0.0.1", 2, 1, 2, b"b" * 16)
+        self.cache.record_reply(short, b"short", ttl=5.0)
+        self.cache.record_reply(long, b"long", ttl=20.0)
+        # A hit moves the short-lived entry behind the long-lived one.
+        assert self.cache.lookup(short) == b"short"
+
+        self.now[0] += 6.0
+        assert self.cache.sweep() == 1
+        assert len(self.cache) == 1
+        assert self.cache.lookup(long) == b"long"
+
+    def test_re_recorded_entry_keeps_its_new_expiry(self):
+        self.cache.record_reply(self.key, b"first")
+        self.now[0] += 5.0
+        self.cache.record_reply(self.key, b"second")
+        self.now[0] += 6.0
+        assert self.cache.sweep() == 0
+        assert self.cache.lookup(self.key) == b"second"
+
+    def test_shards_split_keys_and_capacity(self):
+        cache = dedup.ResponseCache(ttl=10.0, max_entries=64, shards=4)
+        keys = [dedup.DedupKey("10.0.0.1", p, 1, p, bytes([p]) * 16) for p in range(32)]
+        for key in keys:
+            cache.mark_in_flight(key)
+            cache.record_reply(key, b"r-%d" % key.src_port)
+
+        assert cache.shards == 4
+        assert len(cache) == 32
+        assert all(cache.lookup(k) == b"r-%d" % k.src_port for k in keys)
+        cache.clear()
+        assert len(cache) == 0
+        with pytest.raises(ValueError):
+            dedup.ResponseCache(shards=0)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        keys = [dedup.DedupKey("10.0.0.1", p, 1, p, bytes([p]) * 16) for p in range(4)]
+        probe = dedup.ResponseCache()
+        probe.record_reply(keys[0], b"x" * 1000)
+        entry_size = probe.stats().bytes_used
+
+        cache = dedup.ResponseCache(max_entries=100, max_bytes=3 * entry_size)
+        for key in keys:
+            cache.record_reply(key, b"x" * 1000)
+
+        stats = cache.stats()
+        assert stats.entries == 3
+        assert stats.bytes_used == 3 * entry_size
+        assert stats.evicted_bytes == 1
+        assert cache.lookup(keys[0]) is None
+
+    def test_reply_larger_than_budget_is_not_cached(self):
+        cache = dedup.ResponseCache(max_bytes=1000)
+        cache.mark_in_flight(self.key)
+        cache.record_reply(self.key, b"x" * 2000)
+        assert cache.lookup(self.key) is None
+        stats = cache.stats()
+        assert stats.rejected_oversize == 1
+        assert stats.bytes_used == 0
+        assert stats.in_flight == 0
+
+    def test_stats_count_hits_misses_and_evictions(self):
+        resends = []
+        dedup.consult_cache(self.cache, self.key, resends.append)
+        dedup.consult_cache(self.cache, self.key, resends.append)
+        self.cache.record_reply(self.key, b"reply")
+        dedup.consult_cache(self.cache, self.key, resends.append)
+        for p in range(2, 6):
+            self.cache.record_reply(dedup.DedupKey("10.0.0.1", p, 1, p, b"k" * 16), b"")
+        self.now[0] += 11.0
+        self.cache.sweep()
+
+        stats = self.cache.stats()
+        assert (stats.misses, stats.in_flight_drops, stats.hits) == (1, 1, 1)
+        assert stats.evicted_entries == 2
+        assert stats.expired == 3
+        assert (stats.entries, stats.bytes_used) == (0, 0)
+
+    def test_keys_are_packed(self):
+        v4 = dedup.pack_key(self.key)
+        v6 = dedup.pack_key(dedup.DedupKey("2001:db8::1", 1, 1, 1, b"a" * 16))
+        assert len(v4) == 5 + 4 + 16
+        assert len(v6) == 5 + 16 + 16
+        # Addresses that aren't IP literals still get distinct keys.
+        other = dedup.DedupKey("nas-a", 1, 1, 1, b"a" * 16)
+        assert dedup.pack_key(other) != v4
+
     def test_drop_in_flight_is_idempotent_and_noop_after_record(self):
         self.cache.mark_in_flight(self.key)
         self.cache.record_reply(self.key, b"reply")
@@ -117,6 +227,49 @@ class TestResponseCache:
         assert action is dedup.DispatchAction.RESENT
         assert resends == [b"cached"]
 
+    def test_reply_is_only_replayed_to_the_same_request(self):
+        self.cache.mark_in_flight(self.key, b"request")
+        self.cache.record_reply(self.key, b"reply")
+        assert self.cache.lookup(self.key, b"request") == b"reply"
+        assert self.cache.lookup(self.key, b"forged") is None
+        # The forgery doesn't evict the genuine entry.
+        assert self.cache.lookup(self.key, b"request") == b"reply"
+
+    def test_precheck_marks_nothing_in_flight(self):
+        resends = []
+        action = dedup.precheck_cache(self.cache, self.key, resends.append, b"req")
+        assert action is dedup.DispatchAction.PROCESS
+        assert self.cache.lookup(self.key) is None
+
+        dedup.consult_cache(self.cache, self.key, resends.append, b"req")
+        action = dedup.precheck_cache(self.cache, self.key, resends.append, b"req")
+        assert action is dedup.DispatchAction.DROP
+
+        self.cache.record_reply(self.key, b"cached")
+        action = dedup.precheck_cache(self.cache, self.key, resends.append, b"req")
+        assert action is dedup.DispatchAction.RESENT
+        assert resends == [b"cached"]
+
+    def test_lookup_or_mark_lets_one_thread_handle_a_request(self):
+        barrier = threading.Barrier(8)
+        results = []
+
+        def claim():
+            barrier.wait()
+            results.append(self.cache.lookup_or_mark(self.key, b"request"))
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results.count(None) == 1
+        assert results.count(dedup.IN_FLIGHT) == 7
+        self.cache.record_reply(self.key, b"reply")
+        assert self.cache.lookup_or_mark(self.key, b"request") == b"reply"
+        assert self.cache.stats().misses == 1
+
     def test_consult_cache_with_no_cache_is_passthrough(self):
         action = dedup.consult_cache(None, self.key, lambda _: None)
         assert action is dedup.DispatchAction.PROCESS
@@ -198,6 +351,46 @@ class TestSyncServerDedup:
 
         assert server.call_count == 2
 
+    def test_retransmitted_datagram_is_answered_before_decode(self, monkeypatch):
+        server = self._server()
+        fd = _CaptureFd()
+        source = ("10.0.0.1", 12345)
+        raw = _make_auth_packet(self.dictionary).raw_packet
+
+        server._handle_auth_packet(server._packet_from_datagram(fd, raw, source))
+        monkeypatch.setattr(server._router, "parse", MagicMock())
+
+        assert server._packet_from_datagram(fd, raw, source) is None
+        server._router.parse.assert_not_called()
+        assert server.call_count == 1
+        assert fd.sent[0] == fd.sent[1]
+
+    def test_forged_body_is_not_answered_from_cache(self):
+        server = self._server()
+        fd = _CaptureFd()
+        source = ("10.0.0.1", 12345)
+        raw = _make_auth_packet(self.dictionary).raw_packet
+        server._handle_auth_packet(server._packet_from_datagram(fd, raw, source))
+
+        forged = _make_auth_packet(self.dictionary)
+        forged.authenticator = raw[4:20]
+        forged["Test-String"] = "forged"
+        forged_raw = forged.request_packet()
+        assert forged_raw[:2] == raw[:2] and forged_raw[4:20] == raw[4:20]
+
+        assert server._packet_from_datagram(fd, forged_raw, source) is not None
+        assert len(fd.sent) == 1
+
+    def test_sweep_runs_once_per_interval(self, monkeypatch):
+        server = self._server(dedup_sweep_interval=60.0)
+        sweep = MagicMock()
+        monkeypatch.setattr(server._router, "dedup_sweep", sweep)
+        assert server._poll_timeout() == 60000
+
+        server._sweep_dedup_cache()
+        server._sweep_dedup_cache()
+        assert sweep.call_count == 1
+
     def test_dedup_disabled_runs_handler_every_time(self):
         server = self._server(dedup_enabled=False)
         for _ in range(3):
@@ -282,6 +475,39 @@ class TestAsyncServerDedup:
         assert protocol.transport.sendto.call_count == 2
         assert first_bytes == second_bytes
 
+    async def test_sweeper_runs_while_transports_are_open(self, monkeypatch):
+        server = DummyServer(acct_port=0, dedup_sweep_interval=0.01)
+        sweep = MagicMock()
+        monkeypatch.setattr(server._router, "dedup_sweep", sweep)
+
+        await server.initialize_transports(enable_acct=True)
+        await asyncio.sleep(0.05)
+        await server.deinitialize_transports()
+
+        assert sweep.call_count >= 1
+        assert server._sweeper is None
+
+    def test_retransmission_is_not_decoded(self, monkeypatch):
+        server = DummyServer(
+            dictionary=self.dictionary,
+            hosts={"10.0.0.1": self.remote_host},
+            require_message_authenticator=False,
+        )
+        protocol = self._protocol_for(server)
+        data = self._request_bytes()
+        addr = ("10.0.0.1", 12345)
+
+        def _reply(protocol, pkt, addr):
+            protocol.send_response(server.create_reply_packet(pkt), addr)
+
+        monkeypatch.setattr(server, "handle_auth_packet", _reply)
+        protocol.datagram_received(data, addr)
+        monkeypatch.setattr(server._router, "parse", MagicMock())
+        protocol.datagram_received(data, addr)
+
+        server._router.parse.assert_not_called()
+        assert protocol.transport.sendto.call_count == 2
+
     def test_dedup_disabled_runs_handler_every_time(self):
         call_count = [0]
 
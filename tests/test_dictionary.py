@@ -482,3 +482,64 @@ class TestParseErrorMetadata:
         # signature must reject it so future drift is impossible.
         with pytest.raises(TypeError):
             ParseError("oops", name="ignored")  # type: ignore[call-arg]
+
+
+class TestAttributeCodecs:
+    """Compiled per-attribute codec descriptors."""
+
+    def test_storage_keys_and_containers(self, full_dictionary):
+        codecs = full_dictionary.codecs
+        assert codecs["Test-String"].key == 1
+        assert codecs["Simplon-Number"].key == (16, 1)
+        assert codecs["Test-Tlv"].container == "tlv"
+        assert codecs["Test-String"].container is None
+
+        tlv_str = codecs["Test-Tlv-Str"]
+        assert tlv_str.nested is True
+        assert tlv_str.key == 1
+        assert tlv_str.storage_path == (4,)
+        assert [p.name for p in tlv_str.parents] == ["Test-Tlv"]
+        assert codecs["Simplon-Tlv-Int"].storage_path == ((16, 3),)
+
+    def test_indexed_by_attrindex_key(self, full_dictionary):
+        by_key = full_dictionary.codecs_by_key
+        assert by_key[4].name == "Test-Tlv"
+        assert by_key[(4, 1)].name == "Test-Tlv-Str"
+        assert by_key[(16, 1)].name == "Simplon-Number"
+        assert 99 not in by_key
+
+    def test_bound_value_codecs(self, full_dictionary):
+        codec = full_dictionary.codecs["Test-Integer"]
+        assert codec.encode(10) == b"\x00\x00\x00\x0a"
+        assert codec.decode(b"\x00\x00\x00\x0a") == 10
+        assert codec.wire_size == 4
+        assert full_dictionary.codecs["Test-String"].wire_size is None
+        with pytest.raises(ValueError, match="Unknown attribute type tlv"):
+            full_dictionary.codecs["Test-Tlv"].encode(b"")
+
+    def test_codecs_are_frozen(self, full_dictionary):
+        with pytest.raises(AttributeError):
+            full_dictionary.codecs["Test-String"].key = 2  # type: ignore[misc]
+
+    def test_evs_key(self):
+        d = Dictionary(
+            StringIO(
+                "ATTRIBUTE Extended-Attribute-1 241 extended\n"
+                "ATTRIBUTE Extended-Vendor-Specific-1 241.26 evs\n"
+                "VENDOR Example 12345\n"
+                "BEGIN-VENDOR Example parent=Extended-Vendor-Specific-1\n"
+                "ATTRIBUTE Example-Attr-1 1 string\n"
+                "END-VENDOR Example\n"
+            )
+        )
+        codec = d.codecs["Example-Attr-1"]
+        assert codec.key == (241, 26, 12345, 1)
+        assert codec.nested is False
+        assert d.codecs_by_key[(241, 26, 12345, 1)] is codec
+
+    def test_reading_more_files_reuses_existing_codecs(self):
+        d = Dictionary(StringIO("ATTRIBUTE First 1 string\n"))
+        first = d.codecs["First"]
+        d.read_dictionary(StringIO("ATTRIBUTE Second 2 integer\n"))
+        assert d.codecs["First"] is first
+        assert d.codecs_by_key[2].name == "Second"
@@ -0,0 +1,310 @@
+import asyncio
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pyrad2 import client_async, packet
+from pyrad2.client_async import DatagramProtocolClient
+from pyrad2.constants import PacketType
+from pyrad2.exceptions import ServerPacketError
+from pyrad2.metrics import LATENCY_BUCKETS, DropReason, Metrics, stats_samples
+from pyrad2.scheduler import QueueStats
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+
+from .base import DummyServer
+from .test_radsec_client import _make_client as _make_radsec_client
+
+AUTH, ACCT = ServerType.Auth, ServerType.Acct
+HOSTS = {"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")}
+ADDR = ("10.0.0.1", 4000)
+
+
+def _values(snapshot, name):
+    return {
+        tuple(sorted(sample["labels"].items())): sample.get(
+            "value", sample.get("count")
+        )
+        for sample in snapshot.get(name, ())
+    }
+
+
+class TestMetrics:
+    def test_counters_and_histograms(self):
+        metrics = Metrics()
+        metrics.request("auth", PacketType.AccessRequest, "nas")
+        metrics.request("auth", PacketType.AccessRequest, "nas")
+        metrics.drop(DropReason.SHED)
+        metrics.handled(PacketType.AccessRequest, 0.00015)
+        metrics.handled(PacketType.AccessRequest, 100.0)
+
+        snapshot = metrics.snapshot()
+        requests = snapshot["pyrad2_requests_total"]
+        assert requests == [
+            {
+                "labels": {"listener": "auth", "code": "AccessRequest", "nas": "nas"},
+                "value": 2,
+            }
+        ]
+        assert snapshot["pyrad2_drops_total"][0]["labels"] == {"reason": "shed"}
+
+        (handled,) = snapshot["pyrad2_handler_seconds"]
+        assert handled["count"] == 2
+        assert handled["sum"] == pytest.approx(100.00015)
+        buckets = handled["buckets"]
+        assert buckets["0.0001"] == 0
+        assert buckets["0.0002"] == 1
+        assert buckets[f"{LATENCY_BUCKETS[-1]:g}"] == 1
+        assert buckets["+Inf"] == 2
+
+    def test_prometheus_text(self):
+        metrics = Metrics(prefix="radius")
+        metrics.request("acct", PacketType.AccountingRequest, 'a"b')
+        metrics.handled(PacketType.AccountingRequest, 0.001)
+
+        text = metrics.prometheus()
+        assert "# TYPE radius_requests_total counter\n" in text
+        assert (
+            'radius_requests_total{listener="acct",code="AccountingRequest",'
+            'nas="a\\"b"} 1\n'
+        ) in text
+        assert "# TYPE radius_handler_seconds histogram\n" in text
+        assert (
+            'radius_handler_seconds_bucket{code="AccountingRequest",le="+Inf"} 1\n'
+        ) in text
+        assert 'radius_handler_seconds_count{code="AccountingRequest"} 1\n' in text
+        assert "radius_drops_total" not in text
+        assert Metrics().prometheus() == ""
+
+    def test_unknown_codes_are_numbered(self):
+        metrics = Metrics()
+        metrics.client_request("10.0.0.1", 99)
+        labels = metrics.snapshot()["pyrad2_client_requests_total"][0]["labels"]
+        assert labels == {"server": "10.0.0.1", "code": "99"}
+
+    def test_threads_record_into_their_own_tables(self):
+        metrics = Metrics()
+
+        def record():
+            for _ in range(1000):
+                metrics.drop(DropReason.DUPLICATE)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert metrics.snapshot()["pyrad2_drops_total"][0]["value"] == 4000
+
+    def test_collectors_are_summed(self):
+        metrics = Metrics()
+        stats = QueueStats(
+            depth=2, queued=5, dispatched=3, dropped=0, wait_total=0.5, wait_max=0.25
+        )
+        labels = (("listener", "auth"),)
+        for _ in range(2):
+            metrics.add_collector(
+                lambda: stats_samples("queue", stats, ("queued",), labels)
+            )
+
+        snapshot = metrics.snapshot()
+        assert snapshot["pyrad2_queue_depth"] == [
+            {"labels": {"listener": "auth"}, "value": 4.0}
+        ]
+        assert snapshot["pyrad2_queue_queued_total"][0]["value"] == 10.0
+        text = metrics.prometheus()
+        assert "# TYPE pyrad2_queue_queued_total counter\n" in text
+        assert 'pyrad2_queue_wait_max{listener="auth"} 0.5\n' in text
+
+
+class _Fd:
+    def __init__(self, datagrams):
+        self.datagrams = list(datagrams)
+        self.sent = []
+
+    def recvfrom(self, size):
+        return self.datagrams.pop(0)
+
+    def sendto(self, data, target):
+        self.sent.append((data, target))
+
+
+class TestSyncServerMetrics:
+    def test_requests_drops_and_handler_time(self, full_dictionary):
+        metrics = Metrics()
+        server = Server(
+            hosts=HOSTS,
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            metrics=metrics,
+        )
+
+        def handle(pkt):
+            server.send_reply_packet(pkt.fd, server.create_reply_packet(pkt))
+
+        server.handle_auth_packet = handle
+        request = packet.AuthPacket(
+            id=1, secret=b"secret", dict=full_dictionary
+        ).request_packet()
+        fd = _Fd([(request, ADDR), (request, ADDR), (request, ("10.9.9.9", 1))])
+
+        pkt = server._grab_packet(fd, AUTH)
+        server._dispatch(pkt, server._handle_auth_packet)
+        # The NAS retransmits; the cached reply is resent.
+        assert server._grab_packet(fd, AUTH) is None
+        with pytest.raises(ServerPacketError):
+            server._grab_packet(fd, AUTH)
+
+        snapshot = metrics.snapshot()
+        assert _values(snapshot, "pyrad2_requests_total") == {
+            (("code", "AccessRequest"), ("listener", "auth"), ("nas", "nas")): 2
+        }
+        assert _values(snapshot, "pyrad2_drops_total") == {
+            (("reason", "resent"),): 1,
+            (("reason", "unknown_host"),): 1,
+        }
+        assert _values(snapshot, "pyrad2_handler_seconds") == {
+            (("code", "AccessRequest"),): 1
+        }
+        assert snapshot["pyrad2_dedup_hits_total"][0]["value"] == 1.0
+
+    def test_without_metrics_nothing_is_recorded(self, full_dictionary):
+        server = Server(hosts=HOSTS, dict=full_dictionary)
+        assert server._router.start_timer() is None
+
+
+class TestAsyncServerMetrics:
+    async def test_requests_and_handler_time(self, full_dictionary):
+        metrics = Metrics()
+        server = DummyServer(
+            dictionary=full_dictionary,
+            hosts=HOSTS,
+            require_message_authenticator=False,
+            metrics=metrics,
+        )
+        protocol = DatagramProtocolServer(
+            ip="10.0.0.2",
+            port=1813,
+            server=server,
+            server_type=ACCT,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        protocol.transport = MagicMock()
+
+        request = packet.AcctPacket(
+            id=1, secret=b"secret", dict=full_dictionary
+        ).request_packet()
+        protocol.datagram_received(request, ADDR)
+        protocol.datagram_received(request, ("10.9.9.9", 1))
+        await asyncio.sleep(0)
+
+        snapshot = metrics.snapshot()
+        assert _values(snapshot, "pyrad2_requests_total") == {
+            (("code", "AccountingRequest"), ("listener", "acct"), ("nas", "nas")): 1
+        }
+        assert _values(snapshot, "pyrad2_drops_total") == {
+            (("reason", "unknown_host"),): 1
+        }
+        assert _values(snapshot, "pyrad2_handler_seconds") == {
+            (("code", "AccountingRequest"),): 1
+        }
+
+
+class TestClientMetrics:
+    def _protocol(self, metrics):
+        client = MagicMock()
+        client.metrics = metrics
+        client.dict = None
+        client.enforce_ma = False
+        protocol = DatagramProtocolClient(
+            server="127.0.0.1", port=1812, client=client, retries=1, timeout=0.01
+        )
+        protocol.transport = MagicMock()
+        return protocol
+
+    def test_reply_is_timed(self):
+        async def scenario():
+            metrics = Metrics()
+            protocol = self._protocol(metrics)
+            pkt = MagicMock()
+            pkt.id = 9
+            pkt.code = PacketType.AccessRequest
+            pkt.verify_reply.return_value = True
+            future = asyncio.get_running_loop().create_future()
+            protocol.pending_requests[9] = {
+                "packet": pkt,
+                "creation_date": datetime.now(),
+                "retries": 0,
+                "future": future,
+                "send_date": datetime.now(),
+            }
+            with patch.object(client_async, "Packet") as reply_class:
+                reply_class.return_value.id = 9
+                reply_class.return_value.code = PacketType.AccessAccept
+                protocol.datagram_received(b"\x02\x09\x00\x14" + b"\x00" * 16, None)
+            return metrics.snapshot()
+
+        snapshot = asyncio.run(scenario())
+        assert _values(snapshot, "pyrad2_client_seconds") == {
+            (("code", "AccessRequest"), ("server", "127.0.0.1")): 1
+        }
+
+    def test_retransmits_and_timeouts(self):
+        async def scenario():
+            metrics = Metrics()
+            protocol = self._protocol(metrics)
+            pkt = MagicMock()
+            pkt.id = 3
+            pkt.code = PacketType.AccountingRequest
+            future = asyncio.get_running_loop().create_future()
+            protocol.pending_requests[3] = {
+                "packet": pkt,
+                "creation_date": datetime.now(),
+                "retries": 0,
+                "future": future,
+                "send_date": datetime.now(),
+            }
+            task = asyncio.ensure_future(protocol.__timeout_handler__())
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+                if future.done():
+                    break
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return metrics.snapshot()
+
+        snapshot = asyncio.run(scenario())
+        labels = (("code", "AccountingRequest"), ("server", "127.0.0.1"))
+        assert _values(snapshot, "pyrad2_client_retransmits_total") == {labels: 1}
+        assert _values(snapshot, "pyrad2_client_timeouts_total") == {labels: 1}
+
+    async def test_radsec_client_attempts(self):
+        metrics = Metrics()
+        client = _make_radsec_client(metrics=metrics, retries=3)
+        request = MagicMock(code=PacketType.AccessRequest)
+        reply = object()
+        attempts = iter([asyncio.IncompleteReadError(b"", 4), reply])
+
+        async def send_once(_pkt):
+            result = next(attempts)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with patch.object(client, "_send_packet_once", side_effect=send_once):
+            assert await client._send_packet(request) is reply
+        with patch.object(
+            client, "_send_packet_once", side_effect=ConnectionError("refused")
+        ):
+            assert await client._send_packet(request) is None
+
+        snapshot = metrics.snapshot()
+        labels = (("code", "AccessRequest"), ("server", "127.0.0.1"))
+        assert _values(snapshot, "pyrad2_client_requests_total") == {labels: 2}
+        assert _values(snapshot, "pyrad2_client_retransmits_total") == {labels: 3}
+        assert _values(snapshot, "pyrad2_client_timeouts_total") == {labels: 1}
+        assert _values(snapshot, "pyrad2_client_seconds") == {labels: 1}
@@ -0,0 +1,296 @@
+import asyncio
+import concurrent.futures
+import os
+import pickle
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import offload, packet
+from pyrad2.constants import PacketType
+from pyrad2.exceptions import PacketError
+from pyrad2.metrics import DropReason, Metrics
+from pyrad2.radsec.server import RadSecServer, verify_request
+from pyrad2.server import RemoteHost
+from pyrad2.server_async import DatagramProtocolServer, ServerAsync, ServerType
+
+from .base import TEST_ROOT_PATH
+
+FULL_DICTIONARY = os.path.join(TEST_ROOT_PATH, "data/full")
+
+
+# Worker handlers must be importable by reference from the pool.
+def acknowledge(pkt):
+    reply = pkt.create_reply()
+    reply.code = PacketType.AccountingResponse
+    reply["Test-String"] = f"worker-{os.getpid()}"
+    return reply
+
+
+def ignore(pkt):
+    return None
+
+
+class BrokenExecutor(concurrent.futures.Executor):
+    """Fails every job, as a process pool whose worker died does."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = concurrent.futures.Future()
+        future.set_exception(BrokenProcessPool("died"))
+        return future
+
+
+class AcctServer(ServerAsync):
+    def handle_auth_packet(self, protocol, pkt, addr):
+        pass
+
+    def handle_acct_packet(self, protocol, pkt, addr):
+        raise AssertionError("accounting should run in the executor")
+
+
+class OffloadRadSecServer(RadSecServer):
+    async def handle_access_request(self, packet):
+        raise AssertionError("unused")
+
+    async def handle_accounting(self, packet):
+        raise AssertionError("accounting should run in the executor")
+
+
+@pytest.fixture(scope="module")
+def executor():
+    pool = offload.create_executor(FULL_DICTIONARY, max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+class TestProcessRequest:
+    @pytest.fixture(autouse=True)
+    def _worker(self, full_dictionary):
+        self.dict = full_dictionary
+        offload.init_worker(FULL_DICTIONARY)
+        yield
+        offload.init_worker()
+
+    def _request(self):
+        req = packet.AcctPacket(id=7, secret=b"secret", dict=self.dict)
+        return req, req.request_packet()
+
+    def test_returns_encoded_reply(self):
+        req, raw = self._request()
+        rawreply = offload.process_request(
+            acknowledge, raw, b"secret", offload.RequestPolicy()
+        )
+        reply = req.create_reply(packet=rawreply)
+        assert req.verify_reply(reply, rawreply)
+        assert reply["Test-String"] == [f"worker-{os.getpid()}"]
+
+    def test_verification_failure_raises(self):
+        _, raw = self._request()
+        with pytest.raises(PacketError):
+            offload.process_request(acknowledge, raw, b"wrong", offload.RequestPolicy())
+        policy = offload.RequestPolicy(verify=False)
+        assert offload.process_request(acknowledge, raw, b"wrong", policy)
+
+    def test_failures_carry_their_drop_reason(self):
+        _, raw = self._request()
+        policy = offload.RequestPolicy()
+        with pytest.raises(offload.DroppedRequest) as info:
+            offload.process_request(acknowledge, raw, b"wrong", policy)
+        assert info.value.reason is DropReason.BAD_AUTHENTICATOR
+
+        copy = pickle.loads(pickle.dumps(info.value))
+        assert copy.reason is DropReason.BAD_AUTHENTICATOR
+        assert str(copy) == "Packet verification failed"
+
+        with pytest.raises(offload.DroppedRequest) as info:
+            offload.process_request(acknowledge, raw[:19], b"secret", policy)
+        assert info.value.reason is DropReason.MALFORMED
+
+    def test_verifier_replaces_router_checks(self):
+        status = packet.StatusPacket(secret=b"secret", dict=self.dict)
+        raw = status.request_packet()
+        # The router leaves Status-Server to the MA policy; RadSec's
+        # verifier checks its authenticator like any other code.
+        with pytest.raises(offload.DroppedRequest) as info:
+            offload.process_request(ignore, raw, b"wrong", offload.RequestPolicy())
+        assert info.value.reason is DropReason.MESSAGE_AUTHENTICATOR
+        policy = offload.RequestPolicy(verifier=verify_request)
+        with pytest.raises(offload.DroppedRequest) as info:
+            offload.process_request(ignore, raw, b"wrong", policy)
+        assert info.value.reason is DropReason.BAD_AUTHENTICATOR
+        assert offload.process_request(ignore, raw, b"secret", policy) is None
+
+    def test_handler_may_send_nothing(self):
+        _, raw = self._request()
+        assert (
+            offload.process_request(ignore, raw, b"secret", offload.RequestPolicy())
+            is None
+        )
+
+
+class TestServerAsyncOffload:
+    async def test_reply_comes_from_worker_and_is_cached(
+        self, executor, full_dictionary
+    ):
+        server = AcctServer(
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"secret", "nas")},
+            executor=executor,
+            worker_handlers={PacketType.AccountingRequest: acknowledge},
+        )
+        protocol = DatagramProtocolServer(
+            ip="127.0.0.1",
+            port=1813,
+            server=server,
+            server_type=ServerType.Acct,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        transport = MagicMock()
+        protocol.connection_made(transport)
+        req = packet.AcctPacket(id=3, secret=b"secret", dict=full_dictionary)
+        raw = req.request_packet()
+        addr = ("127.0.0.1", 5000)
+
+        protocol.datagram_received(raw, addr)
+        # Retransmission while the worker runs: dropped on the loop.
+        protocol.datagram_received(raw, addr)
+        assert len(protocol.handler_tasks) == 1
+        await asyncio.gather(*protocol.handler_tasks)
+
+        rawreply = transport.sendto.call_args.args[0]
+        reply = req.create_reply(packet=rawreply)
+        assert req.verify_reply(reply, rawreply)
+        assert reply["Test-String"] != [f"worker-{os.getpid()}"]
+
+        protocol.datagram_received(raw, addr)
+        assert not protocol.handler_tasks
+        assert transport.sendto.call_count == 2
+        assert transport.sendto.call_args.args[0] == rawreply
+
+    async def test_worker_drops_are_counted(self, executor, full_dictionary):
+        metrics = Metrics()
+        server = AcctServer(
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"wrong", "nas")},
+            executor=executor,
+            worker_handlers={PacketType.AccountingRequest: acknowledge},
+            metrics=metrics,
+        )
+        protocol = DatagramProtocolServer(
+            ip="127.0.0.1",
+            port=1813,
+            server=server,
+            server_type=ServerType.Acct,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        protocol.connection_made(MagicMock())
+        req = packet.AcctPacket(id=3, secret=b"secret", dict=full_dictionary)
+
+        protocol.datagram_received(req.request_packet(), ("127.0.0.1", 5000))
+        await asyncio.gather(*protocol.handler_tasks)
+
+        (drop,) = metrics.snapshot()["pyrad2_drops_total"]
+        assert drop == {"labels": {"reason": "bad_authenticator"}, "value": 1}
+
+    async def test_worker_failures_are_counted_and_timed(self, full_dictionary):
+        metrics = Metrics()
+        server = AcctServer(
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"secret", "nas")},
+            executor=BrokenExecutor(),
+            worker_handlers={PacketType.AccountingRequest: acknowledge},
+            metrics=metrics,
+        )
+        protocol = DatagramProtocolServer(
+            ip="127.0.0.1",
+            port=1813,
+            server=server,
+            server_type=ServerType.Acct,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+        )
+        protocol.connection_made(MagicMock())
+        req = packet.AcctPacket(id=3, secret=b"secret", dict=full_dictionary)
+
+        protocol.datagram_received(req.request_packet(), ("127.0.0.1", 5000))
+        await asyncio.gather(*protocol.handler_tasks)
+
+        snapshot = metrics.snapshot()
+        (drop,) = snapshot["pyrad2_drops_total"]
+        assert drop == {"labels": {"reason": "worker_failed"}, "value": 1}
+        (handled,) = snapshot["pyrad2_handler_seconds"]
+        assert handled["count"] == 1
+        assert server.dedup_stats().in_flight == 0
+
+    def test_without_executor_handlers_run_in_loop(self):
+        server = AcctServer(worker_handlers={PacketType.AccountingRequest: acknowledge})
+        assert server.worker_handler_for(PacketType.AccountingRequest) is None
+
+
+class TestRadSecOffload:
+    async def test_reply_comes_from_worker(self, executor, full_dictionary):
+        server = OffloadRadSecServer(
+            certfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.cert.pem"),
+            keyfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.key.pem"),
+            ca_certfile=os.path.join(TEST_ROOT_PATH, "certs/ca/ca.cert.pem"),
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"radsec", "nas")},
+            verify_packet=True,
+            executor=executor,
+            worker_handlers={PacketType.AccountingRequest: acknowledge},
+        )
+        req = packet.AcctPacket(id=4, secret=b"radsec", dict=full_dictionary)
+
+        rawreply = await server._reply_bytes(req.request_packet(), "127.0.0.1")
+
+        reply = req.create_reply(packet=rawreply)
+        assert req.verify_reply(reply, rawreply)
+        assert reply.code == PacketType.AccountingResponse
+
+    async def test_worker_uses_radsec_verifier(self, executor, full_dictionary):
+        metrics = Metrics()
+        server = OffloadRadSecServer(
+            certfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.cert.pem"),
+            keyfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.key.pem"),
+            ca_certfile=os.path.join(TEST_ROOT_PATH, "certs/ca/ca.cert.pem"),
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"wrong", "nas")},
+            verify_packet=True,
+            require_message_authenticator=False,
+            executor=executor,
+            worker_handlers={PacketType.StatusServer: ignore},
+            metrics=metrics,
+        )
+        status = packet.StatusPacket(secret=b"radsec", dict=full_dictionary)
+
+        with pytest.raises(offload.DroppedRequest):
+            await server._reply_bytes(status.request_packet(), "127.0.0.1")
+
+        (drop,) = metrics.snapshot()["pyrad2_drops_total"]
+        assert drop == {"labels": {"reason": "bad_authenticator"}, "value": 1}
+
+    async def test_worker_failures_are_counted_and_timed(self, full_dictionary):
+        metrics = Metrics()
+        server = OffloadRadSecServer(
+            certfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.cert.pem"),
+            keyfile=os.path.join(TEST_ROOT_PATH, "certs/server/server.key.pem"),
+            ca_certfile=os.path.join(TEST_ROOT_PATH, "certs/ca/ca.cert.pem"),
+            dictionary=full_dictionary,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"radsec", "nas")},
+            executor=BrokenExecutor(),
+            worker_handlers={PacketType.AccountingRequest: acknowledge},
+            metrics=metrics,
+        )
+        req = packet.AcctPacket(id=4, secret=b"radsec", dict=full_dictionary)
+
+        with pytest.raises(BrokenProcessPool):
+            await server._reply_bytes(req.request_packet(), "127.0.0.1")
+
+        snapshot = metrics.snapshot()
+        (drop,) = snapshot["pyrad2_drops_total"]
+        assert drop == {"labels": {"reason": "worker_failed"}, "value": 1}
+        (handled,) = snapshot["pyrad2_handler_seconds"]
+        assert handled["count"] == 1
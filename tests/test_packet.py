@@ -408,6 +408,103 @@ class TestPacket:
             == b"\x01\x07value\x1a\x0d\x00\x00\x00\x10\x02\x07value"
         )
 
+    def testEncodeAttributesIntoAppendsToBuffer(self):
+        self.packet[1] = [b"value"]
+        self.packet[(16, 2)] = [b"value"]
+        buffer = bytearray(b"head")
+        written = self.packet.encode_attributes_into(buffer)
+        expected = self.packet._pkt_encode_attributes()
+        assert written == len(expected)
+        assert buffer == b"head" + expected
+
+    def _count_encodes(self, monkeypatch, pkt):
+        calls = []
+        original = pkt._pkt_write_attributes
+
+        def counting(out):
+            calls.append(1)
+            return original(out)
+
+        monkeypatch.setattr(pkt, "_pkt_write_attributes", counting)
+        return calls
+
+    def testEncodedAttributesAreCachedUntilChanged(self, monkeypatch):
+        calls = self._count_encodes(monkeypatch, self.packet)
+        self.packet[1] = [b"value"]
+        first = self.packet._pkt_encode_attributes()
+        assert self.packet._pkt_encode_attributes() == first
+        assert len(calls) == 1
+
+        self.packet["Test-Integer"] = 1
+        assert self.packet._pkt_encode_attributes() != first
+        del self.packet["Test-Integer"]
+        assert self.packet._pkt_encode_attributes() == first
+        self.packet.add_attribute("Test-String", "two")
+        self.packet._pkt_encode_attributes()
+        assert len(calls) == 4
+
+    def testOrderedDictMutatorsDropCachedEncoding(self):
+        self.packet[1] = [b"one"]
+        self.packet["Test-Integer"] = 1
+        both = self.packet._pkt_encode_attributes()
+
+        assert self.packet.pop(3) == [b"\x00\x00\x00\x01"]
+        assert self.packet._pkt_encode_attributes() == b"\x01\x05one"
+        assert self.packet.pop(3, None) is None
+        self.packet.setdefault("Test-Integer", 1)
+        assert self.packet._pkt_encode_attributes() == both
+        self.packet.move_to_end(1)
+        assert self.packet._pkt_encode_attributes() != both
+        self.packet.popitem()
+        assert self.packet._pkt_encode_attributes() == b"\x03\x06\x00\x00\x00\x01"
+        self.packet.popitem()
+        assert self.packet._pkt_encode_attributes() == b""
+
+    def testValuesChangedInPlaceAreEncoded(self):
+        self.packet[1] = [b"one"]
+        self.packet._pkt_encode_attributes()
+        self.packet[1].append(b"two")
+        assert self.packet._pkt_encode_attributes() == b"\x01\x05one\x01\x05two"
+
+        for values in self.packet.values():
+            values.append(b"3")
+        assert self.packet._pkt_encode_attributes().endswith(b"\x01\x033")
+        for _, values in self.packet.items():
+            values.clear()
+        assert self.packet._pkt_encode_attributes() == b""
+
+        # Decoded values are copies; changing them leaves the packet as is.
+        self.packet["Test-String"] = "one"
+        self.packet["Test-String"].append("two")
+        assert self.packet["Test-String"] == ["one"]
+
+    def testSignedReplyEncodesAttributesOnce(self, monkeypatch):
+        reply = self.packet.create_reply(**{"Test-String": "test"})
+        reply.code = PacketType.AccessAccept
+        reply.add_message_authenticator()
+        calls = self._count_encodes(monkeypatch, reply)
+
+        raw = reply.reply_packet()
+        assert reply.reply_packet() == raw
+        assert self.packet.verify_reply(reply, raw)
+        assert len(calls) == 1
+
+    def testSignedReplyMessageAuthenticatorCoversZeroedPacket(self):
+        reply = self.packet.create_reply(**{"Test-String": "test"})
+        reply.code = PacketType.AccessAccept
+        reply.add_message_authenticator()
+        raw = reply.reply_packet()
+
+        offset = raw.index(b"\x50\x12") + 2
+        zeroed = raw[:offset] + 16 * b"\x00" + raw[offset + 16 :]
+        expected = hmac.new(
+            b"secret",
+            zeroed[:4] + self.packet.authenticator + zeroed[20:],
+            hashlib.md5,
+        ).digest()
+        assert raw[offset : offset + 16] == expected
+        assert reply["Message-Authenticator"] == [expected]
+
     def testPktDecodeVendorAttribute(self):
         decode = self.packet._pkt_decode_vendor_attribute
 
@@ -542,6 +639,90 @@ class TestPacket:
         self.packet.decode_packet(b"\x01\x02\x00\x1b1234567890123456\x1a\x07value")
         assert self.packet[26] == [b"value"]
 
+    def testDecodePacketFromBufferStoresBytes(self):
+        raw = (
+            b"\x01\x02\x00\x2e1234567890123456"
+            b"\x01\x05one\x04\x09\x01\x07value\x1a\x0c\x00\x00\x00\x10\x01\x06abcd"
+        )
+        for buffer in (bytearray(raw), memoryview(raw)):
+            self.packet.decode_packet(buffer)
+            assert self.packet[1] == [b"one"]
+            assert self.packet[4] == {1: [b"value"]}
+            assert self.packet[(16, 1)] == [b"abcd"]
+            # Values are copied out of the datagram view, never aliased.
+            assert type(self.packet[1][0]) is bytes
+            assert type(self.packet[4][1][0]) is bytes
+            assert type(self.packet[(16, 1)][0]) is bytes
+
+    def testDecodePacketWithManyAttributes(self):
+        count = (8192 - 20) // 6
+        attributes = b"".join(struct.pack("!BBI", 9, 6, i) for i in range(count))
+        raw = struct.pack("!BBH16s", 1, 2, 20 + len(attributes), 16 * b"A")
+        self.packet.decode_packet(raw + attributes)
+        assert len(self.packet[9]) == count
+        assert self.packet[9][-1] == struct.pack("!I", count - 1)
+
+    def testLazyDecodeOnlyIndexes(self):
+        raw = (
+            b"\x01\x02\x00\x2e1234567890123456"
+            b"\x01\x05one\x04\x09\x01\x07value\x1a\x0c\x00\x00\x00\x10\x01\x06abcd"
+        )
+        self.packet.decode_packet(raw, lazy=True)
+        assert OrderedDict.__len__(self.packet) == 0
+        assert self.packet._lazy_index == [(1, 20, 5), (4, 25, 9), (26, 34, 12)]
+
+        assert self.packet[(16, 1)] == [b"abcd"]
+        assert list(OrderedDict.keys(self.packet)) == [(16, 1)]
+        assert "Test-Tlv" in self.packet
+        assert list(OrderedDict.keys(self.packet)) == [(16, 1), 4]
+
+    def testLazyDecodeMatchesEager(self):
+        raw = (
+            b"\x01\x02\x00\x2e1234567890123456"
+            b"\x01\x05one\x04\x09\x01\x07value\x1a\x0c\x00\x00\x00\x10\x01\x06abcd"
+        )
+        eager = packet.Packet(dict=self.dict, packet=raw)
+        lazy = packet.Packet(dict=self.dict, packet=raw, lazy=True)
+        # Touch a key out of wire order; iteration still follows the wire.
+        assert lazy["Test-Tlv"] == {"Test-Tlv-Str": ["value"]}
+        assert list(lazy.items()) == list(eager.items())
+        assert lazy._pkt_encode_attributes() == eager._pkt_encode_attributes()
+
+    def testLazyDecodeComparesEqualToEager(self):
+        raw = (
+            b"\x01\x02\x00\x2e1234567890123456"
+            b"\x01\x05one\x04\x09\x01\x07value\x1a\x0c\x00\x00\x00\x10\x01\x06abcd"
+        )
+        eager = packet.Packet(dict=self.dict, packet=raw)
+        assert packet.Packet(dict=self.dict, packet=raw, lazy=True) == eager
+        assert eager == packet.Packet(dict=self.dict, packet=raw, lazy=True)
+        assert not packet.Packet(dict=self.dict, packet=raw, lazy=True) != eager
+        assert repr(packet.Packet(dict=self.dict, packet=raw, lazy=True)) == repr(eager)
+
+    def testLazyDecodeKeepsEditsOnFullMaterialization(self):
+        raw = (
+            b"\x01\x02\x00\x2e1234567890123456"
+            b"\x01\x05one\x04\x09\x01\x07value\x1a\x0c\x00\x00\x00\x10\x01\x06abcd"
+        )
+        self.packet.decode_packet(raw, lazy=True)
+        self.packet[1] = [b"two"]
+        del self.packet[(16, 1)]
+        self.packet.add_attribute("Test-Integer", 10)
+        assert self.packet.keys() == ["Test-String", "Test-Tlv", "Test-Integer"]
+        assert self.packet[1] == [b"two"]
+
+    def testLazyDecodeStillRejectsCorruptHeaders(self):
+        with pytest.raises(packet.PacketError):
+            self.packet.decode_packet(
+                b"\x01\x02\x00\x161234567890123456\x01\x01", lazy=True
+            )
+
+    def testLazyDecodeSetsMessageAuthenticatorFlag(self):
+        raw = b"\x01\x02\x00\x261234567890123456" + b"\x50\x12" + 16 * b"\x00"
+        self.packet.decode_packet(raw, lazy=True)
+        assert self.packet.message_authenticator is True
+        assert OrderedDict.__len__(self.packet) == 0
+
     def testEncodeKeyValues(self):
         assert self.packet._encode_key_values(1, "1234") == (1, "1234")
 
@@ -661,6 +842,203 @@ class TestAuthPacket:
         )
 
 
+class TestPacketSlots:
+    def testDecodedRequestHasNoInstanceDict(self, full_dictionary):
+        request = packet.AuthPacket(
+            secret=b"secret", dict=full_dictionary, **{"Test-String": "test"}
+        )
+        request.add_message_authenticator()
+        parsed = packet.parse_packet(
+            request.request_packet(), b"secret", full_dictionary
+        )
+        parsed.source = ["192.0.2.1", "1812"]
+        reply = parsed.create_reply()
+        assert vars(parsed) == {}
+        assert vars(reply) == {}
+
+    def testAdHocAttributesStillWork(self):
+        pkt = packet.Packet()
+        pkt.custom = "value"
+        assert vars(pkt) == {"custom": "value"}
+
+
+class TestPacketTemplate:
+    @pytest.fixture(autouse=True)
+    def _setup(self, full_dictionary):
+        self.dict = full_dictionary
+        self.request = packet.AuthPacket(
+            id=0, secret=b"secret", authenticator=b"01234567890ABCDEF", dict=self.dict
+        )
+        self.template = packet.PacketTemplate(
+            self.dict, Test_String="fixed", Test_Integer=10
+        )
+
+    def _writes(self, monkeypatch, pkt):
+        keys = []
+        original = pkt._pkt_write_avp_group
+
+        def recording(out, code, datalst):
+            keys.append(code)
+            original(out, code, datalst)
+
+        monkeypatch.setattr(pkt, "_pkt_write_avp_group", recording)
+        return keys
+
+    def testReplyMatchesPlainReply(self, monkeypatch):
+        reply = self.request.create_reply(template=self.template, Test_Octets=b"x")
+        plain = self.request.create_reply(
+            Test_String="fixed", Test_Integer=10, Test_Octets=b"x"
+        )
+        assert reply["Test-String"] == ["fixed"]
+        assert reply["Test-Octets"] == [b"x"]
+
+        writes = self._writes(monkeypatch, reply)
+        assert reply.reply_packet() == plain.reply_packet()
+        assert writes == [2]
+
+    def testPoppingTemplateAttributeDropsBlock(self):
+        reply = self.request.create_reply(template=self.template)
+        reply.reply_packet()
+        reply.pop(1)
+        plain = self.request.create_reply(Test_Integer=10)
+        assert reply.reply_packet() == plain.reply_packet()
+
+    def testSignedReplyMatchesPlainReply(self):
+        reply = self.request.create_reply(template=self.template)
+        reply.add_message_authenticator()
+        plain = self.request.create_reply(Test_String="fixed", Test_Integer=10)
+        plain.add_message_authenticator()
+        assert reply.reply_packet() == plain.reply_packet()
+
+    def testTouchingTemplateAttributeReencodes(self, monkeypatch):
+        reply = self.request.create_reply(template=self.template)
+        reply.add_attribute("Test-String", "more")
+        writes = self._writes(monkeypatch, reply)
+        plain = self.request.create_reply(Test_Integer=10)
+        plain["Test-String"] = ["fixed", "more"]
+        plain.move_to_end(3)
+        assert reply.reply_packet() == plain.reply_packet()
+        assert writes == [1, 3]
+
+    def testPacketsDoNotShareStorage(self):
+        first = self.request.create_reply(template=self.template)
+        first[1].append(b"changed")
+        second = self.request.create_reply(template=self.template)
+        assert second["Test-String"] == ["fixed"]
+
+    def testChangingTemplateValueInPlaceDropsBlock(self):
+        reply = self.request.create_reply(template=self.template)
+        reply.reply_packet()
+        reply[1].append(b"more")
+        plain = self.request.create_reply(Test_String="fixed", Test_Integer=10)
+        plain[1].append(b"more")
+        assert reply.reply_packet() == plain.reply_packet()
+
+    def testClientFactoryUsesTemplate(self):
+        client = Client(object(), secret=b"secret", dict=self.dict)
+        pkt = client.create_auth_packet(template=self.template, Test_Octets=b"x")
+        assert pkt["Test-Integer"] == [10]
+        assert pkt["Test-Octets"] == [b"x"]
+
+    def testRejectsPerPacketAttributes(self):
+        with pytest.raises(ValueError):
+            packet.PacketTemplate(self.dict, Test_Encrypted_String="secret")
+        with pytest.raises(ValueError):
+            packet.PacketTemplate(self.dict, Message_Authenticator=16 * b"\x00")
+
+    def testRejectsOtherDictionary(self, simple_dictionary):
+        with pytest.raises(ValueError):
+            packet.Packet(dict=simple_dictionary, template=self.template)
+
+
+class TestSecretContext:
+    def testMd5StartsFromSecretPrefix(self):
+        ctx = packet.SecretContext(b"secret")
+        assert ctx.md5(b"data") == hashlib.md5(b"secretdata").digest()
+        assert ctx.md5(b"data") == ctx.md5(b"data")
+
+    def testHmacIsFreshCopy(self):
+        ctx = packet.SecretContext(b"secret")
+        first = ctx.hmac()
+        first.update(b"data")
+        assert first.digest() == hmac.new(b"secret", b"data", hashlib.md5).digest()
+        assert ctx.hmac().digest() == hmac.new(b"secret", b"", hashlib.md5).digest()
+
+    def testPacketRebuildsContextWhenSecretChanges(self, full_dictionary):
+        ctx = packet.SecretContext(b"secret")
+        pkt = packet.AuthPacket(
+            secret=b"secret",
+            authenticator=b"01234567890ABCDEF",
+            secret_context=ctx,
+            dict=full_dictionary,
+        )
+        assert pkt.secret_context is ctx
+        assert pkt.create_reply().secret_context is ctx
+
+        pkt.secret = b"other"
+        assert pkt.secret_context is not ctx
+        assert pkt.secret_context.secret == b"other"
+        plain = packet.AuthPacket(
+            secret=b"other",
+            authenticator=b"01234567890ABCDEF",
+            dict=full_dictionary,
+        )
+        assert pkt.pw_crypt("Simplon") == plain.pw_crypt("Simplon")
+
+
+class TestParsePackets:
+    @pytest.fixture(autouse=True)
+    def _setup(self, full_dictionary):
+        self.dict = full_dictionary
+
+    def _acct_request(self, secret=b"secret"):
+        req = packet.AcctPacket(secret=secret, dict=self.dict, id=1)
+        return req.request_packet()
+
+    def _auth_request(self):
+        req = packet.AuthPacket(secret=b"secret", dict=self.dict, id=2)
+        req["Test-String"] = "alice"
+        req.add_message_authenticator()
+        return req.request_packet()
+
+    def testYieldsTypedPacketsInOrder(self):
+        batch = [self._acct_request(), self._auth_request()]
+        results = list(packet.parse_packets(batch, b"secret", self.dict))
+        assert [r.index for r in results] == [0, 1]
+        assert all(r.ok for r in results)
+        assert isinstance(results[0].packet, packet.AcctPacket)
+        assert isinstance(results[1].packet, packet.AuthPacket)
+        assert results[1].packet["Test-String"] == ["alice"]
+        assert results[0].packet.secret_context is results[1].packet.secret_context
+
+    def testErrorsDoNotStopTheBatch(self):
+        good = self._acct_request()
+        forged = good[:4] + b"\x00" * 16 + good[20:]
+        batch = [b"", b"\x04\x01\x00", forged, good]
+        results = list(packet.parse_packets(batch, b"secret", self.dict))
+        assert [r.ok for r in results] == [False, False, False, True]
+        assert all(isinstance(r.error, packet.PacketError) for r in results[:3])
+        assert results[2].data == forged
+        assert results[3].packet is not None
+
+    def testVerifyCanBeDisabled(self):
+        good = self._acct_request()
+        forged = good[:4] + b"\x00" * 16 + good[20:]
+        (result,) = packet.parse_packets([forged], b"secret", self.dict, verify=False)
+        assert result.ok
+
+    def testPerDatagramSecrets(self):
+        batch = [self._acct_request(b"one"), self._acct_request(b"two")]
+        results = list(packet.parse_packets(batch, [b"one", b"two"], self.dict))
+        assert all(r.ok for r in results)
+        results = list(packet.parse_packets(batch, [b"two", b"one"], self.dict))
+        assert not any(r.ok for r in results)
+
+    def testSecretsMustMatchDatagrams(self):
+        with pytest.raises(ValueError):
+            list(packet.parse_packets([b"", b""], [b"secret"], self.dict))
+
+
 class TestAuthPacketChap:
     @pytest.fixture(autouse=True)
     def _setup(self, chap_dictionary):
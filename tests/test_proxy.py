@@ -4,6 +4,7 @@ import socket
 import pytest
 
 from pyrad2.constants import PacketType
+from pyrad2.packet import Packet
 from pyrad2.proxy import Proxy
 from pyrad2.server import Server, ServerPacketError
 
@@ -81,7 +82,7 @@ class TestProcessInput:
         assert self.proxy.called == [("_process_input", (fd,), {})]
 
     def test_process_input(self):
-        MockClassMethod(Proxy, "_grab_packet")
+        MockClassMethod(Proxy, "_grab_packet", result=Packet())
         MockClassMethod(Proxy, "_handle_proxy_packet")
         self.proxy._process_input(self.proxy._proxyfd)
         assert [x[0] for x in self.proxy.called] == [
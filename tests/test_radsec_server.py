@@ -5,6 +5,7 @@ import struct
 
 import pytest
 
+from pyrad2.clients import ClientTable
 from pyrad2.constants import ErrorCause, PacketType
 from pyrad2.dictionary import Dictionary
 from pyrad2.exceptions import PacketError
@@ -386,6 +387,18 @@ class TestServer:
         with pytest.raises(UnknownHost):
             await self.server.packet_received({}, "4.4.4.4")
 
+    async def test_client_table_matches_network(self):
+        self.server.hosts = ClientTable({"127.0.0.0/8": TEST_HOST})
+        request = self.client.create_auth_packet(
+            code=PacketType.AccessRequest, User_Name="wichert"
+        )
+
+        reply = await self.server.packet_received(request.request_packet(), "127.0.0.9")
+
+        assert reply.code == PacketType.AccessAccept
+        with pytest.raises(UnknownHost):
+            await self.server.packet_received(request.request_packet(), "4.4.4.4")
+
     async def test_verify_packet_dispatches_auth_request_verifier(self):
         server = RadSecServer(
             certfile=SERVER_CERTFILE,
@@ -0,0 +1,223 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import packet
+from pyrad2.deadline import Deadlines
+from pyrad2.scheduler import Scheduler
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+
+from .base import DummyServer, encoded_request
+
+AUTH, ACCT = ServerType.Auth, ServerType.Acct
+
+
+class TestScheduler:
+    def setup_method(self):
+        self.now = [0.0]
+
+    def _scheduler(self, **kwargs):
+        return Scheduler(clock=lambda: self.now[0], **kwargs)
+
+    def _pop_all(self, scheduler):
+        items = []
+        while (item := scheduler.pop()) is not None:
+            items.append(item)
+        return items
+
+    def test_weighted_round_robin(self):
+        scheduler = self._scheduler(weights={AUTH: 3, ACCT: 1})
+        for i in range(4):
+            scheduler.push(ACCT, "nas", f"acct{i}")
+        for i in range(5):
+            scheduler.push(AUTH, "nas", f"auth{i}")
+
+        assert self._pop_all(scheduler) == [
+            "auth0",
+            "auth1",
+            "auth2",
+            "acct0",
+            "auth3",
+            "auth4",
+            "acct1",
+            "acct2",
+            "acct3",
+        ]
+
+    def test_idle_class_does_not_bank_credit(self):
+        scheduler = self._scheduler(weights={AUTH: 2, ACCT: 1})
+        scheduler.push(ACCT, "nas", "acct0")
+        assert scheduler.pop() == "acct0"
+        scheduler.push(ACCT, "nas", "acct1")
+        scheduler.push(AUTH, "nas", "auth0")
+        assert self._pop_all(scheduler) == ["auth0", "acct1"]
+
+    def test_per_nas_round_robin(self):
+        scheduler = self._scheduler(per_nas=True)
+        for i in range(3):
+            scheduler.push(ACCT, "busy", f"busy{i}")
+        scheduler.push(ACCT, "quiet", "quiet0")
+        assert self._pop_all(scheduler) == ["busy0", "quiet0", "busy1", "busy2"]
+
+    def test_full_queue_drops_and_stats(self):
+        scheduler = self._scheduler(max_queue=2)
+        assert scheduler.push(ACCT, "nas", "a")
+        self.now[0] = 1.0
+        assert scheduler.push(ACCT, "nas", "b")
+        assert not scheduler.push(ACCT, "nas", "c")
+        assert scheduler.push(AUTH, "nas", "d")
+        self.now[0] = 3.0
+        scheduler.pop()
+        scheduler.pop()
+
+        stats = scheduler.stats()[ACCT]
+        assert (stats.depth, stats.queued, stats.dispatched, stats.dropped) == (
+            1,
+            2,
+            1,
+            1,
+        )
+        assert (stats.wait_max, stats.mean_wait) == (3.0, 3.0)
+        assert scheduler.drain() == ["b"]
+        assert len(scheduler) == 0
+        assert scheduler.stats()[ACCT].depth == 0
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            Scheduler(weights={AUTH: 0})
+        with pytest.raises(ValueError):
+            Scheduler(max_queue=0)
+
+
+class TestAsyncScheduling:
+    async def test_auth_overtakes_queued_accounting(self, full_dictionary):
+        handled = []
+
+        class Recorder(DummyServer):
+            def handle_auth_packet(self, protocol, pkt, addr):
+                handled.append(("auth", pkt.id))
+
+            def handle_acct_packet(self, protocol, pkt, addr):
+                handled.append(("acct", pkt.id))
+
+        server = Recorder(
+            dictionary=full_dictionary,
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            require_message_authenticator=False,
+            scheduler=Scheduler(weights={AUTH: 2, ACCT: 1}),
+        )
+        protocols = {}
+        for server_type in (AUTH, ACCT):
+            protocols[server_type] = DatagramProtocolServer(
+                ip="10.0.0.2",
+                port=1812,
+                server=server,
+                server_type=server_type,
+                hosts=server.hosts,
+                request_callback=server._request_handler,
+            )
+            protocols[server_type].transport = MagicMock()
+        addr = ("10.0.0.1", 4000)
+
+        for i in range(3):
+            protocols[ACCT].datagram_received(
+                encoded_request(packet.AcctPacket, full_dictionary, i), addr
+            )
+        for i in range(2):
+            protocols[AUTH].datagram_received(
+                encoded_request(packet.AuthPacket, full_dictionary, i), addr
+            )
+        assert handled == []
+        await asyncio.sleep(0)
+
+        assert handled == [
+            ("auth", 0),
+            ("auth", 1),
+            ("acct", 0),
+            ("acct", 1),
+            ("acct", 2),
+        ]
+        stats = server.scheduler_stats()
+        assert stats[ACCT].dispatched == 3 and stats[ACCT].depth == 0
+
+
+class TestSyncScheduling:
+    def test_reads_by_weight_and_answers_status_server(self, full_dictionary):
+        server = Server(
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            scheduler=Scheduler(weights={AUTH: 2, ACCT: 1}),
+        )
+        handled = []
+        server.handle_auth_packet = lambda pkt: handled.append(("auth", pkt.id))
+        server.handle_acct_packet = lambda pkt: handled.append(("acct", pkt.id))
+        source = ("10.0.0.1", 4000)
+
+        auth_fd, acct_fd = MagicMock(), MagicMock()
+        status = packet.StatusPacket(id=9, secret=b"secret", dict=full_dictionary)
+        auth_fd.recvfrom.side_effect = [
+            (encoded_request(packet.AuthPacket, full_dictionary, 1), source),
+            (status.request_packet(), source),
+            (encoded_request(packet.AuthPacket, full_dictionary, 2), source),
+        ]
+        acct_fd.recvfrom.side_effect = [
+            (encoded_request(packet.AcctPacket, full_dictionary, i), source)
+            for i in range(3)
+        ]
+
+        server._queue_input(acct_fd, server._handle_acct_packet, ACCT)
+        server._queue_input(auth_fd, server._handle_auth_packet, AUTH)
+        # Status-Server was answered on read; the rest waits its turn.
+        assert auth_fd.sendto.call_count == 1
+        assert handled == []
+        assert len(server.scheduler) == 2
+        assert server._poll_timeout() == 0
+
+        server._run_queued()
+        assert handled == [("auth", 1), ("acct", 0)]
+        assert acct_fd.recvfrom.call_count == 1
+
+    def test_queued_request_is_marked_in_flight(self, full_dictionary):
+        now = [0.0]
+        server = Server(
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            scheduler=Scheduler(max_queue=2),
+            deadlines=Deadlines({AUTH: 1.0}, clock=lambda: now[0]),
+        )
+        handled = []
+        server.handle_auth_packet = lambda pkt: handled.append(pkt.id)
+        source = ("10.0.0.1", 4000)
+        requests = [
+            encoded_request(packet.AuthPacket, full_dictionary, i) for i in range(3)
+        ]
+
+        fd = MagicMock()
+        fd.recvfrom.side_effect = [
+            (requests[0], source),
+            (requests[0], source),
+            BlockingIOError(),
+        ]
+        server._queue_input(fd, server._handle_auth_packet, AUTH)
+        # The retransmission is dropped while the original waits.
+        assert len(server.scheduler) == 1
+        assert server.dedup_stats().in_flight_drops == 1
+
+        fd.recvfrom.side_effect = [
+            (requests[1], source),
+            (requests[2], source),
+            BlockingIOError(),
+        ]
+        server._queue_input(fd, server._handle_auth_packet, AUTH)
+        # The queue is full: the refused request holds no mark.
+        assert server.scheduler_stats()[AUTH].dropped == 1
+        assert server.dedup_stats().in_flight == 2
+
+        now[0] = 5.0
+        server._run_queued()
+        assert handled == []
+        assert server.dedup_stats().in_flight == 0
@@ -1,12 +1,16 @@
 import select
 import socket
+from collections import OrderedDict
 
 import pytest
 
 from pyrad2 import packet
+from pyrad2.admission import AdmissionController, Limits
 from pyrad2.constants import PacketType
+from pyrad2.deadline import Deadlines
 from pyrad2.packet import PacketError
 from pyrad2.server import RemoteHost, Server, ServerPacketError
+from pyrad2.server_async import ServerType
 
 from .mock import (
     MockClassMethod,
@@ -34,6 +38,16 @@ class TestRemoteHost:
         assert host.acctport == "acctport"
         assert host.coaport == "coaport"
 
+    def test_secret_context_is_cached_per_secret(self):
+        host = RemoteHost("address", b"secret", "name")
+        ctx = host.secret_context
+        assert host.secret_context is ctx
+        assert ctx.secret == b"secret"
+
+        host.secret = b"other"
+        assert host.secret_context is not ctx
+        assert host.secret_context.secret == b"other"
+
     def test_named_construction(self):
         host = RemoteHost(
             address="address",
@@ -325,6 +339,21 @@ class TestMessageAuthenticatorPolicy:
 
         assert reply.has_message_authenticator()
 
+    def test_lazy_decode_router_defers_attribute_parsing(self):
+        server = self._server(lazy_decode=True)
+        pkt = self._auth_packet(Test_String="user", Test_Integer=10)
+        pkt.add_message_authenticator()
+
+        parsed = server._router.parse(pkt.request_packet(), b"secret")
+        parsed.source = ("host", 12345)
+        server.handle_auth_packet = lambda req: None
+        server._handle_auth_packet(parsed)
+
+        # MA policy only needed Message-Authenticator itself.
+        assert set(OrderedDict.keys(parsed)) == {80}
+        assert parsed["Test-String"] == ["user"]
+        assert parsed.keys() == ["Test-String", "Test-Integer", "Message-Authenticator"]
+
     def test_auth_status_server_replies_without_auth_side_effects(self):
         class CaptureFd:
             def __init__(self):
@@ -425,7 +454,7 @@ class TestOther:
     def test_auth_process_input(self):
         fd = MockFd(1)
         self.server._realauthfds = [1]
-        MockClassMethod(Server, "_grab_packet")
+        MockClassMethod(Server, "_grab_packet", result=packet.Packet())
         MockClassMethod(Server, "_handle_auth_packet")
 
         self.server._process_input(fd)
@@ -439,7 +468,7 @@ class TestOther:
         fd = MockFd(1)
         self.server._realauthfds = []
         self.server._realacctfds = [1]
-        MockClassMethod(Server, "_grab_packet")
+        MockClassMethod(Server, "_grab_packet", result=packet.Packet())
         MockClassMethod(Server, "_handle_acct_packet")
 
         self.server._process_input(fd)
@@ -450,6 +479,39 @@ class TestOther:
         assert self.server.called[0][1][0] == fd
 
 
+class TestRequestMemory:
+    def test_handled_request_has_no_instance_dict(self, full_dictionary):
+        server = Server(
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            dict=full_dictionary,
+            require_message_authenticator=False,
+            admission=AdmissionController(total=Limits(max_in_flight=10)),
+            deadlines=Deadlines({ServerType.Auth: 5.0}),
+        )
+        handled = []
+
+        def handle(pkt):
+            handled.append(pkt)
+            server.send_reply_packet(pkt.fd, server.create_reply_packet(pkt))
+
+        server.handle_auth_packet = handle
+        fd = MockFd()
+        fd.data = packet.AuthPacket(
+            id=1, secret=b"secret", dict=full_dictionary
+        ).request_packet()
+        fd.source = ("10.0.0.1", 4000)
+        fd.sendto = lambda data, target: None
+
+        pkt = server._grab_packet(fd, ServerType.Auth)
+        server._dispatch(pkt, server._handle_auth_packet)
+
+        assert handled == [pkt]
+        assert pkt._received_at is not None
+        # Every attribute the server sets has a slot, so none spills
+        # into a per-instance dict.
+        assert pkt.__dict__ == {}
+
+
 @pytest.mark.skipif(not hasattr(select, "poll"), reason="select.poll not available")
 class TestServerRun:
     def setup_method(self):
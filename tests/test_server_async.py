@@ -1,3 +1,4 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -242,3 +243,132 @@ class TestServerAsync:
         reply = protocol.send_response.call_args.args[0]
         assert reply.code == PacketType.DisconnectNAK
         assert int.from_bytes(reply[101][0], "big") == ErrorCause.UnsupportedExtension
+
+
+class AsyncAcctServer(ServerAsync):
+    """Accounting server whose handler awaits ``self.release``."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+
+    def handle_auth_packet(self, protocol, pkt, addr):
+        pass
+
+    async def handle_acct_packet(self, protocol, pkt, addr):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await self.release.wait()
+        finally:
+            self.running -= 1
+        reply = self.create_reply_packet(pkt)
+        reply.code = PacketType.AccountingResponse
+        return reply
+
+
+class TestAsyncHandlers:
+    @pytest.fixture(autouse=True)
+    def _setup(self, full_dictionary):
+        self.dict = full_dictionary
+
+    def _listener(self, **kwargs):
+        server = AsyncAcctServer(
+            dictionary=self.dict,
+            hosts={"127.0.0.1": RemoteHost("127.0.0.1", b"secret", "nas")},
+            **kwargs,
+        )
+        protocol = DatagramProtocolServer(
+            ip="127.0.0.1",
+            port=1813,
+            server=server,
+            server_type=ServerType.Acct,
+            hosts=server.hosts,
+            request_callback=server._request_handler,
+            max_concurrent_handlers=server.max_concurrent_handlers,
+            max_pending_handlers=server.max_pending_handlers,
+        )
+        transport = MagicMock()
+        protocol.connection_made(transport)
+        return server, protocol, transport
+
+    def _request(self, id=1):
+        req = packet.AcctPacket(id=id, secret=b"secret", dict=self.dict)
+        return req, req.request_packet()
+
+    async def _settle(self, protocol):
+        while protocol.handler_tasks:
+            await asyncio.sleep(0)
+
+    async def test_returned_reply_is_sent_and_cached(self):
+        server, protocol, transport = self._listener()
+        req, raw = self._request()
+        addr = ("127.0.0.1", 5000)
+
+        protocol.datagram_received(raw, addr)
+        await asyncio.sleep(0)
+        # Retransmission while the handler awaits: still in flight.
+        protocol.datagram_received(raw, addr)
+        await asyncio.sleep(0)
+        assert server.calls == 1
+        transport.sendto.assert_not_called()
+
+        server.release.set()
+        await self._settle(protocol)
+        rawreply = transport.sendto.call_args.args[0]
+        assert req.verify_reply(req.create_reply(packet=rawreply), rawreply)
+
+        # Later retransmission: the cached bytes, no second handler call.
+        protocol.datagram_received(raw, addr)
+        assert transport.sendto.call_count == 2
+        assert transport.sendto.call_args.args[0] == rawreply
+        assert server.calls == 1
+
+    async def test_concurrency_is_capped_per_listener(self):
+        server, protocol, _ = self._listener(max_concurrent_handlers=2)
+        for id in range(5):
+            protocol.datagram_received(self._request(id)[1], ("127.0.0.1", 5000))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert server.calls == 2
+
+        server.release.set()
+        await self._settle(protocol)
+        assert server.calls == 5
+        assert server.peak == 2
+
+    async def test_full_backlog_drops_and_clears_in_flight(self):
+        server, protocol, transport = self._listener(
+            max_concurrent_handlers=1, max_pending_handlers=1
+        )
+        addr = ("127.0.0.1", 5000)
+        protocol.datagram_received(self._request(1)[1], addr)
+        protocol.datagram_received(self._request(2)[1], addr)
+        _, dropped = self._request(3)
+        protocol.datagram_received(dropped, addr)
+        assert len(protocol.handler_tasks) == 2
+
+        server.release.set()
+        await self._settle(protocol)
+        # The dropped request was not left marked in flight, so its
+        # retransmission is handled normally.
+        protocol.datagram_received(dropped, addr)
+        await self._settle(protocol)
+        assert server.calls == 3
+        assert transport.sendto.call_count == 3
+
+    async def test_close_transport_cancels_handlers(self):
+        server, protocol, transport = self._listener()
+        protocol.datagram_received(self._request()[1], ("127.0.0.1", 5000))
+        await asyncio.sleep(0)
+        await protocol.close_transport()
+        assert not protocol.handler_tasks
+        transport.sendto.assert_not_called()
+
+    def test_rejects_invalid_limits(self):
+        with pytest.raises(ValueError):
+            self._listener(max_concurrent_handlers=0)
@@ -0,0 +1,264 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import dedup, packet, sharedcache
+from pyrad2.constants import PacketType
+from pyrad2.server import RemoteHost
+from pyrad2.server_async import DatagramProtocolServer, ServerType
+from pyrad2.sharedcache import MappedResponseCache, SharedMemoryResponseCache
+
+from .base import DummyServer
+
+
+def _key(port=1, ident=1):
+    return dedup.DedupKey("10.0.0.1", port, 1, ident, bytes([ident]) * 16)
+
+
+class TestMappedResponseCache:
+    @pytest.fixture(autouse=True)
+    def _path(self, tmp_path):
+        self.path = str(tmp_path / "dedup.cache")
+        self.now = [1000.0]
+        self.caches = []
+        yield
+        for cache in self.caches:
+            cache.close()
+
+    def _cache(self, **kwargs):
+        kwargs.setdefault("slots", 16)
+        kwargs.setdefault("ways", 4)
+        kwargs.setdefault("slot_size", 512)
+        cache = MappedResponseCache(self.path, clock=lambda: self.now[0], **kwargs)
+        self.caches.append(cache)
+        return cache
+
+    def test_entries_survive_reopening(self):
+        first = self._cache()
+        first.mark_in_flight(_key(), b"request")
+        first.record_reply(_key(), b"reply")
+        first.close()
+        self.caches.remove(first)
+
+        second = self._cache()
+        assert second.lookup(_key(), b"request") == b"reply"
+        assert second.lookup(_key(), b"forged") is None
+        assert len(second) == 1
+
+    def test_siblings_see_each_others_replies(self):
+        a, b = self._cache(), self._cache()
+        a.record_reply(_key(), b"from-a")
+        assert b.lookup(_key()) == b"from-a"
+        # In-flight marks are per process.
+        a.mark_in_flight(_key(port=2))
+        assert a.lookup(_key(port=2)) is dedup.IN_FLIGHT
+        assert b.lookup(_key(port=2)) is None
+
+    def test_expiry_and_sweep(self):
+        cache = self._cache(ttl=10.0)
+        cache.record_reply(_key(), b"reply")
+        self.now[0] += 10.0
+        assert cache.lookup(_key()) is None
+        assert cache.sweep() == 1
+        assert cache.stats().expired == 1
+
+    def test_full_bucket_evicts_the_entry_closest_to_expiry(self):
+        cache = self._cache(slots=4, ways=4)
+        for i in range(4):
+            cache.record_reply(_key(ident=i), b"r%d" % i, ttl=10.0 + i)
+        cache.record_reply(_key(ident=9), b"r9")
+
+        assert cache.lookup(_key(ident=0)) is None
+        assert cache.lookup(_key(ident=9)) == b"r9"
+        assert cache.stats().evicted_entries == 1
+
+    def test_oversize_reply_is_not_cached(self):
+        cache = self._cache()
+        cache.mark_in_flight(_key())
+        cache.record_reply(_key(), b"x" * 512)
+        assert cache.lookup(_key()) is None
+        stats = cache.stats()
+        assert stats.rejected_oversize == 1
+        assert stats.in_flight == 0
+
+    def test_torn_slot_reads_as_miss(self):
+        cache = self._cache(slots=4, ways=4)
+        cache.record_reply(_key(), b"reply")
+        table = cache._table
+        offset = next(iter(table._offsets(table.bucket_of(dedup.pack_key(_key())))))
+        raw_at = offset + sharedcache._SLOT.size + sharedcache._KEY_AREA
+        table.buf[raw_at] ^= 0xFF
+        assert cache.lookup(_key()) is None
+
+    def test_other_geometry_is_reformatted(self):
+        self._cache().record_reply(_key(), b"reply")
+        other = self._cache(slots=32)
+        assert other.lookup(_key()) is None
+        with pytest.raises(ValueError):
+            self._cache(slots=6, ways=4)
+
+
+class TestServerRestart:
+    async def test_restarted_server_replays_reply(self, full_dictionary, tmp_path):
+        path = str(tmp_path / "dedup.cache")
+        host = RemoteHost("10.0.0.1", b"secret", "host")
+        handled = []
+
+        class AuthServer(DummyServer):
+            def handle_auth_packet(self, protocol, pkt, addr):
+                handled.append(pkt.id)
+                reply = self.create_reply_packet(pkt)
+                reply.code = PacketType.AccessAccept
+                protocol.send_response(reply, addr)
+
+        def start():
+            cache = MappedResponseCache(path, slots=64)
+            server = AuthServer(
+                dictionary=full_dictionary,
+                hosts={"10.0.0.1": host},
+                require_message_authenticator=False,
+                dedup_cache=cache,
+            )
+            protocol = DatagramProtocolServer(
+                ip="10.0.0.1",
+                port=1812,
+                server=server,
+                server_type=ServerType.Auth,
+                hosts=server.hosts,
+                request_callback=server._request_handler,
+            )
+            protocol.transport = MagicMock()
+            return cache, protocol
+
+        data = packet.AuthPacket(
+            id=5, secret=b"secret", dict=full_dictionary
+        ).request_packet()
+        addr = ("10.0.0.1", 40000)
+
+        cache, before = start()
+        before.datagram_received(data, addr)
+        cache.close()
+        cache, after = start()
+        after.datagram_received(data, addr)
+        cache.close()
+
+        assert handled == [5]
+        assert (
+            after.transport.sendto.call_args.args
+            == before.transport.sendto.call_args.args
+        )
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs fork")
+class TestSharedMemoryResponseCache:
+    @pytest.fixture(autouse=True)
+    def _cache(self):
+        self.cache = SharedMemoryResponseCache(
+            slots=16, ways=4, slot_size=512, lock_stripes=4, in_flight_ttl=0.3
+        )
+        yield
+        self.cache.close()
+
+    def _in_child(self, target):
+        process = multiprocessing.get_context("fork").Process(target=target)
+        process.start()
+        process.join(5)
+        assert process.exitcode == 0
+
+    def test_workers_share_replies_and_in_flight_marks(self):
+        def worker():
+            self.cache.mark_in_flight(_key(), b"request")
+            self.cache.record_reply(_key(), b"reply")
+            self.cache.mark_in_flight(_key(port=2))
+
+        self._in_child(worker)
+
+        assert self.cache.lookup(_key(), b"request") == b"reply"
+        assert self.cache.lookup(_key(), b"forged") is None
+        assert self.cache.lookup(_key(port=2)) is dedup.IN_FLIGHT
+        stats = self.cache.stats()
+        assert (stats.entries, stats.in_flight, stats.in_flight_drops) == (1, 1, 1)
+
+    def _race(self, cache, ports, request):
+        """Have two workers claim ``ports`` at once; returns both claims."""
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(2)
+        claims = context.Queue()
+
+        def worker():
+            barrier.wait()
+            claims.put(
+                [
+                    port
+                    for port in ports
+                    if cache.lookup_or_mark(_key(port=port), request) is None
+                ]
+            )
+
+        processes = [context.Process(target=worker) for _ in range(2)]
+        for process in processes:
+            process.start()
+        first, second = claims.get(timeout=5), claims.get(timeout=5)
+        for process in processes:
+            process.join(5)
+            assert process.exitcode == 0
+        return first, second
+
+    def test_racing_workers_claim_each_request_once(self):
+        cache = SharedMemoryResponseCache(
+            slots=2048, ways=8, slot_size=256, lock_stripes=4
+        )
+        try:
+            first, second = self._race(cache, range(1, 513), b"request")
+        finally:
+            cache.close()
+        assert sorted(first + second) == list(range(1, 513))
+
+    def test_reused_identifier_is_claimed_once(self):
+        ports = range(1, 5)
+        for port in ports:
+            self.cache.mark_in_flight(_key(port=port), b"old request")
+            self.cache.record_reply(_key(port=port), b"old reply")
+
+        # The NAS reuses each Identifier for a new request: the old
+        # reply is replaced by one worker's in-flight mark.
+        first, second = self._race(self.cache, ports, b"new request")
+
+        assert sorted(first + second) == list(ports)
+        for port in ports:
+            assert self.cache.lookup(_key(port=port), b"old request") is dedup.IN_FLIGHT
+
+    def test_in_flight_mark_of_dead_worker_lapses(self):
+        self._in_child(lambda: self.cache.mark_in_flight(_key()))
+        assert self.cache.lookup(_key()) is dedup.IN_FLIGHT
+        time.sleep(0.35)
+        assert self.cache.lookup(_key()) is None
+
+    def test_drop_in_flight_keeps_replies(self):
+        self.cache.record_reply(_key(), b"reply")
+        self.cache.drop_in_flight(_key())
+        assert self.cache.lookup(_key()) == b"reply"
+
+        self.cache.mark_in_flight(_key(port=2))
+        self.cache.drop_in_flight(_key(port=2))
+        assert self.cache.lookup(_key(port=2)) is None
+
+    def test_slot_being_written_reads_as_miss(self):
+        self.cache.record_reply(_key(), b"reply")
+        table = self.cache._table
+        packed = dedup.pack_key(_key())
+        for offset in table._offsets(table.bucket_of(packed)):
+            seq = sharedcache._SEQ.unpack_from(table.buf, offset)[0]
+            sharedcache._SEQ.pack_into(table.buf, offset, seq | 1)
+        assert self.cache.lookup(_key()) is None
+
+    def test_close_frees_the_block(self):
+        cache = SharedMemoryResponseCache(slots=8, ways=4, slot_size=256)
+        name = cache.name
+        cache.close()
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
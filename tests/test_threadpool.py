@@ -0,0 +1,179 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from pyrad2 import packet
+from pyrad2.admission import AdmissionController, Limits
+from pyrad2.constants import PacketType
+from pyrad2.deadline import Deadlines
+from pyrad2.scheduler import Scheduler
+from pyrad2.server import RemoteHost, Server
+from pyrad2.server_async import ServerType
+from pyrad2.threadpool import HandlerPool
+
+from .base import encoded_request
+
+AUTH, ACCT = ServerType.Auth, ServerType.Acct
+SOURCE = ("10.0.0.1", 4000)
+
+
+class TestHandlerPool:
+    def test_full_backlog_drops(self):
+        pool = HandlerPool(workers=1, backlog=2)
+        ran = []
+        assert pool.submit(AUTH, "nas", lambda: ran.append(1))
+        assert pool.submit(AUTH, "nas", lambda: ran.append(2))
+        assert not pool.submit(AUTH, "nas", lambda: ran.append(3))
+        assert len(pool) == 2
+
+        pool.start()
+        pool.stop()
+        assert ran == [1, 2]
+        stats = pool.stats()
+        assert (stats.queued, stats.completed, stats.dropped) == (0, 2, 1)
+
+    def test_takes_jobs_in_scheduler_order(self):
+        scheduler = Scheduler(weights={AUTH: 2, ACCT: 1}, max_queue=1)
+        pool = HandlerPool(workers=1, scheduler=scheduler)
+        ran = []
+        pool.submit(ACCT, "nas", lambda: ran.append("acct"))
+        pool.submit(AUTH, "nas", lambda: ran.append("auth"))
+        assert not pool.submit(AUTH, "nas", lambda: ran.append("late"))
+
+        pool.start()
+        pool.stop()
+        assert ran == ["auth", "acct"]
+        assert scheduler.stats()[AUTH].dropped == 1
+
+    def test_failing_job_keeps_thread_alive(self):
+        pool = HandlerPool(workers=1)
+        ran = []
+        pool.submit(AUTH, "nas", lambda: 1 / 0)
+        pool.submit(AUTH, "nas", lambda: ran.append(1))
+        pool.start()
+        pool.stop()
+        assert ran == [1]
+        assert pool.stats().completed == 2
+
+    def test_workers_must_be_positive(self):
+        with pytest.raises(ValueError):
+            HandlerPool(workers=0)
+
+
+class TestServerWorkers:
+    @pytest.fixture(autouse=True)
+    def _server(self, full_dictionary):
+        self.dictionary = full_dictionary
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.handled = []
+        self.server = None
+        yield
+        self.release.set()
+        if self.server is not None:
+            self.server._pool.stop(timeout=5)
+
+    def _start(self, **kwargs):
+        server = Server(
+            hosts={"10.0.0.1": RemoteHost("10.0.0.1", b"secret", "nas")},
+            dict=self.dictionary,
+            require_message_authenticator=False,
+            **kwargs,
+        )
+
+        def handle(pkt):
+            self.started.set()
+            self.release.wait(5)
+            self.handled.append(pkt.id)
+            reply = server.create_reply_packet(pkt)
+            reply.code = PacketType.AccessAccept
+            server.send_reply_packet(pkt.fd, reply)
+
+        server.handle_auth_packet = handle
+        server._pool.start()
+        self.server = server
+        return server
+
+    def _receive(self, fd, *datagrams):
+        fd.recvfrom.side_effect = [(data, SOURCE) for data in datagrams]
+        for _ in datagrams:
+            self.server._submit_input(fd, self.server._handle_auth_packet, AUTH)
+
+    def test_slow_handler_does_not_block_poll_thread(self):
+        server = self._start(workers=1)
+        fd = MagicMock()
+        first = encoded_request(packet.AuthPacket, self.dictionary, 1)
+        status = packet.StatusPacket(id=9, secret=b"secret", dict=self.dictionary)
+
+        self._receive(fd, first)
+        assert self.started.wait(5)
+        # The handler thread is blocked; the poll thread still answers
+        # Status-Server, drops the retransmission and queues new work.
+        self._receive(
+            fd,
+            status.request_packet(),
+            first,
+            encoded_request(packet.AuthPacket, self.dictionary, 2),
+        )
+        assert fd.sendto.call_count == 1
+        assert server.worker_stats().queued == 1
+
+        self.release.set()
+        server._pool.stop(timeout=5)
+        assert self.handled == [1, 2]
+        assert fd.sendto.call_count == 3
+        assert server.dedup_stats().in_flight == 0
+
+    def test_full_backlog_releases_admission(self):
+        admission = AdmissionController(total=Limits(max_in_flight=10))
+        server = self._start(workers=1, worker_backlog=1, admission=admission)
+        fd = MagicMock()
+        self._receive(fd, encoded_request(packet.AuthPacket, self.dictionary, 1))
+        assert self.started.wait(5)
+        self._receive(
+            fd,
+            encoded_request(packet.AuthPacket, self.dictionary, 2),
+            encoded_request(packet.AuthPacket, self.dictionary, 3),
+        )
+
+        assert server.worker_stats().dropped == 1
+        assert server.admission_stats().in_flight == 2
+        assert server.dedup_stats().in_flight == 2
+        self.release.set()
+        server._pool.stop(timeout=5)
+        assert self.handled == [1, 2]
+        assert server.admission_stats().in_flight == 0
+
+    def test_retransmission_of_queued_request_is_dropped(self):
+        server = self._start(workers=1)
+        fd = MagicMock()
+        second = encoded_request(packet.AuthPacket, self.dictionary, 2)
+        self._receive(fd, encoded_request(packet.AuthPacket, self.dictionary, 1))
+        assert self.started.wait(5)
+        # The queued request is already marked in flight, so its
+        # retransmission isn't queued behind it.
+        self._receive(fd, second, second)
+        assert server.worker_stats().queued == 1
+
+        self.release.set()
+        server._pool.stop(timeout=5)
+        assert self.handled == [1, 2]
+        assert server.dedup_stats().in_flight_drops == 1
+
+    def test_expired_request_drops_its_mark(self):
+        now = [0.0]
+        server = self._start(
+            workers=1, deadlines=Deadlines({AUTH: 1.0}, clock=lambda: now[0])
+        )
+        fd = MagicMock()
+        self._receive(fd, encoded_request(packet.AuthPacket, self.dictionary, 1))
+        assert self.started.wait(5)
+        self._receive(fd, encoded_request(packet.AuthPacket, self.dictionary, 2))
+        now[0] = 5.0
+
+        self.release.set()
+        server._pool.stop(timeout=5)
+        assert self.handled == [1]
+        assert server.deadline_stats()[AUTH].expired == 1
+        assert server.dedup_stats().in_flight == 0